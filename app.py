@@ -1,18 +1,29 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
 import database
-import model_utils
+import forecasting
+import inventory
+import hierarchy
+import timeseries
+import change_feed
+import executors
+import single_flight
+import micro_batch
+import response_format
 
 load_dotenv()
 
+# Products per block of a full analysis (0 = all at once), see _full_analysis
+FULL_ANALYSIS_BLOCK_PRODUCTS = int(os.getenv('FULL_ANALYSIS_BLOCK_PRODUCTS', 1000))
+
 app = Flask(__name__)
 CORS(app) # Enable CORS for all routes, restrict in production
+response_format.log_msgpack_status()
 
 # Ensure the models directory exists if we were to save models here (usually done in training)
 # if not os.path.exists(model_utils.MODELS_DIR):
@@ -30,64 +41,129 @@ def forecast_single_produk_jadi(produk_id):
     Query params:
         - forecast_days (int, default 7): Number of days to forecast.
         - history_days (int, default 90): Number of past days of sales to use for prediction.
+        - quantiles (comma-separated floats, optional): e.g. "0.1,0.5,0.9" adds prediction
+          intervals (forecast_quantiles per day, total_quantiles for the whole horizon).
     """
     try:
         forecast_days = int(request.args.get('forecast_days', 7))
         history_days = int(request.args.get('history_days', 90)) # How much history to fetch for context
     except ValueError:
         return jsonify({"error": "Invalid query parameter format for forecast_days or history_days"}), 400
+    if forecast_days < 0 or history_days < 0:
+        return jsonify({"error": "forecast_days and history_days must not be negative."}), 400
+    try:
+        quantiles = forecasting.validate_quantiles(request.args['quantiles'].split(',')) if request.args.get('quantiles') else None
+    except ValueError:
+        return jsonify({"error": "quantiles must be comma-separated numbers strictly between 0 and 1."}), 400
 
     end_date_history = datetime.now().date()
+    # Concurrent identical requests share one computation (see single_flight.py)
+    key = ('produk_jadi', produk_id, forecast_days, history_days, tuple(quantiles or ()), end_date_history)
+    response, status = single_flight.DEFAULT_FLIGHTS.do(
+        key, lambda: _forecast_single(produk_id, forecast_days, history_days, quantiles, end_date_history)
+    )
+    return jsonify(response), status
+
+def _forecast_single(produk_id, forecast_days, history_days, quantiles, end_date_history):
+    """Computes the response of forecast_single_produk_jadi. Returns (response dict, status code)."""
     start_date_history = end_date_history - timedelta(days=history_days)
 
-    historical_sales_df = database.get_historical_sales(
-        produk_jadi_id=produk_id,
-        start_date=start_date_history,
-        end_date=end_date_history
-    )
+    # Served from the precomputed forecast store when possible, otherwise computed live.
+    # History is resampled to a continuous daily series over the requested window (same as
+    # train.py), so the last SEQUENCE_LENGTH steps really are the last SEQUENCE_LENGTH days
+    forecast = forecasting.get_forecasts([produk_id], start_date_history, end_date_history, forecast_days, quantiles)[0]
 
-    if historical_sales_df.empty or len(historical_sales_df) < model_utils.SEQUENCE_LENGTH:
-        return jsonify({
+    if forecast["warning"] == forecasting.INSUFFICIENT_HISTORY_WARNING:
+        return {
             "produk_jadi_id": produk_id,
-            "warning": "Not enough historical data for robust prediction.",
-            "forecasted_sales": [0.0] * forecast_days, # Fallback
+            "warning": forecast["warning"],
+            "forecasted_sales": forecast["forecasted_sales"], # Fallback
             "message": "Consider providing more sales history or reducing history_days if this is initial data."
-        }), 200 # 200 with warning, or 404 if product itself doesn't exist
-
-    # Filter for the specific product, as get_historical_sales might return all if id is None
-    product_specific_sales_df = historical_sales_df[historical_sales_df['produk_jadi_id'] == produk_id]
+        }, 200 # 200 with warning, or 404 if product itself doesn't exist
 
-    if product_specific_sales_df.empty or len(product_specific_sales_df) < model_utils.SEQUENCE_LENGTH:
-         return jsonify({
-            "produk_jadi_id": produk_id,
-            "warning": "Not enough historical data for this specific product.",
-            "forecasted_sales": [0.0] * forecast_days,
-        }), 200
+    response = {
+        "produk_jadi_id": produk_id,
+        "forecast_dates": forecast["forecast_dates"],
+        "forecasted_sales": forecast["forecasted_sales"],
+        "demand_class": forecast["demand_class"],
+        "forecast_method": forecast["forecast_method"]
+    }
+    if quantiles:
+        response["forecast_quantiles"] = forecast["forecast_quantiles"]
+        response["total_quantiles"] = forecast["total_quantiles"]
+    if forecast["warning"]:
+        response["warning"] = forecast["warning"]
+    return response, 200
 
+@app.route('/forecast/produk_jadi/batch', methods=['POST'])
+def forecast_batch_produk_jadi():
+    """
+    Forecasts sales for an explicit list of produk_jadi with one history query and one
+    batched inference pass.
+    JSON body:
+        - items (list, required): [{"produk_jadi_id": int, "forecast_days": int (optional)}, ...]
+        - forecast_days (int, default 7): Default horizon for items that don't set their own.
+        - history_days (int, default 90): Number of past days of sales to use for prediction.
+        - quantiles (list of floats, optional): Adds prediction intervals to every result
+          (forecast_quantiles per day, total_quantiles for the item's horizon).
+    Returns {"results": [...]} with one entry per item, in request order.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('items'), list) or not body['items']:
+        return jsonify({"error": "Request body must be a JSON object with a non-empty 'items' list."}), 400
 
-    predictions = model_utils.predict_sales_for_product(
-        produk_id,
-        product_specific_sales_df, # Pass only the relevant product's sales
-        forecast_horizon_days=forecast_days
-    )
+    try:
+        default_forecast_days = int(body.get('forecast_days', 7))
+        history_days = int(body.get('history_days', 90))
+        items = [
+            (int(item['produk_jadi_id']), int(item.get('forecast_days', default_forecast_days)))
+            for item in body['items']
+        ]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return jsonify({"error": "Each item needs an integer produk_jadi_id and optional integer forecast_days."}), 400
+    try:
+        quantiles = forecasting.validate_quantiles(body['quantiles']) if body.get('quantiles') is not None else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "quantiles must be a list of numbers strictly between 0 and 1."}), 400
+    if any(days < 0 for _, days in items) or history_days < 0:
+        return jsonify({"error": "forecast_days and history_days must not be negative."}), 400
 
-    # Generate future dates for the forecast
-    last_historical_date_str = product_specific_sales_df['sale_date'].max()
-    if isinstance(last_historical_date_str, str): # if sale_date is already string
-        last_historical_date = datetime.strptime(last_historical_date_str, '%Y-%m-%d').date()
-    elif isinstance(last_historical_date_str, pd.Timestamp): # if sale_date is Timestamp
-        last_historical_date = last_historical_date_str.date()
-    else: # assuming it's already a date object
-        last_historical_date = last_historical_date_str
-        
-    forecast_dates = [(last_historical_date + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(forecast_days)]
+    end_date_history = datetime.now().date()
+    start_date_history = end_date_history - timedelta(days=history_days)
 
+    if quantiles:
+        # Horizon totals can't be cut to a shorter horizon like the daily values, so with
+        # intervals every distinct horizon is forecast in its own batched pass
+        forecasts_by_item = {}
+        for days in sorted(set(days for _, days in items)):
+            ids = sorted(set(pj_id for pj_id, item_days in items if item_days == days))
+            for forecast in forecasting.get_forecasts(ids, start_date_history, end_date_history, days, quantiles):
+                forecasts_by_item[(forecast["produk_jadi_id"], days)] = forecast
+    else:
+        # A product listed several times is forecast once, up to its longest requested horizon
+        horizons = {}
+        for pj_id, days in items:
+            horizons[pj_id] = max(days, horizons.get(pj_id, 0))
+        forecasts = forecasting.get_forecasts(list(horizons), start_date_history, end_date_history, horizons)
+        forecasts_by_id = {forecast["produk_jadi_id"]: forecast for forecast in forecasts}
+        forecasts_by_item = {(pj_id, days): forecasts_by_id[pj_id] for pj_id, days in items}
 
-    return jsonify({
-        "produk_jadi_id": produk_id,
-        "forecast_dates": forecast_dates,
-        "forecasted_sales": predictions
-    })
+    results = []
+    for pj_id, days in items:
+        forecast = forecasts_by_item[(pj_id, days)]
+        result = {
+            "produk_jadi_id": pj_id,
+            "forecast_dates": forecast["forecast_dates"][:days],
+            "forecasted_sales": forecast["forecasted_sales"][:days],
+            "demand_class": forecast["demand_class"],
+            "forecast_method": forecast["forecast_method"],
+            "warning": forecast["warning"]
+        }
+        if quantiles:
+            result["forecast_quantiles"] = forecast["forecast_quantiles"]
+            result["total_quantiles"] = forecast["total_quantiles"]
+        results.append(result)
+    return jsonify({"results": results})
 
 @app.route('/forecast/full_analysis', methods=['GET'])
 def full_analysis_forecast():
@@ -102,78 +178,68 @@ def full_analysis_forecast():
         - history_days (int, default 90): Past sales history to use.
         - safety_stock_pj_days (int, default 3): Safety stock for produk jadi in days of avg future sales.
         - safety_stock_bb_days (int, default 7): Safety stock for bahan baku in days of avg future usage.
+        - service_level (float, optional): e.g. 0.95. Sets the produk jadi safety stock from the
+          forecast distribution instead of safety_stock_pj_days: enough stock to cover total
+          demand over the horizon with this probability.
+    Responds with JSON, or with MessagePack in a columnar layout when the Accept header asks
+    for application/msgpack (see response_format.py).
     """
     try:
         forecast_days = int(request.args.get('forecast_days', 7))
         history_days = int(request.args.get('history_days', 90))
         safety_stock_pj_days = int(request.args.get('safety_stock_pj_days', 3))
         safety_stock_bb_days = int(request.args.get('safety_stock_bb_days', 7))
+        service_level = float(request.args['service_level']) if request.args.get('service_level') else None
+        quantiles = forecasting.validate_quantiles([service_level]) if service_level is not None else None
     except ValueError:
-        return jsonify({"error": "Invalid query parameter format."}), 400
-
-    all_produk_jadi_ids = database.get_all_produk_jadi_ids()
-    if not all_produk_jadi_ids:
-        return jsonify({"error": "No finished products (produk_jadi) found in the database."}), 404
+        return response_format.make_response({"error": "Invalid query parameter format."}, 400)
+    if forecast_days < 0 or history_days < 0:
+        return response_format.make_response({"error": "forecast_days and history_days must not be negative."}, 400)
 
     end_date_history = datetime.now().date()
-    start_date_history = end_date_history - timedelta(days=history_days)
-    
-    # Fetch all historical sales once
-    all_historical_sales_df = database.get_historical_sales(
-        start_date=start_date_history,
-        end_date=end_date_history
-    )
-
-    full_forecast_results = {
-        "produk_jadi_forecasts": [],
-        "produk_jadi_to_make": [],
-        "bahan_baku_total_needed": {},
-        "bahan_baku_to_purchase": []
-    }
-    
-    recipes_df = database.get_recipes()
-    if recipes_df.empty:
-        return jsonify({"error": "No product recipes (resep_produk) found. Cannot calculate material needs."}), 404
+    # Concurrent identical requests share one computation (see single_flight.py)
+    key = ('full_analysis', forecast_days, history_days, safety_stock_pj_days, safety_stock_bb_days,
+           service_level, end_date_history)
+    response, status = single_flight.DEFAULT_FLIGHTS.do(key, lambda: _full_analysis(
+        forecast_days, history_days, safety_stock_pj_days, safety_stock_bb_days, service_level, quantiles,
+        end_date_history
+    ))
+    return response_format.make_response(response, status, columnar=response_format.columnar_full_analysis)
 
-    # 1. Sales forecast for all produk_jadi
-    for pj_id in all_produk_jadi_ids:
-        product_specific_sales_df = all_historical_sales_df[all_historical_sales_df['produk_jadi_id'] == pj_id]
-        
-        if product_specific_sales_df.empty or len(product_specific_sales_df) < model_utils.SEQUENCE_LENGTH:
-            predictions = [0.0] * forecast_days # Fallback
-            forecast_dates = [(end_date_history + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(forecast_days)]
-            warning_msg = "Not enough historical data for robust prediction."
-        else:
-            predictions = model_utils.predict_sales_for_product(
-                pj_id,
-                product_specific_sales_df,
-                forecast_horizon_days=forecast_days
-            )
-            last_historical_date_str = product_specific_sales_df['sale_date'].max()
-            if isinstance(last_historical_date_str, str):
-                last_historical_date = datetime.strptime(last_historical_date_str, '%Y-%m-%d').date()
-            elif isinstance(last_historical_date_str, pd.Timestamp):
-                last_historical_date = last_historical_date_str.date()
-            else:
-                last_historical_date = last_historical_date_str
-
-            forecast_dates = [(last_historical_date + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(forecast_days)]
-            warning_msg = None
+def _fold_full_analysis_block(full_forecast_results, forecasts, recipes_by_product, stocks_pj, forecast_days,
+                              safety_stock_pj_days, service_level):
+    """
+    Adds the forecasts of one block of products to full_forecast_results: their forecasts
+    and quantities to make, and their bahan_baku needs to the running totals.
+    - recipes_by_product: {produk_jadi_id: [(bahan_baku_id, jumlah_dibutuhkan), ...]} of the block.
+    """
+    for forecast in forecasts:
+        pj_id = forecast["produk_jadi_id"]
+        predictions = forecast["forecasted_sales"]
 
         total_forecasted_sales = sum(predictions)
         avg_daily_forecasted_sales = total_forecasted_sales / forecast_days if forecast_days > 0 else 0
 
+        # 1. Sales forecast for the produk_jadi
         full_forecast_results["produk_jadi_forecasts"].append({
             "produk_jadi_id": pj_id,
-            "forecast_dates": forecast_dates,
+            "forecast_dates": forecast["forecast_dates"],
             "forecasted_sales_per_day": predictions,
             "total_forecasted_sales_period": total_forecasted_sales,
-            "warning": warning_msg
+            "demand_class": forecast["demand_class"],
+            "forecast_method": forecast["forecast_method"],
+            "warning": forecast["warning"]
         })
+        if service_level is not None:
+            full_forecast_results["produk_jadi_forecasts"][-1]["total_quantiles"] = forecast["total_quantiles"]
 
         # 2. Calculate produk_jadi to make
-        current_stock_pj = database.get_current_stock(pj_id, 'produk_jadi')
-        safety_stock_pj = avg_daily_forecasted_sales * safety_stock_pj_days
+        current_stock_pj = stocks_pj.get(pj_id, 0.0)
+        if service_level is not None:
+            # Extra stock above the point forecast needed to meet demand with probability service_level
+            safety_stock_pj = max(0, forecast["total_quantiles"][str(service_level)] - total_forecasted_sales)
+        else:
+            safety_stock_pj = avg_daily_forecasted_sales * safety_stock_pj_days
         qty_to_make = max(0, round(total_forecasted_sales - current_stock_pj + safety_stock_pj))
         
         full_forecast_results["produk_jadi_to_make"].append({
@@ -186,20 +252,78 @@ def full_analysis_forecast():
 
         # Aggregate bahan_baku needed for this pj_id to be made
         if qty_to_make > 0:
-            product_recipe = recipes_df[recipes_df['produk_jadi_id'] == pj_id]
-            for _, recipe_item in product_recipe.iterrows():
-                bb_id = int(recipe_item['bahan_baku_id'])
-                needed_for_this_bb = recipe_item['jumlah_dibutuhkan'] * qty_to_make
+            for bb_id, quantity in recipes_by_product.get(pj_id, ()):
+                needed_for_this_bb = quantity * qty_to_make
                 full_forecast_results["bahan_baku_total_needed"][bb_id] = \
                     full_forecast_results["bahan_baku_total_needed"].get(bb_id, 0.0) + needed_for_this_bb
+
+def _full_analysis(forecast_days, history_days, safety_stock_pj_days, safety_stock_bb_days, service_level, quantiles,
+                   end_date_history, block_products=FULL_ANALYSIS_BLOCK_PRODUCTS):
+    """
+    Computes the response of full_analysis_forecast. Returns (response dict, status code).
+    Large catalogs are processed in blocks of block_products products: every block fetches
+    its recipes, history and forecasts, adds its bahan_baku needs to the running totals and
+    is released before the next, so peak memory (sales history, sampled paths, recipes)
+    doesn't grow with the catalog beyond the response itself. Products are visited in the
+    same order either way, so the totals are the same as in one pass.
+    """
+    # The independent queries run concurrently on the I/O pool. Current stocks come from the
+    # change-feed snapshot when it runs (one query per item type otherwise)
+    io = executors.io_executor()
+    queries = executors.submit_all(io, {
+        "produk_jadi_ids": (database.get_all_produk_jadi_ids,),
+        "has_recipes": (database.has_recipes,),
+        "stocks_pj": (change_feed.current_stocks, 'produk_jadi'),
+        "stocks_bb": (change_feed.current_stocks, 'bahan_baku'),
+    })
+    all_produk_jadi_ids = queries["produk_jadi_ids"].result()
+    if not all_produk_jadi_ids:
+        return {"error": "No finished products (produk_jadi) found in the database."}, 404
+
+    start_date_history = end_date_history - timedelta(days=history_days)
     
+    full_forecast_results = {
+        "produk_jadi_forecasts": [],
+        "produk_jadi_to_make": [],
+        "bahan_baku_total_needed": {},
+        "bahan_baku_to_purchase": []
+    }
+    
+    if not queries["has_recipes"].result():
+        return {"error": "No product recipes (resep_produk) found. Cannot calculate material needs."}, 404
+    stocks_pj = queries["stocks_pj"].result()
+    stocks_bb = queries["stocks_bb"].result()
+
+    if 0 < block_products < len(all_produk_jadi_ids):
+        blocks = [all_produk_jadi_ids[i:i + block_products] for i in range(0, len(all_produk_jadi_ids), block_products)]
+    else:
+        blocks = [None] # One block: all products, the whole recipe table
+    next_recipes = io.submit(database.get_recipes, blocks[0])
+    for k, block in enumerate(blocks):
+        recipes_by_product = {}
+        for pj_id, bb_id, quantity in next_recipes.result().itertuples(index=False):
+            recipes_by_product.setdefault(int(pj_id), []).append((int(bb_id), quantity))
+        if k + 1 < len(blocks):
+            next_recipes = io.submit(database.get_recipes, blocks[k + 1])
+
+        # Sales forecast for the block, from the precomputed store when possible. Otherwise
+        # history is fetched in chunks overlapped with inference, dead/intermittent products are
+        # routed to the statistical forecaster and the rest go through batched LSTM passes
+        forecasts = forecasting.get_forecasts(
+            block or all_produk_jadi_ids, start_date_history, end_date_history, forecast_days, quantiles
+        )
+        _fold_full_analysis_block(
+            full_forecast_results, forecasts, recipes_by_product, stocks_pj, forecast_days, safety_stock_pj_days,
+            service_level
+        )
+
     # 3. Calculate bahan_baku to purchase
     # To calculate safety stock for bahan baku, we need average daily usage.
     # This is a bit more complex as usage depends on multi-product recipes.
     # For simplicity, we'll base it on the total needed over the forecast period.
     
     for bb_id, total_needed_for_period in full_forecast_results["bahan_baku_total_needed"].items():
-        current_stock_bb = database.get_current_stock(bb_id, 'bahan_baku')
+        current_stock_bb = stocks_bb.get(bb_id, 0.0)
         avg_daily_usage_bb = total_needed_for_period / forecast_days if forecast_days > 0 else 0
         safety_stock_bb = avg_daily_usage_bb * safety_stock_bb_days
         qty_to_purchase = max(0, round(total_needed_for_period - current_stock_bb + safety_stock_bb))
@@ -212,8 +336,182 @@ def full_analysis_forecast():
             "quantity_to_purchase": qty_to_purchase
         })
 
-    return jsonify(full_forecast_results)
+    return full_forecast_results, 200
+
+
+@app.route('/forecast/aggregate', methods=['GET'])
+def aggregate_forecast():
+    """
+    Aggregate sales forecast for the whole store, per kategori or bahan_baku usage per day,
+    computed from the per-product forecasts (served from the forecast store when current).
+    Query params:
+        - level (str, default 'kategori'): 'total', 'kategori' or 'bahan_baku'.
+        - forecast_days (int, default 7): Number of days to forecast.
+        - history_days (int, default 90): Past sales history to use.
+        - reconcile (0/1, default 0): Combine the product forecasts with forecasts of the
+          kategori/total series so all levels are coherent (see hierarchy.py).
+    """
+    level = request.args.get('level', 'kategori')
+    if level not in hierarchy.LEVELS:
+        return jsonify({"error": f"level must be one of {', '.join(hierarchy.LEVELS)}."}), 400
+    try:
+        forecast_days = int(request.args.get('forecast_days', 7))
+        history_days = int(request.args.get('history_days', 90))
+        reconcile = request.args.get('reconcile', '0') in ('1', 'true')
+    except ValueError:
+        return jsonify({"error": "Invalid query parameter format."}), 400
+    if forecast_days < 0 or history_days < 0:
+        return jsonify({"error": "forecast_days and history_days must not be negative."}), 400
+
+    queries = executors.submit_all(executors.io_executor(), {
+        "produk_jadi_ids": (database.get_all_produk_jadi_ids,),
+        "kategori": (database.get_produk_jadi_kategori,),
+        "recipes": (database.get_recipes,),
+    })
+    all_produk_jadi_ids = queries["produk_jadi_ids"].result()
+    if not all_produk_jadi_ids:
+        return jsonify({"error": "No finished products (produk_jadi) found in the database."}), 404
+    product_hierarchy = hierarchy.get_hierarchy(
+        all_produk_jadi_ids, queries["kategori"].result(), queries["recipes"].result()
+    )
+
+    end_date_history = datetime.now().date()
+    start_date_history = end_date_history - timedelta(days=history_days)
+    forecasts = forecasting.get_forecasts(all_produk_jadi_ids, start_date_history, end_date_history, forecast_days)
+    leaf_forecasts = np.array([forecast["forecasted_sales"] for forecast in forecasts], dtype=float)
+    leaf_forecasts = leaf_forecasts.reshape(len(all_produk_jadi_ids), forecast_days)
+    if reconcile:
+        historical_sales_df = database.get_historical_sales(
+            start_date=start_date_history, end_date=end_date_history, produk_jadi_ids=all_produk_jadi_ids
+        )
+        _, _, daily_sales, _ = timeseries.daily_sales_matrix(
+            historical_sales_df, all_produk_jadi_ids, start_date_history, end_date_history
+        )
+        leaf_forecasts = product_hierarchy.reconcile(leaf_forecasts, daily_sales)
 
+    keys, values = product_hierarchy.aggregate(leaf_forecasts, level)
+    key_name = {'total': 'level', 'kategori': 'kategori', 'bahan_baku': 'bahan_baku_id'}[level]
+    return jsonify({
+        "level": level,
+        "reconciled": reconcile,
+        "forecast_dates": timeseries.forecast_dates(end_date_history, forecast_days),
+        "aggregates": [
+            {
+                key_name: key,
+                "produk_jadi_ids": product_hierarchy.members(level, key),
+                "forecasted_per_day": np.round(row, 2).tolist(),
+                "total_forecasted_period": round(float(row.sum()), 2),
+            }
+            for key, row in zip(keys, values)
+        ],
+    })
+
+@app.route('/forecast/simulation', methods=['POST'])
+def simulate_inventory():
+    """
+    Projects produk_jadi and bahan_baku stock day by day over the forecast horizon for one
+    or more what-if scenarios, evaluated together in one batched simulation (see inventory.py).
+    JSON body (all optional):
+        - forecast_days (int, default 7): Number of days to forecast and simulate.
+        - history_days (int, default 90): Past sales history to use.
+        - scenarios (list): [{"name": str, "demand_scale": float, "safety_stock_pj_days": float,
+                              "safety_stock_bb_days": float, "lead_time_days": int}, ...]
+                            Missing fields take the defaults of inventory.DEFAULT_SCENARIO.
+    Returns the forecast dates and, per scenario, daily stock, production and purchases per item.
+    """
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict) or not isinstance(body.get('scenarios', []), list):
+        return jsonify({"error": "Request body must be a JSON object with an optional 'scenarios' list."}), 400
+    try:
+        forecast_days = int(body.get('forecast_days', 7))
+        history_days = int(body.get('history_days', 90))
+        scenarios = inventory.normalize_scenarios(body.get('scenarios'))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid simulation parameters: {e}"}), 400
+    if forecast_days <= 0 or history_days < 0:
+        return jsonify({"error": "forecast_days must be positive and history_days must not be negative."}), 400
+
+    queries = executors.submit_all(executors.io_executor(), {
+        "produk_jadi_ids": (database.get_all_produk_jadi_ids,),
+        "recipes": (database.get_recipes,),
+        "stocks_pj": (change_feed.current_stocks, 'produk_jadi'),
+        "stocks_bb": (change_feed.current_stocks, 'bahan_baku'),
+    })
+    all_produk_jadi_ids = queries["produk_jadi_ids"].result()
+    if not all_produk_jadi_ids:
+        return jsonify({"error": "No finished products (produk_jadi) found in the database."}), 404
+    recipes_df = queries["recipes"].result()
+    if recipes_df.empty:
+        return jsonify({"error": "No product recipes (resep_produk) found. Cannot calculate material needs."}), 404
+
+    end_date_history = datetime.now().date()
+    start_date_history = end_date_history - timedelta(days=history_days)
+    forecasts = forecasting.get_forecasts(all_produk_jadi_ids, start_date_history, end_date_history, forecast_days)
+
+    produk_jadi_ids, bahan_baku_ids, simulation = inventory.run_scenarios(
+        forecasts, recipes_df, queries["stocks_pj"].result(), queries["stocks_bb"].result(), scenarios
+    )
+    forecast_dates = forecasts[0]["forecast_dates"] if forecasts else []
+    stockout_pj = inventory.first_day(simulation['unmet_demand'] > 0)               # [S, P]
+    stockout_bb = inventory.first_day(simulation['stock_bb'] <= 0)                   # [S, B]
+
+    def date_or_none(day):
+        return forecast_dates[day] if day >= 0 else None
+
+    results = []
+    for s, scenario in enumerate(scenarios):
+        total_demand = simulation['sales'][s].sum() + simulation['unmet_demand'][s].sum()
+        results.append({
+            "scenario": scenario,
+            "fill_rate": round(float(simulation['sales'][s].sum() / total_demand), 4) if total_demand > 0 else 1.0,
+            "produk_jadi": [
+                {
+                    "produk_jadi_id": pj_id,
+                    "projected_stock": simulation['stock_pj'][s, p].tolist(),
+                    "production": simulation['production'][s, p].tolist(),
+                    "unmet_demand": simulation['unmet_demand'][s, p].tolist(),
+                    "total_to_make": float(simulation['production'][s, p].sum()),
+                    "first_stockout_date": date_or_none(stockout_pj[s, p]),
+                }
+                for p, pj_id in enumerate(produk_jadi_ids)
+            ],
+            "bahan_baku": [
+                {
+                    "bahan_baku_id": bb_id,
+                    "projected_stock": np.round(simulation['stock_bb'][s, b], 2).tolist(),
+                    "purchases": simulation['purchases'][s, b].tolist(),
+                    "total_to_purchase": float(simulation['purchases'][s, b].sum()),
+                    "first_stockout_date": date_or_none(stockout_bb[s, b]),
+                }
+                for b, bb_id in enumerate(bahan_baku_ids)
+            ],
+        })
+    return jsonify({"forecast_dates": forecast_dates, "scenarios": results})
+
+@app.route('/stats/coalescing', methods=['GET'])
+def coalescing_stats():
+    """
+    Request coalescing counters of this API process (see single_flight.py), per endpoint:
+    computed (requests that ran the computation), coalesced (requests that waited for an
+    identical one in flight instead) and in_flight.
+    """
+    return jsonify({"enabled": single_flight.DEFAULT_FLIGHTS.enabled, "counters": single_flight.DEFAULT_FLIGHTS.counters()})
+
+@app.route('/stats/micro_batching', methods=['GET'])
+def micro_batching_stats():
+    """
+    Micro-batching counters of this API process (see micro_batch.py): calls (forecast calls
+    handed to the batcher), products, batches (stacked rollouts run) and largest_batch.
+    """
+    batcher = micro_batch.DEFAULT_BATCHER
+    return jsonify({
+        "enabled": batcher.enabled,
+        "max_wait_ms": batcher.max_wait * 1000,
+        "max_batch_size": batcher.max_batch_size,
+        "counters": batcher.counters(),
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001) # Run on a different port than Laravel's default
\ No newline at end of file
@@ -0,0 +1,197 @@
+# File: backtest.py
+# ---------------------------
+# Rolling-origin backtesting of the trained per-product models.
+# For every product, forecasts are replayed from many origins over its daily history:
+# at each origin the model sees the previous SEQUENCE_LENGTH days and forecasts the
+# next `horizon` days, exactly like the API does. All origins of a product are run as
+# a single batched rollout ([n_origins, sequence_length, n_features] input tensor), and products
+# are evaluated in parallel worker processes.
+# With several --precision values the same origins are replayed with every weight precision
+# (see weight_store.WEIGHT_PRECISION), reporting the accuracy delta of the reduced-precision
+# exports versus the float32 model.
+#
+# Usage:
+#     python backtest.py --horizon 14 --step 1
+#     python backtest.py --models-dir ./trained_models/Balanced_models --output balanced.csv
+#     python backtest.py --precision float32 float16 int8 --start-date 2024-01-01
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from dotenv import load_dotenv
+
+import database
+import features
+import timeseries
+import weight_store
+
+load_dotenv()
+
+MODELS_DIR = os.getenv('MODELS_DIR', './trained_models/')
+
+
+def backtest_product(weights, daily_sales, horizon=14, step=1):
+    """
+    Replays forecasts from every `step`-th origin of one product's daily series.
+    - weights: The product's weights from weight_store (including its scaler parameters).
+    - daily_sales: 1-D array of daily sales, already resampled (see timeseries.py); a pd.Series
+                   indexed by date for models with calendar covariates (see features.py).
+    Returns (predictions, actuals), both float arrays [n_origins, horizon], with predictions
+    post-processed like the API (inverse-scaled, rounded, non-negative). Empty if the
+    series is shorter than sequence_length + horizon.
+    """
+    sequence_length = weights['sequence_length']
+    feature_set = weights.get('feature_set', 'sales')
+    if feature_set != 'sales' and not isinstance(daily_sales, pd.Series):
+        raise ValueError(f"Models with the '{feature_set}' feature set need the daily sales as a date-indexed pd.Series.")
+    first_date = daily_sales.index[0] if feature_set != 'sales' else None
+    daily_sales = np.asarray(daily_sales, dtype=np.float64)
+    n_origins = (len(daily_sales) - sequence_length - horizon) // step + 1
+    if n_origins <= 0:
+        return np.empty((0, horizon)), np.empty((0, horizon))
+
+    inputs_by_day = features.model_inputs(feature_set, weight_store.scale_values(weights, daily_sales), first_date)
+    # Origin k forecasts days origin_k .. origin_k + horizon - 1 from the sequence_length days before it
+    origins = sequence_length + step * np.arange(n_origins)
+    inputs = sliding_window_view(inputs_by_day, sequence_length, axis=0)[origins - sequence_length].swapaxes(1, 2)
+    actuals = sliding_window_view(daily_sales, horizon)[origins]
+    covariates = None
+    if feature_set != 'sales': # Known covariates of each origin's forecast days
+        covariates = sliding_window_view(inputs_by_day[:, 1:], horizon, axis=0)[origins].swapaxes(1, 2)
+
+    predictions_scaled = weight_store.rollout(weights, inputs, horizon, covariates=covariates) # [n_origins, horizon]
+    predictions = weight_store.unscale_values(weights, predictions_scaled)
+    return np.maximum(np.round(predictions), 0), actuals
+
+
+def forecast_errors(predictions, actuals):
+    """
+    Error metrics per horizon step (1-based) for arrays [n_origins, horizon].
+    MAPE only counts days with actual sales (it is undefined on zero-sales days).
+    Returns a DataFrame with columns horizon, n_origins, mae, mape, bias.
+    """
+    errors = predictions - actuals
+    days_with_sales = actuals > 0
+    pct_errors = np.abs(errors) / np.where(days_with_sales, actuals, 1.0)
+    n_days_with_sales = days_with_sales.sum(axis=0)
+    mape = np.where(
+        n_days_with_sales > 0,
+        100 * (pct_errors * days_with_sales).sum(axis=0) / np.maximum(n_days_with_sales, 1),
+        np.nan
+    )
+    return pd.DataFrame({
+        'horizon': np.arange(1, actuals.shape[1] + 1),
+        'n_origins': actuals.shape[0],
+        'mae': np.abs(errors).mean(axis=0),
+        'mape': mape,
+        'bias': errors.mean(axis=0),
+    })
+
+
+def _backtest_worker(args):
+    produk_jadi_id, daily_sales, models_dir, horizon, step, precisions = args
+    results = []
+    reference = None
+    for precision in precisions:
+        weights = weight_store.load_product(produk_jadi_id, models_dir, precision)
+        if weights is None:
+            return produk_jadi_id, None
+        predictions, actuals = backtest_product(weights, daily_sales, horizon, step)
+        if len(actuals) == 0:
+            return produk_jadi_id, None
+        reference = predictions if reference is None else reference
+        result = forecast_errors(predictions, actuals)
+        result.insert(0, 'precision', precision)
+        result.insert(0, 'produk_jadi_id', produk_jadi_id)
+        # Mean absolute change of the forecasts versus the first precision (0 for that one)
+        result['forecast_change'] = np.abs(predictions - reference).mean(axis=0)
+        results.append(result)
+    return produk_jadi_id, pd.concat(results, ignore_index=True)
+
+
+def run_backtest(series_by_product, models_dir=MODELS_DIR, horizon=14, step=1, workers=None, precisions=('float32',)):
+    """
+    Backtests many products in parallel.
+    - series_by_product: dict {produk_jadi_id: daily sales} (see backtest_product).
+    - precisions: weight precisions to evaluate on the same origins (the first one is the reference).
+    Returns a DataFrame with one row per (produk_jadi_id, precision, horizon) and the columns of
+    forecast_errors plus forecast_change.
+    """
+    tasks = [(pid, series, models_dir, horizon, step, tuple(precisions)) for pid, series in series_by_product.items()]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for produk_jadi_id, result in executor.map(_backtest_worker, tasks):
+            if result is None:
+                print(f"Skipping produk_jadi_id {produk_jadi_id}: no model in {models_dir} or not enough history.")
+            else:
+                results.append(result)
+    if not results:
+        return pd.DataFrame(columns=['produk_jadi_id', 'precision', 'horizon', 'n_origins', 'mae', 'mape', 'bias',
+                                     'forecast_change'])
+    return pd.concat(results, ignore_index=True)
+
+
+def precision_deltas(results):
+    """
+    Per-product accuracy of every precision averaged over horizons, with the MAE/MAPE change
+    versus the reference (first) precision. Returns a DataFrame indexed by (produk_jadi_id, precision).
+    """
+    summary = results.groupby(['produk_jadi_id', 'precision'], sort=False)[
+        ['mae', 'mape', 'bias', 'forecast_change']
+    ].mean()
+    reference = summary.groupby(level='produk_jadi_id').transform('first')
+    summary['delta_mae'] = summary['mae'] - reference['mae']
+    summary['delta_mape'] = summary['mape'] - reference['mape']
+    return summary
+
+
+def load_series_from_database(start_date=None, end_date=None):
+    """Fetches all sales once and resamples every product to its daily series (same spans as train.py)."""
+    sales_df = database.get_historical_sales(start_date=start_date, end_date=end_date)
+    dates, produk_ids, daily_sales, observed = timeseries.daily_sales_matrix(sales_df)
+    series_by_product = {}
+    for row, produk_id in enumerate(produk_ids):
+        span = timeseries.observed_span(observed[row])
+        if span is not None: # Date-indexed, so calendar covariates line up (see features.py)
+            series_by_product[produk_id] = pd.Series(daily_sales[row, span[0]:span[1] + 1], index=dates[span[0]:span[1] + 1])
+    return series_by_product
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the trained LSTM models")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--horizon', type=int, default=14, help="Days forecast from every origin")
+    parser.add_argument('--step', type=int, default=1, help="Days between consecutive origins")
+    parser.add_argument('--start-date', help="First sales date to use (YYYY-MM-DD)")
+    parser.add_argument('--end-date', help="Last sales date to use (YYYY-MM-DD)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--output', help="Write the per product/horizon metrics to this CSV file")
+    parser.add_argument('--precision', nargs='+', choices=weight_store.PRECISIONS, default=['float32'],
+                        help="Weight precisions to compare (the first one is the reference)")
+    args = parser.parse_args()
+
+    series_by_product = load_series_from_database(args.start_date, args.end_date)
+    if not series_by_product:
+        print("No historical sales data found in the database.")
+        return
+
+    results = run_backtest(series_by_product, args.models_dir, args.horizon, args.step, args.workers, args.precision)
+    if results.empty:
+        print("Nothing to backtest.")
+        return
+
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    summary = precision_deltas(results)
+    if len(args.precision) == 1:
+        summary = summary[['mae', 'mape', 'bias']]
+    print("\nMean over horizons:")
+    print(summary.to_string(float_format=lambda v: f"{v:.3f}"))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Metrics written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# File: benchmarks/bench_micro_batch.py
+# ---------------------------
+# Throughput of single-product forecasts under concurrency, with and without the
+# micro-batcher (micro_batch.py). `clients` threads of one process call
+# forecasting.fetch_and_forecast for one product at a time, like concurrent single-product
+# API requests served by one gunicorn worker with GUNICORN_THREADS > 1: every call queries
+# its history (from the bundled sample dump, imported into a temporary SQLite database)
+# and goes through the same I/O and predict pools (executors.py) as the API. HTTP excluded.
+# Reports forecasts/s, mean latency and the mean batch size for every combination, and
+# checks that batched forecasts equal the unbatched ones.
+#     python -m benchmarks.bench_micro_batch
+#     python -m benchmarks.bench_micro_batch --clients 1 8 32 --wait-ms 1 2 5 --horizon 30
+import os
+os.environ.setdefault('OMP_NUM_THREADS', '1') # Same as the gunicorn workers (before NumPy is imported)
+import argparse
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import database
+import executors
+import forecasting
+import intermittent
+import micro_batch
+import model_utils
+import storage
+import weight_store
+from benchmarks.sample_data import import_dump, sample_datasets
+
+
+def load_products(dataset, history_days, models_dir, scratch):
+    """
+    Serves the dump of dataset from a SQLite database in scratch and the models of models_dir.
+    Returns (product ids forecast by their LSTM, start date, end date of the history window).
+    """
+    storage.set_backend(import_dump(sample_datasets()[dataset], os.path.join(scratch, "sample_data.db")))
+    weight_store.DEFAULT_STORE = weight_store.WeightStore(models_dir) # model_utils reads the weights from the default store
+    sales = database.get_historical_sales()
+    end_date = sales['sale_date'].max()
+    start_date = end_date - timedelta(days=history_days)
+    product_ids = [int(pid) for pid in sorted(sales['produk_jadi_id'].unique())]
+    forecasts = forecasting.fetch_and_forecast(product_ids, start_date, end_date, 1)
+    # Dead and intermittent products never reach a model, so they would not exercise the batcher
+    active = [forecast["produk_jadi_id"] for forecast in forecasts
+              if forecast["demand_class"] == intermittent.DEMAND_ACTIVE and forecast["warning"] is None]
+    return active, start_date, end_date
+
+
+def run(product_ids, start_date, end_date, clients, horizon, duration):
+    """Runs `clients` threads forecasting one product per call for `duration` seconds. Returns (calls, mean_latency_s)."""
+    counts = {"calls": 0, "latency": 0.0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        k = offset
+        while time.perf_counter() < stop_at:
+            pid = product_ids[k % len(product_ids)]
+            started = time.perf_counter()
+            forecasting.fetch_and_forecast([pid], start_date, end_date, horizon)
+            elapsed = time.perf_counter() - started
+            with lock:
+                counts["calls"] += 1
+                counts["latency"] += elapsed
+            k += 1
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["calls"], counts["latency"] / max(counts["calls"], 1)
+
+
+def check_equal(product_ids, start_date, end_date, horizon, clients, batcher):
+    """Whether the forecasts of `clients` concurrent calls through batcher equal the direct forecasts."""
+    micro_batch.DEFAULT_BATCHER = micro_batch.MicroBatcher(0, batcher.max_batch_size) # Off
+    expected = {pid: forecasting.fetch_and_forecast([pid], start_date, end_date, horizon)[0] for pid in product_ids}
+    micro_batch.DEFAULT_BATCHER = batcher
+    results = [None] * clients
+
+    def client(k):
+        pid = product_ids[k % len(product_ids)]
+        results[k] = forecasting.fetch_and_forecast([pid], start_date, end_date, horizon)[0] == expected[pid]
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-product forecast throughput with and without micro-batching")
+    parser.add_argument("--dataset", default="large", help="Bundled sample dump (sample_data_<name>.sql)")
+    parser.add_argument("--models-dir", default=model_utils.MODELS_DIR)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[1.0, 2.0, 5.0])
+    parser.add_argument("--max-batch-size", type=int, default=micro_batch.MICRO_BATCH_MAX_SIZE)
+    parser.add_argument("--horizon", type=int, default=7)
+    parser.add_argument("--history-days", type=int, default=90)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        product_ids, start_date, end_date = load_products(args.dataset, args.history_days, args.models_dir, scratch)
+        if not product_ids:
+            raise SystemExit(f"No products of dataset '{args.dataset}' are forecast by a model in {args.models_dir}")
+        print(f"{len(product_ids)} products, horizon {args.horizon}, {args.duration:.0f}s per run, "
+              f"PREDICT_WORKERS={executors.PREDICT_WORKERS}, IO_WORKERS={executors.IO_WORKERS}")
+        print(f"{'clients':>7} {'wait ms':>8} {'calls/s':>9} {'mean ms':>9} {'batch':>6} {'speedup':>8}")
+        for clients in args.clients:
+            baseline = None
+            for wait_ms in [0.0] + args.wait_ms:
+                micro_batch.DEFAULT_BATCHER = micro_batch.MicroBatcher(wait_ms, args.max_batch_size)
+                run(product_ids, start_date, end_date, clients, args.horizon, min(1.0, args.duration)) # Warm-up
+                before = micro_batch.DEFAULT_BATCHER.counters()
+                calls, latency = run(product_ids, start_date, end_date, clients, args.horizon, args.duration)
+                after = micro_batch.DEFAULT_BATCHER.counters()
+                batches = after["batches"] - before["batches"]
+                batch_size = (after["products"] - before["products"]) / batches if batches else 1.0
+                throughput = calls / args.duration
+                baseline = baseline or throughput
+                print(f"{clients:>7} {wait_ms if wait_ms else 'off':>8} {throughput:>9.1f} {latency * 1000:>9.2f} "
+                      f"{batch_size:>6.1f} {throughput / baseline:>7.2f}x")
+        batcher = micro_batch.MicroBatcher(max(args.wait_ms), args.max_batch_size)
+        print(f"Batched forecasts equal unbatched: "
+              f"{check_equal(product_ids, start_date, end_date, args.horizon, max(args.clients), batcher)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# File: benchmarks/bench_predict_loop.py
+# ---------------------------
+# Micro-benchmark of the serving predict path on the real trained models (trained_models/
+# and trained_models/Balanced_models/, each with the history of its bundled sample dump).
+# Times every stage separately:
+#   - load:    weight_store.load_product per product (median over the products), from the
+#              artifacts in the directory (.keras falls back to TensorFlow) and from a
+#              fresh .npz export (the serving case)
+#   - scale:   weight_store.scale_values of the last input windows
+#   - step:    every autoregressive step of the rollout (LSTM forward + feeding the
+#              prediction back into the window), instrumented like weight_store.rollout
+#   - unscale: weight_store.unscale_values of the predictions
+#   - rollout: the whole weight_store.rollout call
+# for several horizons and batch sizes (products stacked into one rollout, cycling through
+# the models of the directory). Times are the best of --repeats runs (as with timeit, the
+# minimum is the run least disturbed by other load on the machine).
+#
+# Results are compared with a stored baseline (benchmarks/baselines/predict_loop.json); the
+# run fails (exit code 1) when a stage is slower than the baseline by more than --tolerance
+# and by more than --min-delta-ms, or when the instrumented steps stop matching the rollout.
+# Baselines depend on the machine: record one on the machine that runs the check.
+#     python -m benchmarks.bench_predict_loop
+#     python -m benchmarks.bench_predict_loop --horizons 7 30 --batch-sizes 1 64 --repeats 50
+#     python -m benchmarks.bench_predict_loop --save-baseline
+import os
+os.environ.setdefault('OMP_NUM_THREADS', '1') # Same as the gunicorn workers (before NumPy is imported)
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+import timeseries
+import weight_store
+from benchmarks.sample_data import REPO_DIR, load_historical_sales, sample_datasets
+
+# Model directory (relative to the repository) -> sample dump its models were trained on
+MODEL_SETS = {
+    'trained_models': 'large',
+    'trained_models/Balanced_models': 'large_balanced',
+}
+DEFAULT_BASELINE = os.path.join(REPO_DIR, 'benchmarks', 'baselines', 'predict_loop.json')
+# Stages checked against the baseline (single steps are reported only, they are too noisy)
+CHECKED_METRICS = ('load', 'load_npz', 'scale', 'step', 'unscale', 'rollout')
+
+
+def _best_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def timed_rollout(weights, last_sequences, forecast_horizon_days):
+    """
+    weight_store.rollout for univariate models, timing every step.
+    Returns (scaled predictions, [seconds per step]).
+    """
+    weights = weight_store.dequantize_weights(weights)
+    window = np.array(last_sequences, dtype=np.float32)
+    predictions = np.zeros(window.shape[:-2] + (forecast_horizon_days,), dtype=np.float32)
+    step_times = []
+    for step in range(forecast_horizon_days):
+        started = time.perf_counter()
+        next_step = weight_store.lstm_forward(weights, window)
+        predictions[..., step] = next_step
+        window = np.concatenate([window[..., 1:, :], next_step[..., None, None]], axis=-2)
+        step_times.append(time.perf_counter() - started)
+    return predictions, step_times
+
+
+def load_model_set(models_dir, dataset, repeats):
+    """
+    Loads the models of one directory and the matching history.
+    Returns (weights by product id, last sales by product id, load metrics).
+    """
+    product_ids = weight_store.list_product_ids(models_dir)
+    # The first loads import TensorFlow/joblib, which is not part of a load
+    weights = {pid: weight_store.load_product(pid, models_dir) for pid in product_ids}
+    metrics = {"load": statistics.median(
+        _best_ms(lambda: weight_store.load_product(pid, models_dir), repeats) for pid in product_ids
+    )}
+
+    # The serving case: the same models exported to .npz (in a scratch copy, the directory is not touched)
+    with tempfile.TemporaryDirectory() as scratch:
+        for pid in product_ids:
+            # The scaler first: an export older than the scaler would be read with the scaler file
+            shutil.copy(weight_store.scaler_path(pid, models_dir), weight_store.scaler_path(pid, scratch))
+            weight_store.save_weights_npz(weights[pid], weight_store.weights_path(pid, scratch))
+        metrics["load_npz"] = statistics.median(
+            _best_ms(lambda: weight_store.load_product(pid, scratch), repeats) for pid in product_ids
+        )
+
+    sales = load_historical_sales(sample_datasets()[dataset])
+    _, ids, daily_sales, _ = timeseries.daily_sales_matrix(sales, product_ids)
+    last_sales = {pid: daily_sales[row] for row, pid in enumerate(ids)}
+    return weights, last_sales, metrics
+
+
+def run_case(weights, last_sales, horizon, batch_size, repeats):
+    """Metrics (ms) of one horizon and batch size, plus whether the instrumented rollout equals weight_store.rollout."""
+    product_ids = list(weights)
+    members = [product_ids[k % len(product_ids)] for k in range(batch_size)]
+    stacked_weights = weight_store.stack_weights([weights[pid] for pid in members])
+    sequence_length = stacked_weights['sequence_length']
+    last_windows = np.stack([last_sales[pid][-sequence_length:] for pid in members]) # [batch, sequence_length]
+
+    scaled = weight_store.scale_values(stacked_weights, last_windows)
+    sequences = scaled[:, None, :, None] # [batch, 1, sequence_length, 1], as model_utils builds them
+    predictions, _ = timed_rollout(stacked_weights, sequences, horizon)
+
+    step_times = np.array([timed_rollout(stacked_weights, sequences, horizon)[1] for _ in range(repeats)])
+    steps = step_times.min(axis=0) * 1000 # Per step, best over the repeats
+    return {
+        "scale": _best_ms(lambda: weight_store.scale_values(stacked_weights, last_windows), repeats),
+        "step": float(steps.mean()),
+        "step_first": float(steps[0]),
+        "step_last": float(steps[-1]),
+        "unscale": _best_ms(lambda: weight_store.unscale_values(stacked_weights, predictions[:, 0]), repeats),
+        "rollout": _best_ms(lambda: weight_store.rollout(stacked_weights, sequences, horizon), repeats),
+    }, np.array_equal(predictions, weight_store.rollout(stacked_weights, sequences, horizon))
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Metrics slower than the baseline by more than tolerance (relative) and min_delta_ms: [(name, baseline, now)]."""
+    regressions = []
+    for name, now in results.items():
+        if name.rsplit('/', 1)[-1] not in CHECKED_METRICS:
+            continue
+        before = baseline.get(name)
+        if before is not None and now > before * (1 + tolerance) and now - before > min_delta_ms:
+            regressions.append((name, before, now))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage timings of the predict loop on the trained models")
+    parser.add_argument("--model-sets", nargs="+", default=list(MODEL_SETS),
+                        help="Model directories (relative to the repository), from: " + ", ".join(MODEL_SETS))
+    parser.add_argument("--horizons", type=int, nargs="+", default=[7, 14, 30])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative slowdown (0.3 = 30%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Slowdowns below this are noise")
+    args = parser.parse_args()
+
+    results = {}
+    consistent = True
+    print(f"{'models':<31} {'h':>3} {'batch':>5} {'scale':>8} {'step':>8} {'first':>8} {'last':>8} "
+          f"{'unscale':>8} {'rollout':>9}  (ms)")
+    for model_set in args.model_sets:
+        weights, last_sales, load_metrics = load_model_set(os.path.join(REPO_DIR, model_set), MODEL_SETS[model_set], args.repeats)
+        print(f"{model_set:<31} load {load_metrics['load']:.2f} ms per model, "
+              f"{load_metrics['load_npz']:.2f} ms from .npz ({len(weights)} models)")
+        results.update({f"{model_set}/{name}": value for name, value in load_metrics.items()})
+        for horizon in args.horizons:
+            for batch_size in args.batch_sizes:
+                metrics, equal = run_case(weights, last_sales, horizon, batch_size, args.repeats)
+                consistent &= equal
+                results.update({f"{model_set}/h{horizon}/b{batch_size}/{name}": value for name, value in metrics.items()})
+                print(f"{model_set:<31} {horizon:>3} {batch_size:>5} {metrics['scale']:>8.3f} {metrics['step']:>8.3f} "
+                      f"{metrics['step_first']:>8.3f} {metrics['step_last']:>8.3f} {metrics['unscale']:>8.3f} "
+                      f"{metrics['rollout']:>9.3f}")
+    print(f"Instrumented steps match weight_store.rollout: {consistent}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                "machine": f"{platform.machine()} {platform.processor() or platform.platform()}",
+                "numpy": np.__version__,
+                "repeats": args.repeats,
+                "metrics_ms": {name: round(value, 4) for name, value in sorted(results.items())},
+            }, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["metrics_ms"], args.tolerance, args.min_delta_ms)
+    for name, before, now in regressions:
+        print(f"REGRESSION {name}: {before:.3f} ms -> {now:.3f} ms ({now / before - 1:+.0%})")
+    if regressions or not consistent:
+        sys.exit(1)
+    print(f"No stage slower than the baseline by more than {args.tolerance:.0%} ({baseline['machine']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# File: benchmarks/bench_training.py
+# ---------------------------
+# Epoch wall-time of the training modes in train.py ('default' vs 'cpu_optimized') on the
+# bundled sample datasets (sample_data_*.sql, parsed directly, no database needed).
+# Every product of every dataset is trained in both modes with the same data split; the
+# report shows the median epoch time (first epoch excluded: it includes tracing/XLA
+# compilation, shown separately; the median also ignores the occasional later epoch that
+# compiles a leftover batch shape) summed over products, and the mean best validation loss,
+# so a speedup that costs accuracy is visible.
+#     python -m benchmarks.bench_training
+#     python -m benchmarks.bench_training --datasets large --epochs 20 --intra-op-threads 4
+#     python -m benchmarks.bench_training --precision mixed_bfloat16
+import argparse
+import time
+import numpy as np
+
+import train
+from benchmarks.sample_data import load_historical_sales, sample_datasets
+
+MODES = ('default', 'cpu_optimized')
+
+
+def _epoch_timer():
+    from tensorflow.keras.callbacks import Callback
+
+    class EpochTimer(Callback):
+        def on_train_begin(self, logs=None):
+            self.times = []
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self._started = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.times.append(time.perf_counter() - self._started)
+
+    return EpochTimer()
+
+
+def bench_product(produk_jadi_id, sales_df, mode, epochs):
+    """Trains one product in `mode`. Returns (first_epoch_s, median_later_epoch_s, best_val_loss) or None."""
+    config = dict(train.DEFAULT_TRAINING_CONFIG, epochs=epochs)
+    prepared = train.prepare_training_data(produk_jadi_id, sales_df, config['sequence_length'], config['feature_set'])
+    if prepared is None:
+        return None
+    _, X_train, X_test, y_train, y_test = prepared
+    model = train.build_model(config, mode)
+    timer = _epoch_timer()
+    history = train.fit_model(model, config, X_train, y_train, X_test, y_test, mode=mode,
+                              callbacks=[timer], verbose=0)
+    return timer.times[0], float(np.median(timer.times[1:])), float(min(history.history['val_loss']))
+
+
+def main():
+    datasets = sample_datasets()
+    parser = argparse.ArgumentParser(description="Epoch wall-time of the train.py training modes")
+    parser.add_argument("--datasets", nargs="+", choices=sorted(datasets), default=sorted(datasets))
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--precision", default=train.TRAINING_PRECISION, help="float32 or mixed_bfloat16")
+    parser.add_argument("--intra-op-threads", type=int, default=train.TF_INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=train.TF_INTER_OP_THREADS)
+    args = parser.parse_args()
+
+    train.configure_tensorflow(args.precision, args.intra_op_threads, args.inter_op_threads)
+    print(f"precision={args.precision} epochs={args.epochs} intra_op_threads={args.intra_op_threads or 'auto'} "
+          f"inter_op_threads={args.inter_op_threads or 'auto'} "
+          f"cpu_optimized batch_size={train.CPU_OPTIMIZED_BATCH_SIZE}")
+    print(f"{'dataset':>18} {'mode':>14} {'products':>8} {'1st epoch s':>11} {'epoch s':>9} {'speedup':>8} {'val_loss':>9}")
+    for name in args.datasets:
+        sales_df = load_historical_sales(datasets[name])
+        series = list(train.iter_training_series(sorted(sales_df['produk_jadi_id'].unique()), sales_df))
+        baseline = None
+        for mode in MODES:
+            results = [bench_product(pid, df, mode, args.epochs) for pid, df in series if df is not None]
+            results = [result for result in results if result is not None]
+            if not results:
+                print(f"{name:>18} {mode:>14}  no trainable products")
+                continue
+            first, epoch, val_loss = (np.sum([r[0] for r in results]), np.sum([r[1] for r in results]),
+                                      np.mean([r[2] for r in results]))
+            baseline = epoch if baseline is None else baseline
+            print(f"{name:>18} {mode:>14} {len(results):>8} {first:>11.2f} {epoch:>9.3f} "
+                  f"{baseline / epoch:>7.1f}x {val_loss:>9.5f}")
+
+
+if __name__ == '__main__':
+    main()
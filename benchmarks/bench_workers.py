@@ -0,0 +1,146 @@
+# File: benchmarks/bench_workers.py
+# ---------------------------
+# Memory and throughput of the production server (gunicorn.conf.py) versus worker count.
+# For every worker count it starts gunicorn, warms it up, hammers one endpoint with
+# concurrent clients for a fixed time and reports:
+#   - RSS: resident memory summed over master + workers (counts shared pages once per process)
+#   - PSS: proportional set size summed over master + workers (shared pages split between
+#          the processes that share them, i.e. the real memory cost of the whole server)
+#   - requests/s and mean latency
+# Run with and without preloading to see what copy-on-write sharing saves:
+#     python -m benchmarks.bench_workers --workers 1 2 4 8
+#     python -m benchmarks.bench_workers --workers 1 2 4 8 --no-preload
+# Linux only (reads /proc). Point --path at an endpoint backed by a populated database
+# for meaningful throughput numbers, e.g. --path "/forecast/full_analysis?forecast_days=14".
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _children(pid):
+    children = []
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        with open(os.path.join(task_dir, tid, "children")) as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def _memory_kb(pid):
+    """Returns (rss_kb, pss_kb) of one process from /proc/<pid>/smaps_rollup."""
+    rss = pss = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def _wait_for_port(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+def _load(url, clients, duration):
+    """Runs `clients` threads issuing GET requests for `duration` seconds. Returns (requests, errors, mean_latency_s)."""
+    counts = {"ok": 0, "errors": 0, "latency": 0.0}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    response.read()
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                counts["ok" if ok else "errors"] += 1
+                counts["latency"] += elapsed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = counts["ok"] + counts["errors"]
+    return counts["ok"], counts["errors"], counts["latency"] / total if total else 0.0
+
+
+def run_one(workers, args):
+    env = dict(os.environ)
+    env.update({
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+        "GUNICORN_PRELOAD": "0" if args.no_preload else "1",
+        "GUNICORN_ACCESS_LOG": "/dev/null",
+    })
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:application"],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not _wait_for_port(args.port, args.startup_timeout):
+            raise RuntimeError(f"gunicorn with {workers} workers did not start")
+        url = f"http://127.0.0.1:{args.port}{args.path}"
+        _load(url, args.clients, args.warmup) # Every worker loads/touches what it needs
+        ok, errors, latency = _load(url, args.clients, args.duration)
+
+        pids = [server.pid] + _children(server.pid)
+        rss = pss = 0
+        for pid in pids:
+            process_rss, process_pss = _memory_kb(pid)
+            rss += process_rss
+            pss += process_pss
+        return {
+            "workers": workers,
+            "rss_mb": rss / 1024,
+            "pss_mb": pss / 1024,
+            "req_per_s": ok / args.duration,
+            "mean_latency_ms": latency * 1000,
+            "errors": errors,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gunicorn memory and throughput versus worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/forecast/produk_jadi/1?forecast_days=7")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=5091)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--no-preload", action="store_true", help="Every worker loads its own weights")
+    args = parser.parse_args()
+
+    print(f"preload={'off' if args.no_preload else 'on'} path={args.path} clients={args.clients}")
+    print(f"{'workers':>7} {'RSS MB':>9} {'PSS MB':>9} {'req/s':>9} {'mean ms':>9} {'errors':>7}")
+    for workers in args.workers:
+        result = run_one(workers, args)
+        print(f"{result['workers']:>7} {result['rss_mb']:>9.1f} {result['pss_mb']:>9.1f} "
+              f"{result['req_per_s']:>9.1f} {result['mean_latency_ms']:>9.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
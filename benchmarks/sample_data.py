@@ -0,0 +1,41 @@
+# File: benchmarks/sample_data.py
+# ---------------------------
+# Reads the bundled sample_data_*.sql dumps without a MySQL server, so benchmarks can
+# run on the same data the API is developed against. A dump is imported with
+# storage.import_sql_dump into a temporary SQLite database and queried through
+# database.py, so the benchmarks parse and aggregate the dumps exactly like the API.
+import glob
+import os
+import tempfile
+
+import database
+import storage
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_datasets():
+    """Returns {dataset name: path} of the bundled dumps, e.g. {'large': '.../sample_data_large.sql'}."""
+    paths = sorted(glob.glob(os.path.join(REPO_DIR, "sample_data_*.sql")))
+    return {os.path.basename(path)[len("sample_data_"):-len(".sql")]: path for path in paths}
+
+
+def import_dump(path, db_path):
+    """Imports one dump into a new SQLite database at db_path. Returns a read-only backend on it."""
+    storage.import_sql_dump(storage.SQLiteBackend(db_path, read_only=False), path)
+    return storage.SQLiteBackend(db_path)
+
+
+def load_historical_sales(path):
+    """
+    Imports one dump and returns its daily sales per product from database.get_historical_sales
+    (sale_date, produk_jadi_id, total_sold_on_day), ordered by produk_jadi_id, sale_date.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        backend = import_dump(path, os.path.join(scratch, "sample_data.db"))
+        previous = storage.get_backend()
+        storage.set_backend(backend)
+        try:
+            return database.get_historical_sales()
+        finally:
+            storage.set_backend(previous)
@@ -0,0 +1,246 @@
+# File: change_feed.py
+# ---------------------------
+# Change feed over penjualan and log_transaksi: polls both tables by auto-increment id
+# (WHERE id > last seen id, an index range scan on the primary key) and publishes which
+# produk_jadi and bahan_baku changed, so subscribers refresh only those items:
+#   - StockSnapshot keeps current stocks in memory and applies the new log_transaksi
+#     rows as deltas instead of re-summing the whole log per request.
+#   - The watcher (python change_feed.py) recomputes the stored forecasts of the
+#     products with new sales (precompute_forecasts.refresh), not the whole catalog.
+# Every poll costs two indexed queries plus work proportional to the new rows.
+#
+# Rows are picked up in id order. MySQL can commit a lower auto-increment id after a
+# higher one was already seen; such a row is skipped by the feed, so the stock snapshot
+# is also fully reloaded every STOCK_SNAPSHOT_RELOAD_SECONDS.
+#     python change_feed.py                  # watcher: targeted forecast refresh
+#     python change_feed.py --interval 10
+import argparse
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+import database
+
+load_dotenv()
+
+CHANGE_FEED_INTERVAL = float(os.getenv('CHANGE_FEED_INTERVAL', 0)) # Seconds between polls in the API workers; 0 = off
+CHANGE_FEED_BATCH_ROWS = int(os.getenv('CHANGE_FEED_BATCH_ROWS', 10000)) # Rows read per table per query
+CHANGE_FEED_STATE_PATH = os.getenv('CHANGE_FEED_STATE_PATH', './forecast_store/change_feed.json') # Watcher checkpoint
+STOCK_SNAPSHOT_RELOAD_SECONDS = float(os.getenv('STOCK_SNAPSHOT_RELOAD_SECONDS', 3600))
+ITEM_TYPES = ('produk_jadi', 'bahan_baku')
+
+
+def empty_changes():
+    """
+    A change set, as published to subscribers:
+    - sold: produk_jadi ids with new penjualan rows (their forecasts are outdated).
+    - stock_deltas: {item_type: {item_id: sum of new log_transaksi jumlah}}.
+    - penjualan_id / log_transaksi_id: last id included.
+    """
+    return {"sold": set(), "stock_deltas": {item_type: {} for item_type in ITEM_TYPES},
+            "penjualan_id": None, "log_transaksi_id": None}
+
+
+class ChangeFeed:
+    """
+    Polls penjualan and log_transaksi for rows after the last seen ids and calls every
+    subscriber with the resulting change set. Starts at the current end of both tables
+    unless a position is given (or stored in state_path).
+    """
+
+    def __init__(self, positions=None, state_path=None, batch_rows=CHANGE_FEED_BATCH_ROWS):
+        self.state_path = state_path
+        self.batch_rows = batch_rows
+        self.positions = positions or self._load_state() or database.get_max_change_ids()
+        if self.positions is None:
+            raise RuntimeError("Could not read the current penjualan/log_transaksi ids from the database.")
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def _load_state(self):
+        if not self.state_path:
+            return None
+        try:
+            with open(self.state_path) as f:
+                return {table: int(position) for table, position in json.load(f).items()}
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.positions, f)
+        os.replace(tmp_path, self.state_path)
+
+    def subscribe(self, callback):
+        """callback(changes) is called after every poll that found new rows."""
+        self._subscribers.append(callback)
+
+    def poll(self):
+        """
+        Reads all rows added since the last poll (in batches of batch_rows) and publishes them.
+        Returns the change set, or None when nothing changed.
+        """
+        with self._lock:
+            changes = empty_changes()
+            found = False
+            while True:
+                sales = database.get_sales_since(self.positions['penjualan'], self.batch_rows)
+                if sales.empty:
+                    break
+                found = True
+                changes["sold"].update(int(pid) for pid in sales['produk_jadi_id'])
+                self.positions['penjualan'] = int(sales['id'].iloc[-1])
+                if len(sales) < self.batch_rows:
+                    break
+            while True:
+                transactions = database.get_transactions_since(self.positions['log_transaksi'], self.batch_rows)
+                if transactions.empty:
+                    break
+                found = True
+                totals = transactions.groupby(['tipe_item', 'item_id'])['jumlah'].sum()
+                for (item_type, item_id), delta in totals.items():
+                    deltas = changes["stock_deltas"].setdefault(item_type, {})
+                    deltas[int(item_id)] = deltas.get(int(item_id), 0.0) + float(delta)
+                self.positions['log_transaksi'] = int(transactions['id'].iloc[-1])
+                if len(transactions) < self.batch_rows:
+                    break
+            if not found:
+                return None
+            changes["penjualan_id"] = self.positions['penjualan']
+            changes["log_transaksi_id"] = self.positions['log_transaksi']
+            for callback in self._subscribers:
+                callback(changes)
+            self._save_state() # Only after every subscriber handled the changes
+            return changes
+
+    def run(self, interval, stop_event=None):
+        """Polls every `interval` seconds until stop_event is set. Errors are logged, not raised."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error polling the change feed: {e}")
+            stop_event.wait(interval)
+
+    def start(self, interval):
+        """Runs the feed in a daemon thread. Returns the stop event."""
+        stop_event = threading.Event()
+        threading.Thread(target=self.run, args=(interval, stop_event), name="change-feed", daemon=True).start()
+        return stop_event
+
+
+class StockSnapshot:
+    """
+    Current stock of every item, kept up to date from the change feed. A full reload sums
+    log_transaksi up to a fixed id; the feed then continues from exactly that id, so no
+    row is counted twice or missed.
+    """
+
+    def __init__(self, reload_seconds=STOCK_SNAPSHOT_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._stocks = None
+        self._loaded_at = None
+        self._feed = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Full reload: one grouped query per item type. Returns the log_transaksi id it is consistent with."""
+        positions = database.get_max_change_ids()
+        if positions is None:
+            raise RuntimeError("Could not read the current penjualan/log_transaksi ids from the database.")
+        stocks = {item_type: database.get_current_stocks(item_type, up_to_id=positions['log_transaksi'])
+                  for item_type in ITEM_TYPES}
+        with self._lock:
+            self._stocks = stocks
+            self._loaded_at = time.monotonic()
+            if self._feed is not None:
+                self._feed.positions['log_transaksi'] = positions['log_transaksi']
+        return positions
+
+    def apply(self, changes):
+        """Change feed subscriber: adds the new log_transaksi quantities."""
+        with self._lock:
+            if self._stocks is None:
+                return
+            for item_type, deltas in changes["stock_deltas"].items():
+                stocks = self._stocks.setdefault(item_type, {})
+                for item_id, delta in deltas.items():
+                    stocks[item_id] = stocks.get(item_id, 0.0) + delta
+
+    def start(self, interval):
+        """Loads the snapshot and keeps it current with a change feed polled every `interval` seconds."""
+        positions = self.load()
+        self._feed = ChangeFeed(positions=positions)
+        self._feed.subscribe(self.apply)
+        stop_event = threading.Event()
+
+        def run():
+            while not stop_event.wait(interval):
+                try:
+                    if time.monotonic() - self._loaded_at >= self.reload_seconds:
+                        with self._feed._lock: # No poll may run between the reload and the new position
+                            self.load()
+                    else:
+                        self._feed.poll()
+                except Exception as e:
+                    print(f"Error updating the stock snapshot: {e}")
+
+        threading.Thread(target=run, name="stock-snapshot", daemon=True).start()
+        return stop_event
+
+    @property
+    def live(self):
+        return self._stocks is not None
+
+    def stocks(self, item_type):
+        """Copy of {item_id: stock} for item_type, or None when the snapshot is not running."""
+        with self._lock:
+            if self._stocks is None:
+                return None
+            return dict(self._stocks.get(item_type, {}))
+
+
+DEFAULT_SNAPSHOT = StockSnapshot()
+
+
+def current_stocks(item_type):
+    """{item_id: stock} for item_type: from the stock snapshot when it runs, otherwise one database query."""
+    stocks = DEFAULT_SNAPSHOT.stocks(item_type)
+    return stocks if stocks is not None else database.get_current_stocks(item_type)
+
+
+def main():
+    import precompute_forecasts
+
+    parser = argparse.ArgumentParser(description="Refresh stored forecasts of products with new sales")
+    parser.add_argument("--interval", type=float, default=CHANGE_FEED_INTERVAL or 30, help="Seconds between polls")
+    parser.add_argument("--state-path", default=CHANGE_FEED_STATE_PATH, help="Checkpoint of the last processed ids")
+    args = parser.parse_args()
+
+    def refresh_forecasts(changes):
+        if not changes["sold"]:
+            return
+        started = time.perf_counter()
+        if precompute_forecasts.refresh(changes["sold"]):
+            print(f"Refreshed forecasts of {len(changes['sold'])} products with new sales "
+                  f"in {time.perf_counter() - started:.2f}s")
+        else:
+            print("Forecast store is not current for today, run precompute_forecasts.py; skipped the refresh.")
+
+    feed = ChangeFeed(state_path=args.state_path)
+    feed.subscribe(refresh_forecasts)
+    print(f"Watching penjualan/log_transaksi from ids {feed.positions} every {args.interval}s")
+    feed.run(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,43 @@
-import mysql.connector
 import os
 from dotenv import load_dotenv
 import pandas as pd
 
+import storage # MySQL or an embedded database, see STORAGE_BACKEND
+
 load_dotenv() # Load environment variables from .env file
 
 def get_db_connection():
     """Establishes a connection to the MySQL database."""
-    try:
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME'),
-            port=os.getenv('DB_PORT', 3306) # Default port if not specified
-        )
-        # print("Database connection successful") # For debugging
-        return conn
-    except mysql.connector.Error as err:
-        print(f"Error connecting to database: {err}")
-        return None
+    return storage.MySQLBackend().connect()
 
 def fetch_query_as_df(query, params=None):
-    """Fetches data from the database using a query and returns a Pandas DataFrame."""
-    conn = get_db_connection()
-    if not conn:
-        return pd.DataFrame() # Return empty DataFrame on connection error
-    try:
-        df = pd.read_sql_query(query, conn, params=params)
-        return df
-    except mysql.connector.Error as err:
-        print(f"Error executing query: {err}")
-        return pd.DataFrame()
-    except Exception as e:
-        print(f"An unexpected error occurred during query execution: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
+    """
+    Fetches data from the database using a query and returns a Pandas DataFrame.
+    Queries use %s placeholders; the storage backend adapts them to its engine.
+    """
+    return storage.get_backend().fetch_df(query, params)
+
+def _sale_day():
+    """SQL expression for the day of a sale on the current backend."""
+    return storage.get_backend().day('tanggal_penjualan')
+
+def _with_dates(df, column='sale_date'):
+    """Embedded backends return days as strings, MySQL as dates; always hand out datetime.date."""
+    if not df.empty:
+        df[column] = pd.to_datetime(df[column]).dt.date
+    return df
 
 # --- Data Fetching Functions ---
 
-def get_historical_sales(produk_jadi_id=None, start_date=None, end_date=None):
-    """Fetches aggregated daily sales for a specific produk_jadi or all."""
-    query = """
+def get_historical_sales(produk_jadi_id=None, start_date=None, end_date=None, produk_jadi_ids=None):
+    """
+    Fetches aggregated daily sales for a specific produk_jadi, a list of them
+    (produk_jadi_ids, in a single query) or all.
+    """
+    sale_day = _sale_day()
+    query = f"""
         SELECT
-            DATE(tanggal_penjualan) AS sale_date,
+            {sale_day} AS sale_date,
             produk_jadi_id,
             SUM(jumlah_terjual) AS total_sold_on_day
         FROM penjualan
@@ -55,21 +47,64 @@ def get_historical_sales(produk_jadi_id=None, start_date=None, end_date=None):
     if produk_jadi_id:
         conditions.append("produk_jadi_id = %s")
         params.append(produk_jadi_id)
+    if produk_jadi_ids:
+        conditions.append("produk_jadi_id IN (" + ", ".join(["%s"] * len(produk_jadi_ids)) + ")")
+        params.extend(produk_jadi_ids)
     if start_date:
-        conditions.append("DATE(tanggal_penjualan) >= %s")
+        conditions.append(f"{sale_day} >= %s")
         params.append(start_date)
     if end_date:
-        conditions.append("DATE(tanggal_penjualan) <= %s")
+        conditions.append(f"{sale_day} <= %s")
         params.append(end_date)
 
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
 
-    query += """
-        GROUP BY DATE(tanggal_penjualan), produk_jadi_id
+    query += f"""
+        GROUP BY {sale_day}, produk_jadi_id
         ORDER BY produk_jadi_id, sale_date;
     """
-    return fetch_query_as_df(query, tuple(params) if params else None)
+    return _with_dates(fetch_query_as_df(query, tuple(params) if params else None))
+
+
+# Rows read from the server per round trip by iter_historical_sales_by_product
+HISTORY_CHUNK_ROWS = int(os.getenv('HISTORY_CHUNK_ROWS', 10000))
+
+def iter_historical_sales_by_product(produk_jadi_ids=None, chunk_rows=HISTORY_CHUNK_ROWS):
+    """
+    Streams the aggregated daily sales of get_historical_sales product by product, ordered by
+    produk_jadi_id, through an unbuffered (server-side on MySQL) cursor read in chunks of chunk_rows.
+    Yields (produk_jadi_id, DataFrame of that product's rows) and only ever holds one product's
+    rows plus one chunk in memory, however large penjualan is. Products without sales are skipped.
+    """
+    sale_day = _sale_day()
+    query = f"""
+        SELECT
+            {sale_day} AS sale_date,
+            produk_jadi_id,
+            SUM(jumlah_terjual) AS total_sold_on_day
+        FROM penjualan
+    """
+    params = []
+    if produk_jadi_ids:
+        query += " WHERE produk_jadi_id IN (" + ", ".join(["%s"] * len(produk_jadi_ids)) + ")"
+        params.extend(produk_jadi_ids)
+    query += f"""
+        GROUP BY produk_jadi_id, {sale_day}
+        ORDER BY produk_jadi_id, sale_date;
+    """
+    columns = ['sale_date', 'produk_jadi_id', 'total_sold_on_day']
+
+    current_id, current_rows = None, []
+    for rows in storage.get_backend().stream(query, tuple(params) if params else None, chunk_rows):
+        for row in rows:
+            if row[1] != current_id:
+                if current_rows:
+                    yield int(current_id), _with_dates(pd.DataFrame(current_rows, columns=columns))
+                current_id, current_rows = row[1], []
+            current_rows.append(row)
+    if current_rows:
+        yield int(current_id), _with_dates(pd.DataFrame(current_rows, columns=columns))
 
 
 def get_current_stock(item_id, item_type):
@@ -87,6 +122,28 @@ def get_current_stock(item_id, item_type):
         return float(df['current_stock'].iloc[0])
     return 0.0 # Default to 0 if no stock or error
 
+def get_current_stocks(item_type, up_to_id=None):
+    """
+    Current stock of every item of item_type ('produk_jadi' or 'bahan_baku') in one query.
+    Returns a dict {item_id: stock}; items without transactions are absent (stock 0).
+    - up_to_id: only count log_transaksi rows with id <= up_to_id (a consistent starting
+      point for applying later rows incrementally, see change_feed.py).
+    """
+    query = """
+        SELECT item_id, SUM(jumlah) AS current_stock
+        FROM log_transaksi
+        WHERE tipe_item = %s
+    """
+    params = [item_type]
+    if up_to_id is not None:
+        query += " AND id <= %s"
+        params.append(up_to_id)
+    query += " GROUP BY item_id;"
+    df = fetch_query_as_df(query, tuple(params))
+    if df.empty:
+        return {}
+    return {int(item_id): float(stock) for item_id, stock in zip(df['item_id'], df['current_stock']) if pd.notna(stock)}
+
 def get_all_produk_jadi_ids():
     """Fetches all unique produk_jadi_id from the produk_jadi table."""
     query = "SELECT id FROM produk_jadi ORDER BY id;"
@@ -95,8 +152,46 @@ def get_all_produk_jadi_ids():
         return df['id'].tolist()
     return []
 
-def get_recipes():
-    """Fetches all product recipes."""
-    query = "SELECT produk_jadi_id, bahan_baku_id, jumlah_dibutuhkan FROM resep_produk;"
+def get_produk_jadi_kategori():
+    """Fetches the kategori of every produk_jadi (columns id, kategori)."""
+    query = "SELECT id, kategori FROM produk_jadi ORDER BY id;"
     return fetch_query_as_df(query)
 
+def get_recipes(produk_jadi_ids=None):
+    """Fetches all product recipes, or those of produk_jadi_ids (in a single query), in id order."""
+    query = "SELECT produk_jadi_id, bahan_baku_id, jumlah_dibutuhkan FROM resep_produk"
+    params = None
+    if produk_jadi_ids:
+        query += " WHERE produk_jadi_id IN (" + ", ".join(["%s"] * len(produk_jadi_ids)) + ")"
+        params = tuple(produk_jadi_ids)
+    return fetch_query_as_df(query + " ORDER BY id;", params)
+
+def has_recipes():
+    """Whether resep_produk has any row."""
+    df = fetch_query_as_df("SELECT 1 AS found FROM resep_produk LIMIT 1;")
+    return not df.empty
+
+
+# --- Change Feed (see change_feed.py) ---
+
+def get_max_change_ids():
+    """Highest auto-increment id of penjualan and log_transaksi, as {table: id} (0 when empty)."""
+    query = """
+        SELECT
+            (SELECT COALESCE(MAX(id), 0) FROM penjualan) AS penjualan,
+            (SELECT COALESCE(MAX(id), 0) FROM log_transaksi) AS log_transaksi;
+    """
+    df = fetch_query_as_df(query)
+    if df.empty:
+        return None
+    return {table: int(df[table].iloc[0]) for table in ('penjualan', 'log_transaksi')}
+
+def get_sales_since(after_id, limit):
+    """penjualan rows with id > after_id, in id order, at most limit rows (columns id, produk_jadi_id)."""
+    query = "SELECT id, produk_jadi_id FROM penjualan WHERE id > %s ORDER BY id LIMIT %s;"
+    return fetch_query_as_df(query, (after_id, limit))
+
+def get_transactions_since(after_id, limit):
+    """log_transaksi rows with id > after_id, in id order, at most limit rows (columns id, tipe_item, item_id, jumlah)."""
+    query = "SELECT id, tipe_item, item_id, jumlah FROM log_transaksi WHERE id > %s ORDER BY id LIMIT %s;"
+    return fetch_query_as_df(query, (after_id, limit))
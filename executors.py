@@ -0,0 +1,90 @@
+# File: executors.py
+# ---------------------------
+# Bounded thread pools of an API process, so a request does not wait for its database
+# queries and its inference one after another:
+#   - the I/O pool runs independent queries (product ids, recipes, stocks, sales history)
+#     and model file reads concurrently; database drivers release the GIL while waiting
+#     on the server or the disk.
+#   - the predict pool runs the CPU-bound forecasting (NumPy releases the GIL in its
+#     kernels) while the request thread fetches the next chunk of history.
+# Both pools are bounded: submit() blocks once max_pending tasks are queued or running, so
+# a fast producer (e.g. history fetched faster than it is forecast) cannot pile up memory,
+# and PREDICT_WORKERS caps the CPU work of a process however many request threads it has.
+# Pools are created lazily, per process: threads don't survive gunicorn's fork().
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IO_WORKERS = int(os.getenv('IO_WORKERS', 4)) # Concurrent queries/file reads per process; 0 = run inline
+PREDICT_WORKERS = int(os.getenv('PREDICT_WORKERS', 1)) # Concurrent forecasting tasks per process; 0 = run inline
+PREDICT_QUEUE = int(os.getenv('PREDICT_QUEUE', 2)) # Tasks waiting per predict worker before submit() blocks
+# Products per chunk when fetching history and forecasting are overlapped (0 = one chunk)
+PIPELINE_CHUNK_PRODUCTS = int(os.getenv('PIPELINE_CHUNK_PRODUCTS', 200))
+
+
+class BoundedExecutor:
+    """A ThreadPoolExecutor whose submit() blocks while max_pending tasks are queued or running."""
+
+    def __init__(self, max_workers, max_pending, name):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max(max_pending, max_workers))
+
+    def submit(self, fn, *args, **kwargs):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+class InlineExecutor:
+    """Runs every task immediately in the calling thread (pools disabled)."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def _get_executor(name, max_workers, max_pending):
+    if max_workers <= 0:
+        return InlineExecutor()
+    key = (name, os.getpid())
+    executor = _executors.get(key)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(key)
+            if executor is None:
+                executor = _executors[key] = BoundedExecutor(max_workers, max_pending, name)
+    return executor
+
+
+def io_executor():
+    """Pool for database queries and model file reads. Tasks must not wait on other I/O tasks."""
+    return _get_executor('io', IO_WORKERS, IO_WORKERS * 4)
+
+
+def predict_executor():
+    """Pool for CPU-bound forecasting."""
+    return _get_executor('predict', PREDICT_WORKERS, PREDICT_WORKERS * (1 + PREDICT_QUEUE))
+
+
+def submit_all(executor, calls):
+    """
+    Starts every call of {name: (fn, *args)} on executor and returns {name: Future}.
+    Call .result() on the futures in the order the results are needed.
+    """
+    return {name: executor.submit(*call) for name, call in calls.items()}
@@ -0,0 +1,172 @@
+# File: features.py
+# ---------------------------
+# Model input features shared by train.py and the serving path (model_utils, backtest.py).
+# Besides the scaled daily sales, a model can see calendar covariates for every day:
+# day of week and month (cyclic sin/cos encodings), national holidays, the run-up to
+# Idul Fitri, school holidays and the weeks before a school term starts (uniform buying).
+# They only depend on the date, so the future values are known and are fed to the
+# autoregressive rollout next to each predicted day.
+#
+# The features of a model are chosen by its feature set (stored in the training config and
+# the exported weights): 'sales' is the original univariate input, 'calendar' adds
+# CALENDAR_FEATURES. Calendar rows are computed once per calendar year, vectorized, and
+# cached, so every product and request covering the same dates reuses the same arrays.
+from datetime import date
+from functools import lru_cache
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CALENDAR_FEATURES = ('dow_sin', 'dow_cos', 'month_sin', 'month_cos',
+                     'holiday', 'pre_idul_fitri', 'school_holiday', 'school_term_start')
+FEATURE_SETS = {
+    'sales': (),
+    'calendar': CALENDAR_FEATURES,
+}
+# Feature set of newly trained models (models keep the one they were trained with)
+FEATURE_SET = os.getenv('FEATURE_SET', 'sales')
+
+# School holidays as MM-DD:MM-DD ranges (inclusive, may wrap around the new year), roughly the
+# Indonesian academic calendar: the year starts in mid-July, the second semester in January
+SCHOOL_BREAKS = os.getenv('SCHOOL_BREAKS', '06-21:07-13,12-21:01-04')
+SCHOOL_TERM_START_DAYS = int(os.getenv('SCHOOL_TERM_START_DAYS', 28)) # Days before a term start flagged as school_term_start
+PRE_IDUL_FITRI_DAYS = int(os.getenv('PRE_IDUL_FITRI_DAYS', 21)) # Days before Idul Fitri flagged as pre_idul_fitri
+# Optional file with extra holiday dates (YYYY-MM-DD, one per line, '#' starts a comment),
+# e.g. regional holidays or lunar holidays outside the built-in years
+HOLIDAYS_PATH = os.getenv('HOLIDAYS_PATH')
+
+FIXED_HOLIDAYS = ('01-01', '05-01', '06-01', '08-17', '12-25') # MM-DD
+# Lunar-calendar holidays as observed in Indonesia (built-in for 2022-2027)
+IDUL_FITRI = ('2022-05-02', '2023-04-22', '2024-04-10', '2025-03-31', '2026-03-20', '2027-03-10')
+LUNAR_HOLIDAYS = IDUL_FITRI + (
+    '2022-05-03', '2023-04-23', '2024-04-11', '2025-04-01', '2026-03-21', '2027-03-11', # Idul Fitri, 2nd day
+    '2022-07-10', '2023-06-29', '2024-06-17', '2025-06-06', '2026-05-27', '2027-05-17', # Idul Adha
+    '2022-02-01', '2023-01-22', '2024-02-10', '2025-01-29', '2026-02-17', '2027-02-06', # Chinese New Year
+)
+
+
+def validate_feature_set(feature_set):
+    if feature_set not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set '{feature_set}', expected one of {tuple(FEATURE_SETS)}")
+    return feature_set
+
+
+def n_features(feature_set):
+    """Input width of a model with this feature set (sales + covariates)."""
+    return 1 + len(FEATURE_SETS[validate_feature_set(feature_set)])
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _day_number(value):
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype(np.int64))
+
+
+@lru_cache(maxsize=1)
+def _extra_holidays():
+    if not HOLIDAYS_PATH:
+        return ()
+    with open(HOLIDAYS_PATH) as f:
+        lines = (line.split('#', 1)[0].strip() for line in f)
+        return tuple(_day_number(line) for line in lines if line)
+
+
+def _holiday_days(year):
+    days = [_day_number(f"{year}-{month_day}") for month_day in FIXED_HOLIDAYS]
+    easter = _day_number(_easter(year))
+    days += [easter - 2, easter + 39] # Good Friday, Ascension Day
+    days += [_day_number(day) for day in LUNAR_HOLIDAYS if day.startswith(str(year))]
+    days += list(_extra_holidays())
+    return np.array(sorted(set(days)), dtype=np.int64)
+
+
+def _school_breaks(year):
+    """[(first_day, last_day)] day numbers of the school breaks starting in `year`."""
+    breaks = []
+    for school_break in SCHOOL_BREAKS.split(','):
+        start, end = school_break.strip().split(':')
+        first = _day_number(f"{year}-{start}")
+        last = _day_number(f"{year + (end < start)}-{end}")
+        breaks.append((first, last))
+    return breaks
+
+
+@lru_cache(maxsize=16)
+def _calendar_year(year):
+    """Calendar features [days in year, len(CALENDAR_FEATURES)] of one year (read-only, cached)."""
+    first, last = _day_number(f"{year}-01-01"), _day_number(f"{year}-12-31")
+    days = np.arange(first, last + 1, dtype=np.int64)
+    day_of_week = (days + 3) % 7 # 1970-01-01 was a Thursday; Monday = 0
+    month = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 # January = 0
+
+    holidays = np.concatenate([_holiday_days(y) for y in (year, year + 1)])
+    idul_fitri = np.array([_day_number(day) for day in IDUL_FITRI], dtype=np.int64)
+    breaks = [school_break for y in (year - 1, year) for school_break in _school_breaks(y)]
+    term_starts = np.array(sorted(last_day + 1 for _, last_day in breaks + _school_breaks(year + 1)), dtype=np.int64)
+
+    def days_until(events):
+        """Days from every day to the next event on or after it (large if none)."""
+        index = np.searchsorted(events, days)
+        return np.where(index < len(events), events[np.minimum(index, len(events) - 1)] - days, 10 ** 6)
+
+    school_holiday = np.zeros(len(days), dtype=bool)
+    for first_day, last_day in breaks:
+        school_holiday |= (days >= first_day) & (days <= last_day)
+    until_term_start = days_until(term_starts)
+    until_idul_fitri = days_until(idul_fitri)
+
+    columns = [
+        np.sin(2 * np.pi * day_of_week / 7), np.cos(2 * np.pi * day_of_week / 7),
+        np.sin(2 * np.pi * month / 12), np.cos(2 * np.pi * month / 12),
+        np.isin(days, holidays),
+        (until_idul_fitri > 0) & (until_idul_fitri <= PRE_IDUL_FITRI_DAYS),
+        school_holiday,
+        (until_term_start > 0) & (until_term_start <= SCHOOL_TERM_START_DAYS),
+    ]
+    block = np.stack(columns, axis=1).astype(np.float32)
+    block.flags.writeable = False
+    return block
+
+
+def calendar_features(start_date, n_days):
+    """Calendar features [n_days, len(CALENDAR_FEATURES)] for n_days consecutive days from start_date."""
+    if n_days <= 0:
+        return np.zeros((0, len(CALENDAR_FEATURES)), dtype=np.float32)
+    start = pd.Timestamp(start_date)
+    end = start + pd.Timedelta(days=n_days - 1)
+    offset = start.dayofyear - 1
+    if start.year == end.year:
+        return _calendar_year(start.year)[offset:offset + n_days]
+    block = np.concatenate([_calendar_year(year) for year in range(start.year, end.year + 1)])
+    return block[offset:offset + n_days]
+
+
+def covariates(feature_set, start_date, n_days):
+    """Covariates [n_days, n_features(feature_set) - 1] of a feature set for consecutive days (empty for 'sales')."""
+    if validate_feature_set(feature_set) == 'sales':
+        return np.zeros((max(n_days, 0), 0), dtype=np.float32)
+    return calendar_features(start_date, n_days)
+
+
+def model_inputs(feature_set, scaled_sales, start_date):
+    """
+    Model input rows [n_days, n_features(feature_set)]: the scaled daily sales followed by the
+    covariates of the same days (start_date is the date of the first row).
+    """
+    scaled_sales = np.asarray(scaled_sales, dtype=np.float32).reshape(-1, 1)
+    return np.hstack([scaled_sales, covariates(feature_set, start_date, len(scaled_sales))])
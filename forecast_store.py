@@ -0,0 +1,133 @@
+# File: forecast_store.py
+# ---------------------------
+# Local file store for precomputed forecasts (written by precompute_forecasts.py,
+# read by the API). Forecasts only change when new sales land or models are
+# retrained, so the nightly job computes them once and requests with the standard
+# parameters are answered from memory without touching the database or the models.
+import json
+import os
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FORECAST_STORE_PATH = os.getenv('FORECAST_STORE_PATH', './forecast_store/forecasts.json')
+# Horizons the nightly job precomputes. Forecasts are autoregressive, so the first N days of
+# the longest horizon are exactly the N-day forecast: one rollout covers every standard horizon.
+STANDARD_HORIZONS = sorted(int(days) for days in os.getenv('FORECAST_STORE_HORIZONS', '7,14,30').split(','))
+STANDARD_HISTORY_DAYS = int(os.getenv('FORECAST_STORE_HISTORY_DAYS', 90)) # Same default as the API
+
+
+def save_forecasts(forecasts, history_end_date, history_days, horizon_days, path=FORECAST_STORE_PATH):
+    """
+    Writes forecasts (as returned by forecasting.forecast_products) to the store file.
+    The file is replaced atomically, so readers never see a half-written store.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    payload = {
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "history_end_date": history_end_date.strftime('%Y-%m-%d'),
+        "history_days": history_days,
+        "horizon_days": horizon_days,
+        "forecasts": {str(forecast["produk_jadi_id"]): forecast for forecast in forecasts},
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def update_forecasts(forecasts, history_end_date, history_days, horizon_days, path=FORECAST_STORE_PATH):
+    """
+    Replaces the stored forecasts of the given products only (targeted refresh after new
+    sales, see change_feed.py), keeping all other products. Returns False, without writing,
+    when there is no store or it was computed for another day or other parameters; the
+    next full precompute has to run first.
+    """
+    try:
+        with open(path) as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if (payload["history_end_date"] != history_end_date.strftime('%Y-%m-%d')
+            or payload["history_days"] != history_days or payload["horizon_days"] != horizon_days):
+        return False
+    payload["forecasts"].update({str(forecast["produk_jadi_id"]): forecast for forecast in forecasts})
+    payload["updated_at"] = datetime.now().isoformat(timespec='seconds')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+    return True
+
+
+class ForecastStore:
+    """
+    In-memory view of the store file. The file is re-read only when its modification
+    time changes, so a lookup is a dictionary access.
+    """
+
+    def __init__(self, path=FORECAST_STORE_PATH):
+        self.path = path
+        self._data = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None # No store written yet
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        with open(self.path) as f:
+                            self._data = json.load(f)
+                        self._mtime = mtime
+                    except (OSError, ValueError) as e:
+                        print(f"Error reading forecast store {self.path}: {e}")
+                        return None
+        return self._data
+
+    def is_current(self, history_end_date, history_days, horizon_days):
+        """True when the store holds forecasts for exactly these parameters."""
+        data = self._current()
+        return (data is not None and data["history_end_date"] == history_end_date.strftime('%Y-%m-%d')
+                and data["history_days"] == history_days and data["horizon_days"] == horizon_days)
+
+    def lookup(self, produk_jadi_ids, history_end_date, history_days, forecast_days):
+        """
+        Returns stored forecasts for produk_jadi_ids (same layout as forecasting.forecast_products,
+        cut to forecast_days), or None when the request can't be answered from the store:
+        non-standard history_days, horizons longer than precomputed, stale store or missing products.
+        - forecast_days: one int for all products or a dict {produk_jadi_id: int}.
+        """
+        data = self._current()
+        if data is None:
+            return None
+        if history_days != data["history_days"] or history_end_date.strftime('%Y-%m-%d') != data["history_end_date"]:
+            return None
+        if not isinstance(forecast_days, dict):
+            forecast_days = {pid: forecast_days for pid in produk_jadi_ids}
+        if max(forecast_days.values(), default=0) > data["horizon_days"]:
+            return None
+
+        results = []
+        for pid in produk_jadi_ids:
+            stored = data["forecasts"].get(str(pid))
+            if stored is None:
+                return None
+            days = forecast_days[pid]
+            results.append(dict(
+                stored,
+                forecast_dates=stored["forecast_dates"][:days],
+                forecasted_sales=stored["forecasted_sales"][:days],
+            ))
+        return results
+
+
+DEFAULT_STORE = ForecastStore()
@@ -0,0 +1,192 @@
+# File: forecasting.py
+# ---------------------------
+# Sales forecasting for a set of products from one historical sales DataFrame,
+# shared by the API endpoints (single, batch, full analysis):
+# dense daily resampling -> demand routing -> one batched LSTM pass for active products.
+# With quantiles requested, sampled paths (see model_utils.predict_sales_samples_for_products
+# and intermittent.bootstrap_samples) add prediction intervals to the point forecasts.
+import numpy as np
+
+import database
+import executors
+import forecast_store
+import model_utils
+import timeseries
+import intermittent
+import micro_batch
+import weight_store
+
+INSUFFICIENT_HISTORY_WARNING = "Not enough historical data for robust prediction."
+MISSING_MODEL_WARNING = "No trained model or scaler found for this product; forecast defaults to zero."
+
+
+def validate_quantiles(quantiles):
+    """Returns quantiles as a sorted list of floats strictly between 0 and 1. Raises ValueError otherwise."""
+    quantiles = sorted(float(q) for q in quantiles)
+    if not quantiles or any(not 0 < q < 1 for q in quantiles):
+        raise ValueError("Quantiles must be numbers strictly between 0 and 1.")
+    return quantiles
+
+
+def _sample_quantiles(samples, quantiles):
+    """
+    Daily and period-total quantiles of sampled paths [n_samples, days], as dicts keyed by
+    the quantile as a string. Quantiles are actual sample values (whole units).
+    """
+    daily = np.quantile(samples, quantiles, axis=0, method='inverted_cdf') if samples.shape[1] else np.zeros((len(quantiles), 0))
+    total = np.quantile(samples.sum(axis=1), quantiles, method='inverted_cdf')
+    return (
+        {str(q): [int(v) for v in daily[k]] for k, q in enumerate(quantiles)},
+        {str(q): int(total[k]) for k, q in enumerate(quantiles)},
+    )
+
+
+def forecast_products(produk_jadi_ids, historical_sales_df, start_date, end_date, forecast_days, quantiles=None):
+    """
+    Forecasts sales for every product in produk_jadi_ids.
+    - historical_sales_df: Rows from database.get_historical_sales covering [start_date, end_date].
+    - forecast_days: Number of days to forecast, one int for all products or a dict {produk_jadi_id: int}.
+    - quantiles: Optional list of quantiles (0 < q < 1) for prediction intervals.
+    Returns a list (in produk_jadi_ids order) of dicts with the keys
+    produk_jadi_id, forecast_dates, forecasted_sales, demand_class, forecast_method and warning,
+    plus forecast_quantiles ({q: daily values}) and total_quantiles ({q: horizon total})
+    when quantiles are requested.
+    """
+    if not isinstance(forecast_days, dict):
+        forecast_days = {pid: forecast_days for pid in produk_jadi_ids}
+
+    # Dense daily sales for every product over the history window, built in one pass
+    dates, _, daily_sales, _ = timeseries.daily_sales_matrix(
+        historical_sales_df, produk_jadi_ids, start_date, end_date
+    )
+    enough_history = len(dates) >= model_utils.SEQUENCE_LENGTH
+
+    # Route dead/intermittent products to the statistical forecaster before any model is loaded
+    demand_classes, _ = intermittent.classify_demand(daily_sales)
+    longest_horizon = max(forecast_days.values(), default=0)
+    statistical_predictions = intermittent.statistical_forecast(daily_sales, demand_classes, longest_horizon)
+
+    # One batched inference pass for all active products
+    lstm_histories = {
+        pid: timeseries.to_sales_frame(dates, daily_sales[row])
+        for row, pid in enumerate(produk_jadi_ids)
+        if enough_history and demand_classes[row] == intermittent.DEMAND_ACTIVE
+    }
+    lstm_predictions = model_utils.predict_sales_for_products(
+        lstm_histories, {pid: forecast_days[pid] for pid in lstm_histories}
+    ) if lstm_histories else {}
+
+    if quantiles:
+        # Sampled paths: residual bootstrap through the LSTM for active products, resampled
+        # history for the statistical ones; all zeros without enough history
+        lstm_samples = model_utils.predict_sales_samples_for_products(
+            lstm_histories, {pid: forecast_days[pid] for pid in lstm_histories}
+        ) if lstm_histories else {}
+        statistical_samples = intermittent.bootstrap_samples(
+            daily_sales, longest_horizon, model_utils.FORECAST_SAMPLES, keys=produk_jadi_ids
+        )
+
+    results = []
+    for row, pid in enumerate(produk_jadi_ids):
+        days = forecast_days[pid]
+        demand_class = demand_classes[row]
+        warning_msg = None
+        if not enough_history:
+            predictions = [0.0] * days # Fallback
+            warning_msg = INSUFFICIENT_HISTORY_WARNING
+        elif pid in lstm_predictions:
+            predictions = lstm_predictions[pid]
+            if weight_store.DEFAULT_STORE.get(pid) is None:
+                warning_msg = MISSING_MODEL_WARNING
+        else:
+            predictions = statistical_predictions[row, :days].tolist()
+
+        result = {
+            "produk_jadi_id": pid,
+            # The daily series ends at end_date, so the forecast starts the day after
+            "forecast_dates": timeseries.forecast_dates(end_date, days),
+            "forecasted_sales": predictions,
+            "demand_class": demand_class,
+            "forecast_method": intermittent.FORECAST_METHODS[demand_class],
+            "warning": warning_msg,
+        }
+        if quantiles:
+            if not enough_history:
+                samples = np.zeros((model_utils.FORECAST_SAMPLES, days), dtype=int)
+            elif pid in lstm_samples:
+                samples = lstm_samples[pid]
+            else:
+                samples = statistical_samples[row, :, :days]
+            result["forecast_quantiles"], result["total_quantiles"] = _sample_quantiles(samples, quantiles)
+        results.append(result)
+    return results
+
+
+def _prefetch_weights(produk_jadi_ids):
+    """
+    Loads the weights of the produk_jadi_ids that have a trained model into the weight store
+    (no-op for loaded products). Products without one are left to forecast_products, so ids
+    it routes to the statistical forecaster don't trigger a model lookup.
+    """
+    trained = set(weight_store.list_product_ids(weight_store.DEFAULT_STORE.models_dir))
+    for pid in produk_jadi_ids:
+        if pid in trained:
+            weight_store.DEFAULT_STORE.get(pid)
+
+
+def fetch_and_forecast(produk_jadi_ids, start_date, end_date, forecast_days, quantiles=None,
+                       chunk_products=executors.PIPELINE_CHUNK_PRODUCTS):
+    """
+    Fetches the history of produk_jadi_ids and forecasts them (see forecast_products).
+    Products are processed in chunks of chunk_products: while the predict pool forecasts
+    one chunk, the I/O pool already fetches the history (one query) and model weights of the
+    next, so database time overlaps with inference. forecast_products treats every product
+    independently (sampled paths included: every product has its own random stream), so the
+    forecasts are the same as in one pass.
+    Small point forecasts, whose rollouts go through the micro-batcher (micro_batch.py), are
+    forecast in the request thread instead: queued one by one on the predict pool, concurrent
+    requests would never reach the batcher together. The batcher thread runs their rollouts.
+    """
+    produk_jadi_ids = list(produk_jadi_ids)
+    if not produk_jadi_ids:
+        return []
+    if chunk_products <= 0:
+        chunks = [produk_jadi_ids]
+    else:
+        chunks = [produk_jadi_ids[i:i + chunk_products] for i in range(0, len(produk_jadi_ids), chunk_products)]
+    io = executors.io_executor()
+    if not quantiles and len(chunks) == 1 and micro_batch.DEFAULT_BATCHER.accepts(len(produk_jadi_ids)):
+        predict = executors.InlineExecutor()
+    else:
+        predict = executors.predict_executor()
+
+    def start_fetch(chunk):
+        io.submit(_prefetch_weights, chunk) # Model files are read while the query runs
+        return io.submit(database.get_historical_sales, start_date=start_date, end_date=end_date, produk_jadi_ids=chunk)
+
+    next_history = start_fetch(chunks[0])
+    pending = []
+    for k, chunk in enumerate(chunks):
+        historical_sales_df = next_history.result()
+        if k + 1 < len(chunks):
+            next_history = start_fetch(chunks[k + 1])
+        # Blocks while the predict pool is full, which also bounds the history fetched ahead
+        pending.append(predict.submit(
+            forecast_products, chunk, historical_sales_df, start_date, end_date, forecast_days, quantiles
+        ))
+    return [forecast for future in pending for forecast in future.result()]
+
+
+def get_forecasts(produk_jadi_ids, start_date, end_date, forecast_days, quantiles=None):
+    """
+    Like fetch_and_forecast, but answers from the precomputed forecast store when the
+    parameters are standard and the store is current. Falls back to live inference otherwise
+    (always when quantiles are requested: the store only holds point forecasts).
+    """
+    if quantiles:
+        return fetch_and_forecast(produk_jadi_ids, start_date, end_date, forecast_days, quantiles)
+    history_days = (end_date - start_date).days
+    stored = forecast_store.DEFAULT_STORE.lookup(produk_jadi_ids, end_date, history_days, forecast_days)
+    if stored is not None:
+        return stored
+    return fetch_and_forecast(produk_jadi_ids, start_date, end_date, forecast_days)
@@ -0,0 +1,46 @@
+# File: gunicorn.conf.py
+# ---------------------------
+# Production server profile for the forecasting API (replaces `python app.py`,
+# which runs the single-process Flask dev server with the debug reloader).
+#     gunicorn -c gunicorn.conf.py wsgi:application
+# All settings can be overridden with environment variables.
+import gc
+import multiprocessing
+import os
+
+# Each worker is a single-threaded process; keep NumPy/BLAS from spawning a thread
+# pool per worker as well (must be set before NumPy is imported by the preload).
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120)) # full_analysis can take a while on big catalogs
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0)) # 0 = never recycle workers
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+# Import wsgi.py (and load every model's weights) once in the master, then fork.
+# GUNICORN_PRELOAD=0 makes every worker load its own copy (only useful for benchmarking).
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far (app, weight store) out of the garbage collector's
+    # reach, so collections in the workers don't write to, and un-share, those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork(): each worker starts its own stock snapshot, kept current
+    # by polling the change feed (CHANGE_FEED_INTERVAL seconds, 0 = stocks read per request)
+    import change_feed
+    if change_feed.CHANGE_FEED_INTERVAL > 0:
+        change_feed.DEFAULT_SNAPSHOT.start(change_feed.CHANGE_FEED_INTERVAL)
+    # Same for the model hot reload: newly promoted versions (see model_registry.py) are
+    # loaded in the background and swapped in (MODEL_RELOAD_INTERVAL seconds, 0 = off)
+    import weight_store
+    if weight_store.MODEL_RELOAD_INTERVAL > 0:
+        weight_store.DEFAULT_STORE.start_reloader(weight_store.MODEL_RELOAD_INTERVAL)
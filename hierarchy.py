@@ -0,0 +1,117 @@
+# File: hierarchy.py
+# ---------------------------
+# Aggregate forecasts by kategori, by bahan_baku and for the whole store, computed
+# from the leaf (per produk_jadi) forecasts with precomputed aggregation matrices:
+#   kategori [C, H] = category_matrix [C, P] @ leaf [P, H]
+#   bahan_baku usage [B, H] = material_matrix [B, P] @ leaf [P, H]   (recipe quantities)
+# The leaf forecasts come from forecasting.get_forecasts, i.e. from the precomputed
+# store when it is current, so a dashboard query costs a few matrix products.
+#
+# Optional reconciliation: the total and every kategori also get their own base forecast
+# (moving average of their aggregated history), and all levels are combined with WLS
+# reconciliation using structural weights, so leaves, kategori and total add up again.
+import threading
+import numpy as np
+
+import inventory
+
+AGGREGATE_BASE_DAYS = 28 # Moving-average window of the aggregate-level base forecasts
+LEVELS = ('total', 'kategori', 'bahan_baku')
+
+
+class Hierarchy:
+    """
+    Aggregation matrices for a fixed set of products. Rows of the summing matrix are
+    [total, one row per kategori, one row per produk_jadi].
+    """
+
+    def __init__(self, produk_jadi_ids, kategori_by_id, recipes_df):
+        self.produk_jadi_ids = list(produk_jadi_ids)
+        self.categories = sorted(set(kategori_by_id.get(pid, '') for pid in self.produk_jadi_ids))
+        category_index = {kategori: row for row, kategori in enumerate(self.categories)}
+        self.category_matrix = np.zeros((len(self.categories), len(self.produk_jadi_ids)))
+        for col, pid in enumerate(self.produk_jadi_ids):
+            self.category_matrix[category_index[kategori_by_id.get(pid, '')], col] = 1.0
+
+        self.bahan_baku_ids, bom = inventory.bom_matrix(recipes_df, self.produk_jadi_ids)
+        self.material_matrix = bom.T # [B, P]
+
+        n_products = len(self.produk_jadi_ids)
+        self.summing_matrix = np.vstack([np.ones((1, n_products)), self.category_matrix, np.eye(n_products)])
+        self._reconciliation_matrix = None
+
+    @property
+    def reconciliation_matrix(self):
+        """
+        G [P, 1 + C + P] mapping base forecasts of all levels to coherent leaf forecasts:
+        G = (S' W^-1 S)^-1 S' W^-1 with W = diag(number of leaves under each node).
+        """
+        if self._reconciliation_matrix is None:
+            S = self.summing_matrix
+            w_inv = 1.0 / S.sum(axis=1)
+            self._reconciliation_matrix = np.linalg.solve((S.T * w_inv) @ S, S.T * w_inv)
+        return self._reconciliation_matrix
+
+    def base_forecasts(self, leaf_forecasts, daily_sales, base_days=AGGREGATE_BASE_DAYS):
+        """
+        Stacks base forecasts of all levels [1 + C + P, H]: a flat moving average of the
+        aggregated history for total and kategori, the given forecasts for the leaves.
+        - daily_sales: dense history [P, n_days] in produk_jadi_ids order (see timeseries.py).
+        """
+        horizon = leaf_forecasts.shape[1]
+        aggregated_history = self.summing_matrix[:1 + len(self.categories)] @ daily_sales
+        window = aggregated_history[:, -base_days:] if aggregated_history.shape[1] else np.zeros((len(aggregated_history), 1))
+        level = window.mean(axis=1, keepdims=True)
+        return np.vstack([np.repeat(level, horizon, axis=1), leaf_forecasts])
+
+    def reconcile(self, leaf_forecasts, daily_sales):
+        """Coherent, non-negative leaf forecasts [P, H] from the base forecasts of all levels."""
+        reconciled = self.reconciliation_matrix @ self.base_forecasts(leaf_forecasts, daily_sales)
+        return np.maximum(reconciled, 0)
+
+    def aggregate(self, leaf_forecasts, level):
+        """
+        Aggregates leaf forecasts [P, H] to `level` (one of LEVELS).
+        Returns (keys, values [n_keys, H]): ['total'], kategori names or bahan_baku ids.
+        """
+        if level == 'total':
+            return ['total'], leaf_forecasts.sum(axis=0, keepdims=True)
+        if level == 'kategori':
+            return self.categories, self.category_matrix @ leaf_forecasts
+        if level == 'bahan_baku':
+            return self.bahan_baku_ids, self.material_matrix @ leaf_forecasts
+        raise ValueError(f"Unknown aggregation level '{level}', expected one of {LEVELS}")
+
+    def members(self, level, key):
+        """produk_jadi ids aggregated into one key of a level."""
+        if level == 'total':
+            return list(self.produk_jadi_ids)
+        if level == 'kategori':
+            row = self.category_matrix[self.categories.index(key)]
+        else:
+            row = self.material_matrix[self.bahan_baku_ids.index(key)]
+        return [pid for pid, weight in zip(self.produk_jadi_ids, row) if weight > 0]
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_hierarchy(produk_jadi_ids, kategori_df, recipes_df):
+    """
+    Returns the Hierarchy for the current products, kategori and recipes. The matrices
+    (and the reconciliation matrix, once used) are reused until any of them changes.
+    """
+    kategori_by_id = {int(pid): str(kategori) for pid, kategori in zip(kategori_df['id'], kategori_df['kategori'])}
+    key = (
+        tuple(produk_jadi_ids),
+        tuple(sorted(kategori_by_id.items())),
+        tuple(sorted((int(pj), int(bb), float(qty)) for pj, bb, qty in
+                     recipes_df[['produk_jadi_id', 'bahan_baku_id', 'jumlah_dibutuhkan']].itertuples(index=False))),
+    )
+    with _cache_lock:
+        hierarchy = _cache.get(key)
+        if hierarchy is None:
+            _cache.clear() # Only the current catalogue is worth keeping
+            hierarchy = _cache[key] = Hierarchy(produk_jadi_ids, kategori_by_id, recipes_df)
+    return hierarchy
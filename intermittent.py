@@ -0,0 +1,135 @@
+# File: intermittent.py
+# ---------------------------
+# Pre-inference demand classification and cheap statistical forecasters.
+# Products that are dead (no recent sales) or sell only occasionally gain nothing
+# from the LSTM rollout, so they are routed here instead of loading a model.
+# Everything works on the dense [n_products, n_days] matrix from timeseries.py.
+import numpy as np
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# A product with no sales in the last DEAD_DAYS days is "dead" (the LSTM input window would be all zeros)
+DEAD_DAYS = int(os.getenv('SPARSE_DEAD_DAYS', 30))
+# Average demand interval (days per day-with-sales) above which a product is "intermittent".
+# The bundled catalogue sells on roughly 2 of every 5 days (ADI ~2.3), which the LSTMs handle fine.
+MAX_ADI_FOR_LSTM = float(os.getenv('SPARSE_MAX_ADI', 7.0))
+CROSTON_ALPHA = 0.1 # Smoothing constant for demand size and interval
+
+DEMAND_ACTIVE = 'active'
+DEMAND_INTERMITTENT = 'intermittent'
+DEMAND_DEAD = 'dead'
+
+# Forecast method used for each demand class
+FORECAST_METHODS = {
+    DEMAND_ACTIVE: 'lstm',
+    DEMAND_INTERMITTENT: 'croston',
+    DEMAND_DEAD: 'zero',
+}
+
+
+def classify_demand(daily_sales, dead_days=DEAD_DAYS, max_adi=MAX_ADI_FOR_LSTM):
+    """
+    Classifies every row of a dense daily sales matrix.
+    - daily_sales: float array [n_products, n_days] (zero on days without sales).
+    Returns (demand_classes, adi): a list of DEMAND_* strings and the average demand
+    interval per product (inf for products without any sales).
+    """
+    daily_sales = np.atleast_2d(daily_sales)
+    has_sale = daily_sales > 0
+    n_days_with_sales = has_sale.sum(axis=1)
+    adi = np.where(n_days_with_sales > 0, daily_sales.shape[1] / np.maximum(n_days_with_sales, 1), np.inf)
+
+    recent_sales = has_sale[:, -dead_days:].any(axis=1) if dead_days > 0 else n_days_with_sales > 0
+    demand_classes = np.where(
+        ~recent_sales, DEMAND_DEAD,
+        np.where(adi > max_adi, DEMAND_INTERMITTENT, DEMAND_ACTIVE)
+    )
+    return demand_classes.tolist(), adi
+
+
+def croston_rate(daily_sales, alpha=CROSTON_ALPHA):
+    """
+    Croston's method with the Syntetos-Boylan bias correction (SBA), vectorized over products.
+    Returns the forecast demand rate per day for every row (0 for rows without any sales).
+    """
+    daily_sales = np.atleast_2d(np.asarray(daily_sales, dtype=np.float64))
+    n_products, n_days = daily_sales.shape
+    has_sale = daily_sales > 0
+
+    # Initialise size and interval with their window averages; a single first observation
+    # makes the short serving windows (~90 days) too sensitive to where the first sale fell
+    first_sale = np.argmax(has_sale, axis=1)
+    n_sales = has_sale.sum(axis=1)
+    any_sale = n_sales > 0
+    size = daily_sales.sum(axis=1) / np.maximum(n_sales, 1)
+    interval = n_days / np.maximum(n_sales, 1)
+    periods_since_sale = np.zeros(n_products)
+
+    for t in range(n_days):
+        periods_since_sale += 1
+        update = has_sale[:, t] & (t > first_sale)
+        size = np.where(update, size + alpha * (daily_sales[:, t] - size), size)
+        interval = np.where(update, interval + alpha * (periods_since_sale - interval), interval)
+        periods_since_sale = np.where(has_sale[:, t], 0, periods_since_sale)
+
+    return np.where(any_sale, (1 - alpha / 2) * size / interval, 0.0)
+
+
+def rate_to_daily_counts(rates, forecast_horizon_days):
+    """
+    Spreads a per-day demand rate over the horizon as whole units. Rounding the running
+    total (instead of each day) keeps slow movers from rounding down to zero every day,
+    while the horizon total still equals round(rate * days).
+    Returns an int array [n_products, forecast_horizon_days].
+    """
+    rates = np.maximum(np.atleast_1d(rates), 0.0)
+    cumulative = np.round(np.outer(rates, np.arange(1, forecast_horizon_days + 1)))
+    return np.diff(cumulative, axis=1, prepend=0).astype(int)
+
+
+def statistical_forecast(daily_sales, demand_classes, forecast_horizon_days):
+    """
+    Forecasts all non-active rows of the matrix without touching any model.
+    Returns an int array [n_products, forecast_horizon_days]; rows classified as
+    DEMAND_ACTIVE are left as zeros and must be filled in by the LSTM.
+    """
+    daily_sales = np.atleast_2d(daily_sales)
+    demand_classes = np.asarray(demand_classes)
+    rates = np.zeros(daily_sales.shape[0])
+
+    intermittent_rows = demand_classes == DEMAND_INTERMITTENT
+    if intermittent_rows.any():
+        rates[intermittent_rows] = croston_rate(daily_sales[intermittent_rows])
+    # Dead rows keep a zero rate
+
+    return rate_to_daily_counts(rates, forecast_horizon_days)
+
+
+def bootstrap_samples(daily_sales, forecast_horizon_days, n_samples, seed=0, keys=None):
+    """
+    Sampled demand paths for prediction intervals of the statistical forecasts: every
+    future day is drawn from the product's own days in the window (zero-sales days
+    included, so the chance of a sale matches the history). Dead products sample zeros.
+    - keys: one int per row (the produk_jadi_id; the row index by default). Every row draws
+      from its own random stream seeded with (seed, key), day by day, so a product's samples
+      don't depend on the other rows of the call or on a longer horizon.
+    Returns an int array [n_products, n_samples, forecast_horizon_days].
+    """
+    daily_sales = np.atleast_2d(daily_sales)
+    n_products, n_days = daily_sales.shape
+    if n_days == 0:
+        return np.zeros((n_products, n_samples, forecast_horizon_days), dtype=int)
+    keys = range(n_products) if keys is None else keys
+    draws = np.stack([
+        sample_stream(seed, key).integers(0, n_days, size=(forecast_horizon_days, n_samples)).T.ravel()
+        for key in keys
+    ]) if n_products else np.zeros((0, n_samples * forecast_horizon_days), dtype=int)
+    samples = np.take_along_axis(daily_sales, draws, axis=1)
+    return np.round(samples).astype(int).reshape(n_products, n_samples, forecast_horizon_days)
+
+
+def sample_stream(seed, key):
+    """The random stream of one product's sampled paths (see bootstrap_samples)."""
+    return np.random.default_rng([seed, int(key)])
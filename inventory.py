@@ -0,0 +1,169 @@
+# File: inventory.py
+# ---------------------------
+# Day-by-day inventory simulation for produk_jadi and bahan_baku.
+# Where full_analysis plans with period totals, the simulator steps through the
+# horizon one day at a time: production is capped by the bahan_baku actually in stock,
+# purchases arrive after a lead time, and products can run out mid-horizon.
+# Every array carries a leading scenario axis, so any number of what-if scenarios
+# (safety stock days, lead times, demand levels) is evaluated in the same pass:
+#   demand [S, P, H], production [S, P, H], purchases [S, B, H], stock [S, P|B, H].
+import numpy as np
+
+# Scenario fields and their defaults (the defaults match full_analysis)
+DEFAULT_SCENARIO = {
+    'name': 'base',
+    'demand_scale': 1.0,         # Multiplier on the forecasted demand
+    'safety_stock_pj_days': 3,   # Finished-goods target stock, in days of average demand
+    'safety_stock_bb_days': 7,   # Raw-material target stock, in days of average usage
+    'lead_time_days': 0,         # Days between placing a purchase and receiving it
+}
+
+
+def bom_matrix(recipes_df, produk_jadi_ids):
+    """
+    Turns resep_produk rows into a bill-of-materials matrix.
+    Returns (bahan_baku_ids, bom) with bom [P, B] = jumlah_dibutuhkan per produced unit,
+    rows in produk_jadi_ids order.
+    """
+    bahan_baku_ids = sorted(int(bb_id) for bb_id in recipes_df['bahan_baku_id'].unique())
+    bom = np.zeros((len(produk_jadi_ids), len(bahan_baku_ids)))
+    product_index = {pid: row for row, pid in enumerate(produk_jadi_ids)}
+    material_index = {bb_id: col for col, bb_id in enumerate(bahan_baku_ids)}
+    for pj_id, bb_id, quantity in recipes_df[['produk_jadi_id', 'bahan_baku_id', 'jumlah_dibutuhkan']].itertuples(index=False):
+        row = product_index.get(int(pj_id))
+        if row is not None:
+            bom[row, material_index[int(bb_id)]] += float(quantity)
+    return bahan_baku_ids, bom
+
+
+def normalize_scenarios(scenarios):
+    """
+    Fills in DEFAULT_SCENARIO for missing fields and validates the values.
+    Raises ValueError on unknown fields or invalid values.
+    """
+    normalized = []
+    for number, scenario in enumerate(scenarios or [{}]):
+        unknown = set(scenario) - set(DEFAULT_SCENARIO)
+        if unknown:
+            raise ValueError(f"Unknown scenario field(s): {', '.join(sorted(unknown))}")
+        name = scenario.get('name') or (DEFAULT_SCENARIO['name'] if number == 0 else f"scenario_{number + 1}")
+        scenario = dict(DEFAULT_SCENARIO, **scenario)
+        scenario['name'] = str(name)
+        for field in ('demand_scale', 'safety_stock_pj_days', 'safety_stock_bb_days'):
+            scenario[field] = float(scenario[field])
+            if scenario[field] < 0:
+                raise ValueError(f"'{field}' must be non-negative.")
+        scenario['lead_time_days'] = int(scenario['lead_time_days'])
+        if scenario['lead_time_days'] < 0:
+            raise ValueError("'lead_time_days' must be non-negative.")
+        normalized.append(scenario)
+    return normalized
+
+
+def simulate(demand, bom, stock_pj, stock_bb, safety_stock_pj_days, safety_stock_bb_days, lead_time_days):
+    """
+    Simulates S scenarios over H days.
+    - demand: [S, P, H] daily sales per scenario.
+    - bom: [P, B] bahan_baku per produced unit (see bom_matrix).
+    - stock_pj [P], stock_bb [B]: stock at the start of the horizon.
+    - safety_stock_pj_days, safety_stock_bb_days, lead_time_days: [S] per-scenario policy.
+    Policy, every day t:
+      1. Purchase bahan_baku up to (lead time + 1 + safety days) of average usage, counting
+         stock on order; the order arrives at the start of day t + lead time.
+      2. Receive the purchases due today.
+      3. Produce today's demand plus what is missing to the produk_jadi target stock
+         (safety days of average demand). When a material is short, every product that
+         needs it gets the same share of its request (whole units only).
+      4. Sell from stock; demand that can't be served is recorded as unmet.
+    Returns a dict of arrays: stock_pj [S, P, H] and stock_bb [S, B, H] (end of day),
+    production [S, P, H], purchases [S, B, H] (by order day), receipts [S, B, H],
+    sales [S, P, H] and unmet_demand [S, P, H].
+    """
+    demand = np.asarray(demand, dtype=np.float64)
+    n_scenarios, n_products, horizon = demand.shape
+    n_materials = bom.shape[1]
+    safety_stock_pj_days = np.asarray(safety_stock_pj_days, dtype=np.float64)
+    safety_stock_bb_days = np.asarray(safety_stock_bb_days, dtype=np.float64)
+    lead_time_days = np.asarray(lead_time_days, dtype=np.int64)
+
+    avg_demand = demand.mean(axis=2)                                # [S, P]
+    target_pj = safety_stock_pj_days[:, None] * avg_demand          # [S, P]
+    avg_usage = avg_demand @ bom                                    # [S, B]
+    order_up_to = (lead_time_days + 1 + safety_stock_bb_days)[:, None] * avg_usage # [S, B]
+    uses_material = bom > 0                                         # [P, B]
+
+    on_hand_pj = np.broadcast_to(np.asarray(stock_pj, dtype=np.float64), (n_scenarios, n_products)).copy()
+    on_hand_bb = np.broadcast_to(np.asarray(stock_bb, dtype=np.float64), (n_scenarios, n_materials)).copy()
+    # pipeline[s, b, t] = quantity arriving at the start of day t (orders beyond the horizon never arrive)
+    pipeline = np.zeros((n_scenarios, n_materials, horizon + int(lead_time_days.max(initial=0)) + 1))
+    on_order = np.zeros((n_scenarios, n_materials))
+    scenario_index = np.arange(n_scenarios)
+
+    result = {
+        name: np.zeros((n_scenarios, size, horizon))
+        for name, size in (('stock_pj', n_products), ('stock_bb', n_materials), ('production', n_products),
+                           ('purchases', n_materials), ('receipts', n_materials), ('sales', n_products),
+                           ('unmet_demand', n_products))
+    }
+    for t in range(horizon):
+        # 1. Purchase
+        order = np.ceil(np.maximum(order_up_to - on_hand_bb - on_order, 0))
+        pipeline[scenario_index, :, t + lead_time_days] += order
+        on_order += order
+
+        # 2. Receive
+        on_hand_bb += pipeline[:, :, t]
+        on_order -= pipeline[:, :, t]
+
+        # 3. Produce, capped by the materials in stock
+        request = np.ceil(np.maximum(demand[:, :, t] + target_pj - on_hand_pj, 0)) # [S, P]
+        material_request = request @ bom                                         # [S, B]
+        material_fill = np.minimum(1.0, on_hand_bb / np.where(material_request > 0, material_request, 1.0))
+        product_fill = np.where(uses_material, material_fill[:, None, :], 1.0).min(axis=2) # [S, P]
+        production = np.floor(request * product_fill)
+        on_hand_bb = np.maximum(on_hand_bb - production @ bom, 0) # max() only absorbs float round-off
+        on_hand_pj += production
+
+        # 4. Sell
+        sales = np.minimum(demand[:, :, t], np.maximum(on_hand_pj, 0))
+        on_hand_pj -= sales
+
+        result['purchases'][:, :, t] = order
+        result['receipts'][:, :, t] = pipeline[:, :, t]
+        result['production'][:, :, t] = production
+        result['sales'][:, :, t] = sales
+        result['unmet_demand'][:, :, t] = demand[:, :, t] - sales
+        result['stock_pj'][:, :, t] = on_hand_pj
+        result['stock_bb'][:, :, t] = on_hand_bb
+    return result
+
+
+def first_day(mask):
+    """Index of the first True along the last axis, or -1 where there is none."""
+    mask = np.asarray(mask)
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), -1)
+
+
+def run_scenarios(forecasts, recipes_df, stock_pj, stock_bb, scenarios):
+    """
+    Simulates every scenario for forecasts from forecasting.forecast_products (all with the
+    same horizon).
+    - stock_pj / stock_bb: dicts {item_id: current stock}; missing items count as 0.
+    - scenarios: list of scenario dicts (see DEFAULT_SCENARIO), already normalized.
+    Returns (produk_jadi_ids, bahan_baku_ids, simulation result dict from simulate()).
+    """
+    produk_jadi_ids = [forecast['produk_jadi_id'] for forecast in forecasts]
+    bahan_baku_ids, bom = bom_matrix(recipes_df, produk_jadi_ids)
+    point_demand = np.array([forecast['forecasted_sales'] for forecast in forecasts], dtype=np.float64)
+    point_demand = point_demand.reshape(len(produk_jadi_ids), -1)
+    demand_scale = np.array([scenario['demand_scale'] for scenario in scenarios])
+    demand = demand_scale[:, None, None] * point_demand[None]
+    result = simulate(
+        demand, bom,
+        np.array([stock_pj.get(pid, 0.0) for pid in produk_jadi_ids]),
+        np.array([stock_bb.get(bb_id, 0.0) for bb_id in bahan_baku_ids]),
+        [scenario['safety_stock_pj_days'] for scenario in scenarios],
+        [scenario['safety_stock_bb_days'] for scenario in scenarios],
+        [scenario['lead_time_days'] for scenario in scenarios],
+    )
+    return produk_jadi_ids, bahan_baku_ids, result
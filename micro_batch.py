@@ -0,0 +1,148 @@
+# File: micro_batch.py
+# ---------------------------
+# Server-side micro-batching of small forecast calls. Single-product requests arrive in
+# bursts from the frontend and each would run its own rollout with one product, paying
+# the per-step NumPy overhead for a single row. With micro-batching on, such calls hand
+# their input windows to a batcher thread instead. The thread collects calls for up to
+# MICRO_BATCH_WAIT_MS (or until MICRO_BATCH_MAX_SIZE products are queued), groups the
+# products by model architecture (weight_store.architecture_key), runs one stacked
+# rollout per group and hands every caller its own rows back.
+#
+# Products never influence each other in a stacked rollout, and a longer rollout only adds
+# steps after a product's own horizon, so the forecasts are the same as without batching.
+# forecasting.fetch_and_forecast runs such calls in the request thread, not on the predict
+# pool, so concurrent requests reach the batcher together whatever PREDICT_WORKERS is.
+# Batching pays off when one process serves concurrent requests (GUNICORN_THREADS > 1);
+# with one request at a time it only adds the wait, so it is off by default.
+# Throughput versus concurrency: python -m benchmarks.bench_micro_batch
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from dotenv import load_dotenv
+
+import weight_store
+
+load_dotenv()
+
+MICRO_BATCH_WAIT_MS = float(os.getenv('MICRO_BATCH_WAIT_MS', 0)) # Longest wait for more calls; 0 = off
+MICRO_BATCH_MAX_SIZE = int(os.getenv('MICRO_BATCH_MAX_SIZE', 64)) # Products per batch (larger calls run directly)
+
+
+class _Item:
+    """One product of a queued call: its weights, input window [1, L, F], horizon and future covariates."""
+
+    def __init__(self, weights, sequence, horizon, covariates):
+        self.weights = weights
+        self.sequence = sequence
+        self.horizon = horizon
+        self.covariates = covariates
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    Merges concurrent rollout calls into stacked batches (see the module comment).
+    The batcher thread is started on first use in every process (threads don't survive fork()).
+    """
+
+    def __init__(self, max_wait_ms=MICRO_BATCH_WAIT_MS, max_batch_size=MICRO_BATCH_MAX_SIZE):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = {"batches": 0, "products": 0, "calls": 0, "largest_batch": 0}
+
+    @property
+    def enabled(self):
+        return self.max_wait > 0 and self.max_batch_size > 1
+
+    def accepts(self, n_products):
+        """Whether a call with n_products should go through the batcher."""
+        return self.enabled and n_products < self.max_batch_size
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue() # Items queued in the parent are not ours to answer
+                    threading.Thread(target=self._run, args=(self._queue,), name="micro-batcher", daemon=True).start()
+                    self._pid = os.getpid()
+
+    def rollout(self, weights_list, sequences, horizons, covariates=None):
+        """
+        Forecasts like weight_store.rollout on the stacked weights of weights_list, batched with
+        concurrent calls. Blocks until the batch ran.
+        - weights_list: per-product weights, all with the same architecture_key.
+        - sequences: scaled input windows [n_products, 1, sequence_length, n_features].
+        - horizons: forecast days per product.
+        - covariates: known future covariates [n_products, 1, >= horizon, n_covariates], or None.
+        Returns the scaled predictions [n_products, max(horizons)] (zero after each product's horizon).
+        """
+        self._ensure_thread()
+        items = [
+            _Item(weights, sequences[k], horizons[k], None if covariates is None else covariates[k])
+            for k, weights in enumerate(weights_list)
+        ]
+        with self._lock:
+            self._counters["calls"] += 1
+        for item in items:
+            self._queue.put(item)
+        predictions = np.zeros((len(items), max(horizons, default=0)), dtype=np.float32)
+        for k, item in enumerate(items):
+            predictions[k, :item.horizon] = item.future.result()
+        return predictions
+
+    def _run(self, item_queue):
+        while True:
+            batch = [item_queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(item_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        groups = {}
+        for item in batch:
+            groups.setdefault(weight_store.architecture_key(item.weights), []).append(item)
+        for items in groups.values():
+            try:
+                stacked_weights = weight_store.stack_weights([item.weights for item in items])
+                longest_horizon = max(item.horizon for item in items)
+                covariates = None
+                if items[0].covariates is not None:
+                    # Calls computed covariates up to their own longest horizon; the steps after a
+                    # product's horizon don't affect its forecast, so zeros are fine there
+                    covariates = np.zeros((len(items), 1, longest_horizon, items[0].covariates.shape[-1]), dtype=np.float32)
+                    for k, item in enumerate(items):
+                        steps = min(longest_horizon, item.covariates.shape[-2])
+                        covariates[k, :, :steps] = item.covariates[..., :steps, :]
+                sequences = np.stack([item.sequence for item in items])
+                predictions = weight_store.rollout(stacked_weights, sequences, longest_horizon, covariates=covariates)[:, 0, :]
+                for item, product_predictions in zip(items, predictions):
+                    item.future.set_result(product_predictions[:item.horizon])
+            except Exception as e:
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+        with self._lock:
+            self._counters["batches"] += 1
+            self._counters["products"] += len(batch)
+            self._counters["largest_batch"] = max(self._counters["largest_batch"], len(batch))
+
+    def counters(self):
+        """{'batches', 'products', 'calls', 'largest_batch'} since the process started."""
+        with self._lock:
+            return dict(self._counters)
+
+
+DEFAULT_BATCHER = MicroBatcher()
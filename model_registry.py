@@ -0,0 +1,192 @@
+# File: model_registry.py
+# ---------------------------
+# Versioned model artifacts. Every training run writes a new, immutable version directory
+#     MODELS_DIR/versions/produk_jadi_<id>/<version>/
+#         produk_jadi_<id>_model.keras, _scaler.joblib, _weights*.npz, manifest.json
+# with a manifest recording the training window, the metrics, the config and a SHA-256 of
+# every file. Which version is served is decided by a small pointer file
+#     MODELS_DIR/produk_jadi_<id>_current.json
+# replaced atomically (os.replace) on promotion, so readers see either the old or the new
+# version, never a half-written model. The pointer also remembers the previous version,
+# for rollback. Products without a pointer keep using the flat files in MODELS_DIR.
+#     python model_registry.py list --product 1
+#     python model_registry.py promote --product 1 --version 20240101T000000_ab12cd
+#     python model_registry.py rollback --product 1
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODELS_DIR = os.getenv('MODELS_DIR', './trained_models/')
+MODEL_KEEP_VERSIONS = int(os.getenv('MODEL_KEEP_VERSIONS', 5)) # Versions kept per product (0 = keep all)
+MANIFEST_NAME = "manifest.json"
+
+
+def pointer_path(produk_jadi_id, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, f"produk_jadi_{produk_jadi_id}_current.json")
+
+
+def versions_dir(produk_jadi_id, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, "versions", f"produk_jadi_{produk_jadi_id}")
+
+
+def version_dir(produk_jadi_id, version, models_dir=MODELS_DIR):
+    return os.path.join(versions_dir(produk_jadi_id, models_dir), version)
+
+
+def read_pointer(produk_jadi_id, models_dir=MODELS_DIR):
+    """The pointer dict ({'version', 'previous', 'promoted_at'}), or None for unversioned products."""
+    try:
+        with open(pointer_path(produk_jadi_id, models_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def current_version(produk_jadi_id, models_dir=MODELS_DIR):
+    pointer = read_pointer(produk_jadi_id, models_dir)
+    return pointer["version"] if pointer else None
+
+
+def artifact_dir(produk_jadi_id, models_dir=MODELS_DIR):
+    """Directory holding the served artifacts of a product: its current version, or models_dir itself."""
+    version = current_version(produk_jadi_id, models_dir)
+    return version_dir(produk_jadi_id, version, models_dir) if version else models_dir
+
+
+def create_version(produk_jadi_id, models_dir=MODELS_DIR):
+    """Creates an empty version directory. Returns (version, path)."""
+    version = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    path = version_dir(produk_jadi_id, version, models_dir)
+    os.makedirs(path)
+    return version, path
+
+
+def file_hashes(directory):
+    """SHA-256 of every artifact file in a version directory (the manifest itself excluded)."""
+    hashes = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name == MANIFEST_NAME or not os.path.isfile(path):
+            continue
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        hashes[name] = digest.hexdigest()
+    return hashes
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """Writes manifest.json for a version directory, with 'files' set to the current file hashes."""
+    manifest = dict(manifest, files=file_hashes(directory))
+    tmp_path = os.path.join(directory, f"{MANIFEST_NAME}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+    return manifest
+
+
+def verify(produk_jadi_id, version, models_dir=MODELS_DIR):
+    """Raises ValueError unless every file listed in the version's manifest is present and unchanged."""
+    directory = version_dir(produk_jadi_id, version, models_dir)
+    try:
+        expected = read_manifest(directory)["files"]
+    except (OSError, ValueError, KeyError) as e:
+        raise ValueError(f"Version {version} of produk_jadi_id {produk_jadi_id} has no valid manifest: {e}")
+    actual = file_hashes(directory)
+    mismatched = sorted(name for name, digest in expected.items() if actual.get(name) != digest)
+    if mismatched:
+        raise ValueError(f"Version {version} of produk_jadi_id {produk_jadi_id} failed verification: {', '.join(mismatched)}")
+
+
+def promote(produk_jadi_id, version, models_dir=MODELS_DIR):
+    """
+    Makes `version` the served version of a product after verifying its files. The pointer
+    file is replaced atomically; API workers pick the change up on their next reload check
+    (weight_store.WeightStore.reload_changed).
+    """
+    verify(produk_jadi_id, version, models_dir)
+    previous = current_version(produk_jadi_id, models_dir)
+    pointer = {
+        "version": version,
+        "previous": previous if previous != version else (read_pointer(produk_jadi_id, models_dir) or {}).get("previous"),
+        "promoted_at": datetime.now().isoformat(timespec='seconds'),
+    }
+    path = pointer_path(produk_jadi_id, models_dir)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(pointer, f)
+    os.replace(tmp_path, path)
+    return pointer
+
+
+def rollback(produk_jadi_id, models_dir=MODELS_DIR):
+    """Promotes the version that was served before the current one."""
+    pointer = read_pointer(produk_jadi_id, models_dir)
+    if not pointer or not pointer.get("previous"):
+        raise ValueError(f"produk_jadi_id {produk_jadi_id} has no previous version to roll back to.")
+    return promote(produk_jadi_id, pointer["previous"], models_dir)
+
+
+def list_versions(produk_jadi_id, models_dir=MODELS_DIR):
+    """Version names of a product, oldest first (names sort by creation time)."""
+    try:
+        return sorted(os.listdir(versions_dir(produk_jadi_id, models_dir)))
+    except OSError:
+        return []
+
+
+def prune(produk_jadi_id, keep=MODEL_KEEP_VERSIONS, models_dir=MODELS_DIR):
+    """Deletes all but the newest `keep` versions, never the current or previous one. Returns the deleted versions."""
+    if keep <= 0:
+        return []
+    pointer = read_pointer(produk_jadi_id, models_dir) or {}
+    protected = {pointer.get("version"), pointer.get("previous")}
+    deleted = [version for version in list_versions(produk_jadi_id, models_dir)[:-keep] if version not in protected]
+    for version in deleted:
+        shutil.rmtree(version_dir(produk_jadi_id, version, models_dir), ignore_errors=True)
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, promote and roll back model versions")
+    parser.add_argument("command", choices=["list", "promote", "rollback"])
+    parser.add_argument("--product", type=int, required=True, help="produk_jadi id")
+    parser.add_argument("--version", help="Version to promote")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version(args.product, args.models_dir)
+        for version in list_versions(args.product, args.models_dir):
+            try:
+                manifest = read_manifest(version_dir(args.product, version, args.models_dir))
+            except (OSError, ValueError):
+                manifest = {}
+            window = manifest.get("training_window", {})
+            metrics = manifest.get("metrics", {})
+            print(f"{'*' if version == current else ' '} {version}  "
+                  f"window {window.get('start')}..{window.get('end')}  "
+                  f"val_loss {metrics.get('best_val_loss')}")
+    elif args.command == "promote":
+        if not args.version:
+            parser.error("promote needs --version")
+        print(promote(args.product, args.version, args.models_dir))
+    else:
+        print(rollback(args.product, args.models_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,65 +1,73 @@
 # File: model_utils.py
 # ---------------------------
 import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 # from sklearn.preprocessing import MinMaxScaler # Scaler will be loaded
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Input
+# TensorFlow is imported inside the functions that need it (training / loading .keras files),
+# so the API can serve from weight_store without initialising TensorFlow in every worker.
 import os
 from dotenv import load_dotenv
 import joblib # For loading the scaler
 
+import weight_store # NumPy copies of the trained weights used for serving
+import model_registry # Versioned artifact directories
+import features # Calendar covariates (same as training)
+import micro_batch # Merges small concurrent rollouts
+import intermittent # Per-product random streams of sampled paths
+
 load_dotenv()
 
 MODELS_DIR = os.getenv('MODELS_DIR', './trained_models/')
 SEQUENCE_LENGTH = 30 # Number of past time steps to use for prediction
-N_FEATURES = 1 # Univariate model (only using sales quantity)
+N_FEATURES = 1 # Sales quantity only; models with covariates have features.n_features(feature_set) inputs
+FORECAST_SAMPLES = int(os.getenv('FORECAST_SAMPLES', 100)) # Sampled paths per product for prediction intervals
+RESIDUAL_DAYS = 60 # Days of one-step-ahead errors the sampled paths draw from
 
-def create_lstm_model(sequence_length=SEQUENCE_LENGTH, n_features=N_FEATURES):
+def create_lstm_model(sequence_length=SEQUENCE_LENGTH, n_features=N_FEATURES, units=50, learning_rate=None,
+                      jit_compile=False):
     """
     Defines a simple LSTM model architecture.
-    This function is primarily used by train.py.
+    This function is primarily used by train.py (and tune.py, which varies units/learning_rate).
+    jit_compile=True compiles the train step with XLA (used by the CPU-optimized training mode).
     """
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Input
+    from tensorflow.keras.optimizers import Adam
+
     model = Sequential()
     # Add Input layer to specify input_shape for the first LSTM layer
     model.add(Input(shape=(sequence_length, n_features))) 
-    model.add(LSTM(50, activation='relu')) # 50 LSTM units
-    model.add(Dense(1)) # Output layer to predict 1 step ahead
-    model.compile(optimizer='adam', loss='mse') # 'mse' (mean squared error) is a common loss for regression
+    model.add(LSTM(units, activation='relu')) # 50 LSTM units by default
+    model.add(Dense(1, dtype='float32')) # Output layer to predict 1 step ahead (float32 even under mixed precision)
+    optimizer = Adam(learning_rate=learning_rate) if learning_rate is not None else 'adam'
+    model.compile(optimizer=optimizer, loss='mse', jit_compile=jit_compile) # 'mse' (mean squared error) is a common loss for regression
     return model
 
-def preprocess_data_for_prediction(sales_data_df, scaler):
+def preprocess_data_for_prediction(sales_data_df, weights, sequence_length=SEQUENCE_LENGTH, feature_set='sales'):
     """
-    Prepares historical sales data for LSTM prediction using a pre-fitted scaler.
-    - sales_data_df: Pandas DataFrame with a 'total_sold_on_day' column, already resampled to daily.
-    - scaler: The scikit-learn MinMaxScaler object that was fitted on the training data.
+    Prepares historical sales data for LSTM prediction using the product's fitted scaler.
+    - sales_data_df: Pandas DataFrame with a 'total_sold_on_day' column, already resampled to daily
+                     (and a 'sale_date' column for feature sets with calendar covariates).
+    - weights: The product's weights from weight_store (scaler_min/scaler_scale of the
+               MinMaxScaler fitted on the training data).
+    - sequence_length: Input window length of the model (defaults to SEQUENCE_LENGTH).
+    - feature_set: The model's input features (see features.py).
     Returns the last sequence suitable for model input, or None if data is insufficient.
     """
-    if sales_data_df.empty or len(sales_data_df) < SEQUENCE_LENGTH:
-        print(f"Preprocessing error: Not enough historical data points. Need at least {SEQUENCE_LENGTH}, got {len(sales_data_df)}.")
-        return None
-    if scaler is None:
-        print("Preprocessing error: Scaler object not provided.")
+    if sales_data_df.empty or len(sales_data_df) < sequence_length:
+        print(f"Preprocessing error: Not enough historical data points. Need at least {sequence_length}, got {len(sales_data_df)}.")
         return None
-
-    # Extract the 'total_sold_on_day' column and reshape for the scaler
-    sales_values = sales_data_df['total_sold_on_day'].values.reshape(-1, 1)
-    
-    try:
-        # Transform the data using the provided (already fitted) scaler
-        scaled_data = scaler.transform(sales_values)
-    except Exception as e:
-        print(f"Error during scaling/transform: {e}")
+    if weights is None or 'scaler_min' not in weights:
+        print("Preprocessing error: Scaler parameters not provided.")
         return None
 
-    # We only need the last `SEQUENCE_LENGTH` data points to form the input sequence
-    if len(scaled_data) >= SEQUENCE_LENGTH:
-        last_sequence = scaled_data[-SEQUENCE_LENGTH:]
-        # Reshape the sequence to be [1, SEQUENCE_LENGTH, N_FEATURES] for the LSTM model
-        last_sequence_reshaped = last_sequence.reshape((1, SEQUENCE_LENGTH, N_FEATURES))
-        return last_sequence_reshaped
-    else:
-        print(f"Not enough data to form a full sequence after scaling. Need {SEQUENCE_LENGTH}, got {len(scaled_data)}.")
-        return None
+    # Only the last `sequence_length` data points form the input sequence
+    last_sequence = weight_store.scale_values(weights, sales_data_df['total_sold_on_day'].values[-sequence_length:])
+    last_sequence = features.model_inputs(feature_set, last_sequence, sales_data_df['sale_date'].iloc[-sequence_length]
+                                          if feature_set != 'sales' else None)
+    # Reshape the sequence to be [1, sequence_length, n_features] for the LSTM model
+    return last_sequence.reshape((1, sequence_length, last_sequence.shape[-1]))
 
 def load_lstm_model_and_scaler(produk_jadi_id):
     """
@@ -67,11 +75,14 @@ def load_lstm_model_and_scaler(produk_jadi_id):
     (from .joblib file) for a specific produk_jadi_id.
     Returns (model, scaler) or (None, None) if loading fails.
     """
+    from tensorflow.keras.models import load_model
+
     model_filename = f"produk_jadi_{produk_jadi_id}_model.keras"
     scaler_filename = f"produk_jadi_{produk_jadi_id}_scaler.joblib"
     
-    model_path = os.path.join(MODELS_DIR, model_filename)
-    scaler_path = os.path.join(MODELS_DIR, scaler_filename)
+    artifact_dir = model_registry.artifact_dir(produk_jadi_id, MODELS_DIR) # Current version, or MODELS_DIR
+    model_path = os.path.join(artifact_dir, model_filename)
+    scaler_path = os.path.join(artifact_dir, scaler_filename)
     
     model = None
     scaler = None
@@ -102,6 +113,174 @@ def load_lstm_model_and_scaler(produk_jadi_id):
     return model, scaler
 
 
+def _to_sales_quantities(predictions):
+    """Rounds inverse-scaled predictions into non-negative integer sales quantities."""
+    # Ensure predictions are non-negative integers (as sales are counts)
+    return [max(0, int(round(p))) for p in predictions]
+
+
+def _group_by_architecture(historical_sales_by_product):
+    """
+    Loads the weights of every product and groups the products that can share a stacked rollout.
+    Returns (missing, groups): the ids without a usable model/history, and
+    {architecture_key: [(produk_jadi_id, weights, historical_sales_df)]}.
+    """
+    missing = []
+    groups = {}
+    for produk_jadi_id, historical_sales_df in historical_sales_by_product.items():
+        # Weights come from the in-process NumPy store (loaded once, shared by all requests)
+        weights = weight_store.DEFAULT_STORE.get(produk_jadi_id)
+        if weights is None:
+            print(f"For produk_jadi_id {produk_jadi_id}: Cannot make predictions for this product: model or scaler not found or failed to load.")
+            missing.append(produk_jadi_id)
+            continue
+        if len(historical_sales_df) < weights['sequence_length']:
+            print(f"Could not prepare input sequence from historical data for produk_jadi_id {produk_jadi_id}: "
+                  f"need at least {weights['sequence_length']} days, got {len(historical_sales_df)}.")
+            missing.append(produk_jadi_id)
+            continue
+        groups.setdefault(weight_store.architecture_key(weights), []).append(
+            (produk_jadi_id, weights, historical_sales_df)
+        )
+    return missing, groups
+
+
+def _last_sequences(stacked_weights, members):
+    """
+    Scaled last input windows [n_products, 1, sequence_length, n_features] of an architecture
+    group: the sales of all members are scaled in one broadcasted operation.
+    """
+    sequence_length = stacked_weights['sequence_length']
+    feature_set = stacked_weights['feature_set']
+    last_sales = np.stack([df['total_sold_on_day'].values[-sequence_length:] for _, _, df in members])
+    scaled = weight_store.scale_values(stacked_weights, last_sales) # [n_products, sequence_length]
+    if feature_set == 'sales':
+        return scaled[:, None, :, None]
+    return np.stack([
+        features.model_inputs(feature_set, scaled[k], df['sale_date'].iloc[-sequence_length])
+        for k, (_, _, df) in enumerate(members)
+    ])[:, None]
+
+
+def _future_covariates(members, horizon):
+    """
+    Known covariates of the forecast days of every member of an architecture group,
+    [n_products, 1, horizon, n_covariates], or None for univariate models.
+    """
+    feature_set = members[0][1].get('feature_set', 'sales')
+    if feature_set == 'sales':
+        return None
+    return np.stack([
+        features.covariates(feature_set, pd.Timestamp(df['sale_date'].iloc[-1]) + pd.Timedelta(days=1), horizon)
+        for _, _, df in members
+    ])[:, None]
+
+
+def predict_sales_for_products(historical_sales_by_product, forecast_horizon_days=7):
+    """
+    Batched version of predict_sales_for_product: forecasts many products in one inference pass.
+    - historical_sales_by_product: dict {produk_jadi_id: DataFrame}, each with the same requirements
+                                   as in predict_sales_for_product.
+    - forecast_horizon_days: Number of future days to predict, either one int for all products
+                             or a dict {produk_jadi_id: int}.
+    Products are grouped by model architecture and every group runs a single stacked
+    rollout up to its longest horizon. Products without a model/scaler or with too little
+    history get zeros, like predict_sales_for_product.
+    Returns a dict {produk_jadi_id: list of predicted sales quantities (integers)}.
+    """
+    if isinstance(forecast_horizon_days, dict):
+        horizons = forecast_horizon_days
+    else:
+        horizons = {pid: forecast_horizon_days for pid in historical_sales_by_product}
+
+    missing, groups = _group_by_architecture(historical_sales_by_product)
+    results = {produk_jadi_id: [0] * horizons[produk_jadi_id] for produk_jadi_id in missing} # Zeros (as integers)
+    for members in groups.values():
+        stacked_weights = weight_store.stack_weights([weights for _, weights, _ in members])
+        sequences = _last_sequences(stacked_weights, members) # [n_products, 1, sequence_length, n_features]
+        longest_horizon = max(horizons[produk_jadi_id] for produk_jadi_id, _, _ in members)
+        covariates = _future_covariates(members, longest_horizon)
+        if micro_batch.DEFAULT_BATCHER.accepts(len(members)):
+            # Small calls are merged with concurrent requests into one rollout (see micro_batch.py)
+            predictions_scaled = micro_batch.DEFAULT_BATCHER.rollout(
+                [weights for _, weights, _ in members], sequences,
+                [horizons[produk_jadi_id] for produk_jadi_id, _, _ in members], covariates
+            )
+        else:
+            # Iteratively predict every product of the group at once, feeding predictions back into the window
+            predictions_scaled = weight_store.rollout(stacked_weights, sequences, longest_horizon, covariates=covariates)[:, 0, :]
+        predictions = weight_store.unscale_values(stacked_weights, predictions_scaled) # All products at once
+        for (produk_jadi_id, _, _), product_predictions in zip(members, predictions):
+            results[produk_jadi_id] = _to_sales_quantities(product_predictions[:horizons[produk_jadi_id]])
+    return results
+
+
+def predict_sales_samples_for_products(historical_sales_by_product, forecast_horizon_days=7,
+                                       n_samples=FORECAST_SAMPLES, seed=0):
+    """
+    Sampled forecast paths for prediction intervals (residual bootstrap).
+    The models are deterministic (no dropout), so uncertainty comes from the model's own
+    one-step-ahead errors on the last RESIDUAL_DAYS days of history: every sampled path
+    adds a randomly drawn past residual to each step before feeding it back. All paths of
+    all products of an architecture group run as one stacked rollout
+    (input [n_products, n_samples, sequence_length, n_features]), so 100 samples cost one batched pass.
+    Every product draws its residuals from its own random stream (intermittent.sample_stream),
+    so its samples are the same whichever products share the call.
+    Returns a dict {produk_jadi_id: int array [n_samples, horizon] of sales quantities};
+    products without a model/scaler or with too little history get all-zero samples.
+    """
+    if isinstance(forecast_horizon_days, dict):
+        horizons = forecast_horizon_days
+    else:
+        horizons = {pid: forecast_horizon_days for pid in historical_sales_by_product}
+
+    missing, groups = _group_by_architecture(historical_sales_by_product)
+    results = {produk_jadi_id: np.zeros((n_samples, horizons[produk_jadi_id]), dtype=int) for produk_jadi_id in missing}
+    for members in groups.values():
+        stacked_weights = weight_store.stack_weights([weights for _, weights, _ in members])
+        sequence_length = stacked_weights['sequence_length']
+        feature_set = stacked_weights['feature_set']
+        longest_horizon = max(horizons[produk_jadi_id] for produk_jadi_id, _, _ in members)
+
+        # One-step-ahead residuals over the last n_residuals days every product of the group has
+        input_histories = [
+            features.model_inputs(
+                feature_set,
+                weight_store.scale_values(weights, df['total_sold_on_day'].values),
+                df['sale_date'].iloc[0] if feature_set != 'sales' else None,
+            )
+            for _, weights, df in members
+        ] # [n_days, n_features] each
+        n_residuals = min(RESIDUAL_DAYS, min(len(history) for history in input_histories) - sequence_length)
+        if n_residuals > 0:
+            windows = np.stack([
+                sliding_window_view(history[:-1], sequence_length, axis=0)[-n_residuals:].swapaxes(1, 2)
+                for history in input_histories
+            ]) # [n_products, n_residuals, sequence_length, n_features]
+            targets = np.stack([history[-n_residuals:, 0] for history in input_histories])
+            residuals = targets - weight_store.lstm_forward(stacked_weights, windows)
+            # Drawn day by day, so the first days don't depend on the longest horizon of the group
+            draws = np.stack([
+                intermittent.sample_stream(seed, produk_jadi_id)
+                .integers(0, n_residuals, size=(longest_horizon, n_samples)).T
+                for produk_jadi_id, _, _ in members
+            ]) # [n_products, n_samples, longest_horizon]
+            noise = np.take_along_axis(residuals[:, :, None], draws.reshape(len(members), -1, 1), axis=1)
+            noise = noise.reshape(len(members), n_samples, longest_horizon).astype(np.float32)
+        else:
+            noise = np.zeros((len(members), n_samples, longest_horizon), dtype=np.float32)
+
+        sequences = _last_sequences(stacked_weights, members) # [n_products, 1, L, n_features]
+        sequences = np.broadcast_to(sequences, (len(members), n_samples) + sequences.shape[2:])
+        samples_scaled = weight_store.rollout(stacked_weights, sequences, longest_horizon, noise,
+                                              covariates=_future_covariates(members, longest_horizon))
+        quantities = weight_store.unscale_values(stacked_weights, samples_scaled) # All products at once
+        for (produk_jadi_id, _, _), product_quantities in zip(members, quantities):
+            product_quantities = product_quantities[:, :horizons[produk_jadi_id]]
+            results[produk_jadi_id] = np.maximum(np.round(product_quantities), 0).astype(int)
+    return results
+
+
 def predict_sales_for_product(produk_jadi_id, historical_sales_df, forecast_horizon_days=7):
     """
     Predicts sales for a single product for a given number of future days (forecast_horizon_days).
@@ -112,44 +291,4 @@ def predict_sales_for_product(produk_jadi_id, historical_sales_df, forecast_hori
     - forecast_horizon_days: Number of future days to predict.
     Returns a list of predicted sales quantities (integers).
     """
-    model, scaler = load_lstm_model_and_scaler(produk_jadi_id)
-
-    if model is None or scaler is None:
-        warning_msg = "Cannot make predictions for this product: "
-        if model is None: warning_msg += "model not found or failed to load. "
-        if scaler is None: warning_msg += "scaler not found or failed to load."
-        print(f"For produk_jadi_id {produk_jadi_id}: {warning_msg}")
-        return [0] * forecast_horizon_days # Return list of zeros (as integers)
-
-    # Prepare the last known sequence from historical_sales_df using the loaded scaler
-    last_known_sequence = preprocess_data_for_prediction(historical_sales_df, scaler=scaler)
-
-    if last_known_sequence is None:
-        # This implies preprocess_data_for_prediction found issues (e.g. not enough data points)
-        print(f"Could not prepare input sequence from historical data for produk_jadi_id {produk_jadi_id}.")
-        return [0] * forecast_horizon_days
-
-    predictions_scaled = []
-    current_batch_for_prediction = last_known_sequence.copy() # Start with the last known sequence
-
-    # Iteratively predict for the forecast_horizon_days
-    for _ in range(forecast_horizon_days):
-        # Predict the next step (model.predict expects a batch)
-        next_step_pred_scaled = model.predict(current_batch_for_prediction, verbose=0)[0] # verbose=0 to suppress Keras logs
-        predictions_scaled.append(next_step_pred_scaled[0]) # Append the scalar prediction
-
-        # Update the batch for the next prediction:
-        # Reshape the prediction to be [1, 1, N_FEATURES]
-        new_step_reshaped = next_step_pred_scaled.reshape((1, 1, N_FEATURES))
-        # Append the new prediction and remove the oldest step from the batch
-        current_batch_for_prediction = np.append(current_batch_for_prediction[:, 1:, :], new_step_reshaped, axis=1)
-
-    # Inverse transform the scaled predictions to their original scale
-    if predictions_scaled: # Check if any predictions were made
-        predictions_original_scale = scaler.inverse_transform(np.array(predictions_scaled).reshape(-1, 1))
-        # Ensure predictions are non-negative integers (as sales are counts)
-        final_predictions = [max(0, int(round(p[0]))) for p in predictions_original_scale]
-    else:
-        final_predictions = [0] * forecast_horizon_days
-    
-    return final_predictions
+    return predict_sales_for_products({produk_jadi_id: historical_sales_df}, forecast_horizon_days)[produk_jadi_id]
@@ -0,0 +1,55 @@
+# File: precompute_forecasts.py
+# ---------------------------
+# Nightly batch job: forecasts every produk_jadi for the standard horizons and writes
+# them to the forecast store, so the API can answer standard requests without inference.
+# Schedule it after new sales are loaded and after every retrain, e.g. with cron:
+#     30 0 * * * cd /path/to/textile_api && venv/bin/python precompute_forecasts.py
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+import database
+import forecasting
+import forecast_store
+
+load_dotenv()
+
+
+def main():
+    print("Precomputing forecasts...")
+
+    all_produk_ids = database.get_all_produk_jadi_ids()
+    if not all_produk_ids:
+        print("No produk_jadi found to forecast.")
+        return
+
+    history_days = forecast_store.STANDARD_HISTORY_DAYS
+    horizon_days = max(forecast_store.STANDARD_HORIZONS)
+    end_date_history = datetime.now().date()
+    start_date_history = end_date_history - timedelta(days=history_days)
+
+    # Uses the same path as the API (one history query, batched model_utils.predict_sales_for_products)
+    forecasts = forecasting.fetch_and_forecast(all_produk_ids, start_date_history, end_date_history, horizon_days)
+
+    forecast_store.save_forecasts(forecasts, end_date_history, history_days, horizon_days)
+    print(f"Stored {horizon_days}-day forecasts for {len(forecasts)} products "
+          f"(history {start_date_history} to {end_date_history}) in {forecast_store.FORECAST_STORE_PATH}")
+
+
+def refresh(produk_jadi_ids):
+    """
+    Recomputes the stored forecasts of produk_jadi_ids only (products with new sales,
+    see change_feed.py). Returns False when the store is not current for today; the
+    full precompute (main) has to run first.
+    """
+    history_days = forecast_store.STANDARD_HISTORY_DAYS
+    horizon_days = max(forecast_store.STANDARD_HORIZONS)
+    end_date_history = datetime.now().date()
+    start_date_history = end_date_history - timedelta(days=history_days)
+    if not forecast_store.DEFAULT_STORE.is_current(end_date_history, history_days, horizon_days):
+        return False
+    forecasts = forecasting.fetch_and_forecast(sorted(produk_jadi_ids), start_date_history, end_date_history, horizon_days)
+    return forecast_store.update_forecasts(forecasts, end_date_history, history_days, horizon_days)
+
+
+if __name__ == '__main__':
+    main()
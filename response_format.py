@@ -0,0 +1,108 @@
+# File: response_format.py
+# ---------------------------
+# Content negotiation for large forecast payloads. JSON stays the default; a client that
+# sends `Accept: application/msgpack` gets a MessagePack body in a columnar layout instead:
+# one shared forecast date axis and one products x days matrix, packed as raw little-endian
+# bytes, in place of a list of per-product objects that each repeat the dates.
+# Packing the matrix is a single tobytes() call and the body is a fraction of the JSON size.
+# MessagePack comes from the msgpack package (requirements.txt); on an install without it
+# every client gets JSON and the API logs that once at startup (see log_msgpack_status).
+#
+# A packed matrix is {"dtype": "<i4" | "<f8", "shape": [rows, columns], "data": <bytes>},
+# row-major; unpack_matrix() decodes it in Python (e.g. np.frombuffer in other clients).
+import numpy as np
+from flask import Response, jsonify, request
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def msgpack_available():
+    try:
+        import msgpack # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def log_msgpack_status():
+    """Says once (at startup) when MessagePack responses are unavailable."""
+    if not msgpack_available():
+        print("msgpack is not installed: clients asking for application/msgpack get JSON (pip install msgpack)")
+
+
+def negotiate():
+    """The response format the current request asks for: 'msgpack' or 'json' (the default)."""
+    offered = [JSON_MIMETYPE] + (list(MSGPACK_MIMETYPES) if msgpack_available() else [])
+    best = request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    # A bare */* or a missing Accept header matches the first offer, JSON
+    return 'msgpack' if best in MSGPACK_MIMETYPES else 'json'
+
+
+def pack_matrix(rows):
+    """Packs equally long numeric rows as a matrix (int32 when every value is whole, float64 otherwise)."""
+    values = np.asarray(rows, dtype=np.float64).reshape(len(rows), -1) if len(rows) else np.zeros((0, 0))
+    if np.all(values == np.round(values)) and (values.size == 0 or np.abs(values).max() < 2 ** 31):
+        values = values.astype('<i4')
+    else:
+        values = values.astype('<f8')
+    return {"dtype": values.dtype.str, "shape": list(values.shape), "data": values.tobytes()}
+
+
+def unpack_matrix(packed):
+    """Inverse of pack_matrix: a NumPy array."""
+    return np.frombuffer(packed["data"], dtype=np.dtype(packed["dtype"])).reshape(packed["shape"])
+
+
+def make_response(payload, status=200, columnar=None):
+    """
+    Serializes a response dict in the negotiated format. columnar(payload) converts a
+    successful payload to the columnar layout for MessagePack; error bodies are sent as they are.
+    """
+    if negotiate() == 'json':
+        response = jsonify(payload)
+    else:
+        import msgpack
+        body = columnar(payload) if columnar is not None and status == 200 else payload
+        response = Response(msgpack.packb(body, use_bin_type=True), mimetype=MSGPACK_MIMETYPE)
+    response.status_code = status
+    response.vary.add('Accept')
+    return response
+
+
+def columnar_full_analysis(result):
+    """
+    Columnar layout of a /forecast/full_analysis response:
+        forecast_dates: the shared date axis (every product has the same horizon)
+        produk_jadi: {produk_jadi_id: [...], forecasted_sales_per_day: packed [products, days] matrix,
+                      one list per remaining forecast/production field (total_quantiles: {q: [...]})}
+        bahan_baku: {bahan_baku_id: [...], one list per purchase field, total_needed: [...]}
+    Products and bahan_baku keep the order of the JSON response.
+    """
+    forecasts = result["produk_jadi_forecasts"]
+    to_make = result["produk_jadi_to_make"]
+    to_purchase = result["bahan_baku_to_purchase"]
+    produk_jadi = {
+        "produk_jadi_id": [forecast["produk_jadi_id"] for forecast in forecasts],
+        "forecasted_sales_per_day": pack_matrix([forecast["forecasted_sales_per_day"] for forecast in forecasts]),
+    }
+    for field in ("total_forecasted_sales_period", "demand_class", "forecast_method", "warning"):
+        produk_jadi[field] = [forecast[field] for forecast in forecasts]
+    if forecasts and "total_quantiles" in forecasts[0]:
+        produk_jadi["total_quantiles"] = {
+            q: [forecast["total_quantiles"][q] for forecast in forecasts] for q in forecasts[0]["total_quantiles"]
+        }
+    for field in ("current_stock", "calculated_safety_stock", "quantity_to_make"):
+        produk_jadi[field] = [item[field] for item in to_make]
+
+    bahan_baku = {field: [item[field] for item in to_purchase] for field in (
+        "bahan_baku_id", "current_stock", "total_calculated_need_for_period", "calculated_safety_stock",
+        "quantity_to_purchase",
+    )}
+    bahan_baku["total_needed"] = [result["bahan_baku_total_needed"][bb_id] for bb_id in bahan_baku["bahan_baku_id"]]
+    return {
+        "forecast_dates": forecasts[0]["forecast_dates"] if forecasts else [],
+        "produk_jadi": produk_jadi,
+        "bahan_baku": bahan_baku,
+    }
@@ -0,0 +1,73 @@
+# File: single_flight.py
+# ---------------------------
+# Request coalescing ("single flight") inside one API process. When several dashboard
+# users open the same screen, identical forecast requests arrive at the same time; the
+# first one computes the response and the concurrent duplicates wait for its result
+# instead of each running the same queries and inference. A burst of N identical
+# requests costs one computation. Nothing is cached: once the computation finishes, the
+# next request computes again (the precomputed forecast store covers repeated requests).
+#
+# Only requests that are in flight at the same time in the same process are merged, so
+# it pays off with GUNICORN_THREADS > 1 (sync workers serve one request at a time).
+# The counters are served by GET /stats/coalescing.
+import os
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REQUEST_COALESCING = os.getenv('REQUEST_COALESCING', '1') == '1' # 0 = every request computes on its own
+
+
+class SingleFlight:
+    """
+    Runs fn once per key among concurrent callers of do(key, fn). Keys are tuples whose
+    first element names the kind of request (used for the counters); callers of the same
+    kind with equal keys must expect the same result. The result is shared, not copied:
+    callers must not modify it.
+    """
+
+    def __init__(self, enabled=REQUEST_COALESCING):
+        self.enabled = enabled
+        self._calls = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns fn(), or the result of the identical call already in flight (its exception is re-raised)."""
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            counters = self._counters.setdefault(key[0], {"computed": 0, "coalesced": 0, "in_flight": 0})
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                counters["computed"] += 1
+                counters["in_flight"] += 1
+            else:
+                counters["coalesced"] += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+                counters["in_flight"] -= 1
+
+    def counters(self):
+        """{kind: {'computed', 'coalesced', 'in_flight'}} since the process started."""
+        with self._lock:
+            return {kind: dict(counters) for kind, counters in self._counters.items()}
+
+
+DEFAULT_FLIGHTS = SingleFlight()
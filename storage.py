@@ -0,0 +1,348 @@
+# File: storage.py
+# ---------------------------
+# Storage backends behind database.py. The queries in database.py are written once, with
+# %s placeholders; a backend runs them on its engine:
+#   - 'mysql'  (default): the production MySQL server (DB_HOST, DB_USER, ... in .env).
+#   - 'duckdb': an embedded, in-process columnar database file (duckdb package, requirements.txt).
+#   - 'sqlite': an embedded database file using Python's built-in sqlite3 (no extra package).
+# The embedded backends need no server, which suits edge deployments, tests and benchmarks.
+# Fill one from the bundled MySQL dumps:
+#     python storage.py import sample_data_large.sql --backend duckdb --path ./embedded.duckdb
+#     STORAGE_BACKEND=duckdb EMBEDDED_DB_PATH=./embedded.duckdb python app.py
+import argparse
+import os
+import re
+import threading
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql')
+EMBEDDED_DB_PATH = os.getenv('EMBEDDED_DB_PATH', './embedded.db')
+# The stream of iter_historical_sales_by_product stays open while the caller trains on each
+# product, so MySQL must be willing to wait that long for the client to read the next rows
+# (MySQL's default net_write_timeout is 60 s)
+HISTORY_STREAM_TIMEOUT = int(os.getenv('HISTORY_STREAM_TIMEOUT', 86400))
+
+# Tables the application reads, with portable column types (the MySQL schema is in the dumps)
+SCHEMA = {
+    'bahan_baku': [('id', 'INTEGER'), ('nama', 'VARCHAR'), ('satuan', 'VARCHAR'), ('stok_level', 'DOUBLE'),
+                   ('harga', 'DOUBLE'), ('created_at', 'TIMESTAMP'), ('updated_at', 'TIMESTAMP')],
+    'produk_jadi': [('id', 'INTEGER'), ('kategori', 'VARCHAR'), ('stok_level', 'INTEGER'), ('harga', 'DOUBLE'),
+                    ('created_at', 'TIMESTAMP'), ('updated_at', 'TIMESTAMP')],
+    'resep_produk': [('id', 'INTEGER'), ('produk_jadi_id', 'INTEGER'), ('bahan_baku_id', 'INTEGER'),
+                     ('jumlah_dibutuhkan', 'DOUBLE'), ('created_at', 'TIMESTAMP'), ('updated_at', 'TIMESTAMP')],
+    'penjualan': [('id', 'INTEGER'), ('tanggal_penjualan', 'TIMESTAMP'), ('produk_jadi_id', 'INTEGER'),
+                  ('jumlah_terjual', 'INTEGER'), ('total_harga', 'DOUBLE'), ('created_at', 'TIMESTAMP'),
+                  ('updated_at', 'TIMESTAMP')],
+    'log_transaksi': [('id', 'INTEGER'), ('tanggal', 'TIMESTAMP'), ('tipe_item', 'VARCHAR'), ('item_id', 'INTEGER'),
+                      ('tipe_transaksi', 'VARCHAR'), ('jumlah', 'DOUBLE'), ('catatan', 'VARCHAR'),
+                      ('created_at', 'TIMESTAMP'), ('updated_at', 'TIMESTAMP')],
+}
+# Secondary indexes for the row-store backend (DuckDB scans columns and skips by min/max instead)
+INDEXES = {
+    'penjualan': ('produk_jadi_id', 'tanggal_penjualan'),
+    'log_transaksi': ('tipe_item', 'item_id'),
+    'resep_produk': ('produk_jadi_id',),
+}
+
+
+class MySQLBackend:
+    """The MySQL server configured in .env (a connection per query, as before)."""
+    name = 'mysql'
+
+    def connect(self):
+        import mysql.connector
+        try:
+            return mysql.connector.connect(
+                host=os.getenv('DB_HOST'),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD'),
+                database=os.getenv('DB_NAME'),
+                port=os.getenv('DB_PORT', 3306) # Default port if not specified
+            )
+        except mysql.connector.Error as err:
+            print(f"Error connecting to database: {err}")
+            return None
+
+    def day(self, column):
+        """SQL expression for the calendar day of a DATETIME column."""
+        return f"DATE({column})"
+
+    def fetch_df(self, query, params=None):
+        import mysql.connector
+        conn = self.connect()
+        if not conn:
+            return pd.DataFrame() # Return empty DataFrame on connection error
+        try:
+            return pd.read_sql_query(query, conn, params=params)
+        except mysql.connector.Error as err:
+            print(f"Error executing query: {err}")
+            return pd.DataFrame()
+        except Exception as e:
+            print(f"An unexpected error occurred during query execution: {e}")
+            return pd.DataFrame()
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+
+    def stream(self, query, params=None, chunk_rows=10000):
+        """Yields the result rows in lists of up to chunk_rows, read through an unbuffered (server-side) cursor."""
+        import mysql.connector
+        conn = self.connect()
+        if not conn:
+            return
+        cursor = None
+        try:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute("SET SESSION net_write_timeout = %s", (HISTORY_STREAM_TIMEOUT,))
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        except mysql.connector.Error as err:
+            print(f"Error streaming query results: {err}")
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close() # Discards the unread rows if the caller stopped early
+                except mysql.connector.Error:
+                    pass
+            if conn.is_connected():
+                conn.close()
+
+
+class _EmbeddedBackend:
+    """Shared parts of the embedded backends: %s placeholders become ?, errors are logged."""
+    create_indexes = True
+
+    def __init__(self, path=EMBEDDED_DB_PATH, read_only=True):
+        self.path = path
+        self.read_only = read_only
+
+    @staticmethod
+    def _translate(query):
+        return query.replace('%s', '?')
+
+    def day(self, column):
+        return f"DATE({column})"
+
+    def fetch_df(self, query, params=None):
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(self._translate(query), params or ())
+                columns = [description[0] for description in cursor.description]
+                return pd.DataFrame(cursor.fetchall(), columns=columns)
+        except Exception as e:
+            print(f"Error executing query on {self.name} database {self.path}: {e}")
+            return pd.DataFrame()
+
+    def stream(self, query, params=None, chunk_rows=10000):
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(self._translate(query), params or ())
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    yield rows
+        except Exception as e:
+            print(f"Error streaming query results from {self.name} database {self.path}: {e}")
+
+    def create_schema(self):
+        with self._cursor() as cursor:
+            for table, columns in SCHEMA.items():
+                definition = ", ".join(f"{name} {column_type}" + (" PRIMARY KEY" if name == 'id' else "")
+                                       for name, column_type in columns)
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+                if self.create_indexes and table in INDEXES:
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table} ON {table} ({', '.join(INDEXES[table])})")
+
+    def insert_rows(self, table, columns, rows):
+        with self._cursor() as cursor:
+            placeholders = ", ".join("?" * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+class _Cursor:
+    """Context manager for a cursor that is closed (and, for SQLite, committed) on exit."""
+
+    def __init__(self, cursor, on_exit):
+        self.cursor = cursor
+        self.on_exit = on_exit
+
+    def __enter__(self):
+        return self.cursor
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.on_exit(exc_type is None)
+
+
+class SQLiteBackend(_EmbeddedBackend):
+    """Embedded row store using the built-in sqlite3 module (one connection per query, like MySQL)."""
+    name = 'sqlite'
+
+    def _cursor(self):
+        import sqlite3
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+
+        def close(success):
+            if success and not self.read_only:
+                conn.commit()
+            conn.close()
+        return _Cursor(conn.cursor(), close)
+
+
+class DuckDBBackend(_EmbeddedBackend):
+    """
+    Embedded columnar database (DuckDB). One connection per process; every query runs on its
+    own cursor, so request threads can query concurrently.
+    """
+    name = 'duckdb'
+    create_indexes = False
+
+    def __init__(self, path=EMBEDDED_DB_PATH, read_only=True):
+        super().__init__(path, read_only)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def day(self, column):
+        return f"CAST({column} AS DATE)"
+
+    def _connection(self):
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    try:
+                        import duckdb
+                    except ImportError:
+                        raise RuntimeError("STORAGE_BACKEND=duckdb needs the duckdb package: pip install duckdb")
+                    self._conn = duckdb.connect(self.path, read_only=self.read_only)
+        return self._conn
+
+    def _cursor(self):
+        cursor = self._connection().cursor()
+        return _Cursor(cursor, lambda success: cursor.close())
+
+    def insert_rows(self, table, columns, rows):
+        # Appending a DataFrame is much faster than executemany for bulk loads
+        rows_df = pd.DataFrame(rows, columns=columns)
+        types = dict(SCHEMA[table])
+        for column in columns:
+            if types.get(column) == 'TIMESTAMP':
+                rows_df[column] = pd.to_datetime(rows_df[column])
+        with self._cursor() as cursor:
+            cursor.register('rows_df', rows_df)
+            cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT * FROM rows_df")
+            cursor.unregister('rows_df')
+
+
+BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend, 'duckdb': DuckDBBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=STORAGE_BACKEND, path=EMBEDDED_DB_PATH, read_only=True):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}', expected one of {tuple(BACKENDS)}")
+    return MySQLBackend() if name == 'mysql' else BACKENDS[name](path, read_only)
+
+
+def get_backend():
+    """The backend selected by STORAGE_BACKEND (created once per process)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replaces the process-wide backend (e.g. an embedded database in a benchmark)."""
+    global _backend
+    _backend = backend
+
+
+# --- Importing MySQL dumps ---
+
+_INSERT = re.compile(r"INSERT INTO `(\w+)` \(([^)]*)\) VALUES \((.*)\);\s*$")
+_VALUE = re.compile(r"\s*(NULL|'(?:[^'\\]|\\.|'')*'|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\s*(?:,|$)")
+
+
+def _parse_values(text):
+    values = []
+    position = 0
+    while position < len(text):
+        match = _VALUE.match(text, position)
+        if not match:
+            raise ValueError(f"Cannot parse value at: {text[position:position + 40]!r}")
+        token = match.group(1)
+        if token == 'NULL':
+            values.append(None)
+        elif token.startswith("'"):
+            values.append(re.sub(r"\\(.)|''", lambda m: m.group(1) or "'", token[1:-1]))
+        elif re.fullmatch(r"-?\d+", token):
+            values.append(int(token))
+        else:
+            values.append(float(token))
+        position = match.end()
+    return values
+
+
+def import_sql_dump(backend, dump_path, batch_rows=5000):
+    """
+    Loads the single-row INSERT statements of a MySQL dump (the sample_data_*.sql format) into
+    an embedded backend, creating the tables of SCHEMA first. Tables not in SCHEMA are skipped.
+    Returns {table: rows inserted}.
+    """
+    backend.create_schema()
+    pending = {}
+    counts = {}
+
+    def flush(key):
+        table, columns = key
+        backend.insert_rows(table, columns, pending.pop(key))
+
+    with open(dump_path) as f:
+        for line in f:
+            match = _INSERT.match(line)
+            if not match or match.group(1) not in SCHEMA:
+                continue
+            table = match.group(1)
+            columns = tuple(column.strip().strip('`') for column in match.group(2).split(','))
+            key = (table, columns)
+            pending.setdefault(key, []).append(_parse_values(match.group(3)))
+            counts[table] = counts.get(table, 0) + 1
+            if len(pending[key]) >= batch_rows:
+                flush(key)
+    for key in list(pending):
+        flush(key)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded storage backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import MySQL dumps (sample_data_*.sql) into an embedded database")
+    import_parser.add_argument("dumps", nargs="+")
+    import_parser.add_argument("--backend", choices=['duckdb', 'sqlite'], default='duckdb' if STORAGE_BACKEND == 'mysql' else STORAGE_BACKEND)
+    import_parser.add_argument("--path", default=EMBEDDED_DB_PATH)
+    args = parser.parse_args()
+
+    backend = create_backend(args.backend, args.path, read_only=False)
+    for dump in args.dumps:
+        counts = import_sql_dump(backend, dump)
+        print(f"Imported {dump} into {args.backend} database {args.path}: "
+              + ", ".join(f"{table} {count}" for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
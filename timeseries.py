@@ -0,0 +1,107 @@
+# File: timeseries.py
+# ---------------------------
+# Shared time-series preparation used by both train.py and the Flask API.
+# Training and serving must see exactly the same daily series (one row per
+# calendar day, zero for days without sales), otherwise the SEQUENCE_LENGTH
+# window the model sees at serving time covers a different span than in training.
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+
+def _to_day_numbers(values):
+    """Converts dates/strings/Timestamps to integer day numbers (days since epoch)."""
+    return pd.to_datetime(values).values.astype('datetime64[D]').astype(np.int64)
+
+
+def daily_sales_matrix(sales_df, produk_jadi_ids=None, start_date=None, end_date=None):
+    """
+    Builds a dense daily sales matrix for many products in a single vectorized pass.
+    - sales_df: DataFrame as returned by database.get_historical_sales
+                ('sale_date', 'produk_jadi_id', 'total_sold_on_day').
+    - produk_jadi_ids: Products (and their row order) to include. Defaults to the ids in sales_df.
+    - start_date, end_date: Inclusive window to cover. Default to the first/last sale date in sales_df.
+    Returns (dates, ids, values, observed):
+        dates    - pandas DatetimeIndex with one entry per calendar day in the window
+        ids      - list of produk_jadi_id, one per row of the matrices
+        values   - float array [n_products, n_days], zero on days without sales
+        observed - bool array [n_products, n_days], True on days that had at least one sales row
+    """
+    if produk_jadi_ids is None:
+        produk_jadi_ids = sorted(sales_df['produk_jadi_id'].unique().tolist()) if not sales_df.empty else []
+    ids = [int(pid) for pid in produk_jadi_ids]
+
+    if sales_df.empty:
+        day_numbers = np.empty(0, dtype=np.int64)
+    else:
+        day_numbers = _to_day_numbers(sales_df['sale_date'])
+
+    if start_date is not None:
+        start_day = int(_to_day_numbers([start_date])[0])
+    elif len(day_numbers):
+        start_day = int(day_numbers.min())
+    else:
+        start_day = None
+    if end_date is not None:
+        end_day = int(_to_day_numbers([end_date])[0])
+    elif len(day_numbers):
+        end_day = int(day_numbers.max())
+    else:
+        end_day = None
+
+    if start_day is None or end_day is None or end_day < start_day:
+        n_days = 0
+        dates = pd.DatetimeIndex([])
+    else:
+        n_days = end_day - start_day + 1
+        dates = pd.date_range(pd.Timestamp(start_day, unit='D'), periods=n_days, freq='D')
+
+    values = np.zeros((len(ids), n_days), dtype=np.float64)
+    observed = np.zeros((len(ids), n_days), dtype=bool)
+    if not ids or n_days == 0 or sales_df.empty:
+        return dates, ids, values, observed
+
+    # Map every sales row to (product row, day column) and drop rows outside the window/product list
+    id_to_row = np.argsort(np.array(ids, dtype=np.int64), kind='stable')
+    sorted_ids = np.array(ids, dtype=np.int64)[id_to_row]
+    row_pids = sales_df['produk_jadi_id'].to_numpy().astype(np.int64)
+    pos = np.clip(np.searchsorted(sorted_ids, row_pids), 0, len(sorted_ids) - 1)
+    cols = day_numbers - start_day
+    keep = (sorted_ids[pos] == row_pids) & (cols >= 0) & (cols < n_days)
+
+    flat_index = id_to_row[pos[keep]] * n_days + cols[keep]
+    quantities = pd.to_numeric(sales_df['total_sold_on_day'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    # bincount sums duplicate (product, day) rows, same as resample('D').sum()
+    values = np.bincount(flat_index, weights=quantities[keep], minlength=len(ids) * n_days).reshape(len(ids), n_days)
+    observed = (np.bincount(flat_index, minlength=len(ids) * n_days) > 0).reshape(len(ids), n_days)
+    return dates, ids, values, observed
+
+
+def observed_span(observed_row):
+    """
+    Returns (first, last) column indices of the days that had sales in one row of the
+    `observed` matrix, or None if the product had no sales at all in the window.
+    """
+    days_with_sales = np.flatnonzero(observed_row)
+    if len(days_with_sales) == 0:
+        return None
+    return int(days_with_sales[0]), int(days_with_sales[-1])
+
+
+def to_sales_frame(dates, values_row, first=0, last=None):
+    """
+    Wraps one row of the dense matrix into the DataFrame layout expected by
+    train.train_model_for_product and model_utils.predict_sales_for_product
+    ('sale_date', 'total_sold_on_day'). `first`/`last` are inclusive column indices.
+    """
+    last = len(dates) - 1 if last is None else last
+    return pd.DataFrame({
+        'sale_date': dates[first:last + 1],
+        'total_sold_on_day': values_row[first:last + 1],
+    })
+
+
+def forecast_dates(last_historical_date, forecast_days):
+    """Returns the forecast_days dates following last_historical_date as 'YYYY-MM-DD' strings."""
+    last_date = pd.Timestamp(last_historical_date).date()
+    return [(last_date + timedelta(days=i + 1)).strftime('%Y-%m-%d') for i in range(forecast_days)]
@@ -1,15 +1,22 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
+from numpy.lib.stride_tricks import sliding_window_view
 from tensorflow.keras.models import Sequential # Changed from keras to tensorflow.keras
 from tensorflow.keras.layers import LSTM, Dense, Input # Added Input
 import os
+import json
+from datetime import datetime
 from dotenv import load_dotenv
 import joblib # For saving the scaler
 
 # Assuming database.py and model_utils.py are in the same directory or accessible
 import database # To fetch historical data
 import model_utils # For create_lstm_model and constants
+import timeseries # Shared daily resampling (same as serving)
+import features # Calendar covariates (same as serving)
+import weight_store # NumPy weight export for serving
+import model_registry # Versioned artifact directories
+import training_cache # Scaled training series cached across runs
 
 load_dotenv()
 
@@ -18,37 +25,148 @@ SEQUENCE_LENGTH = model_utils.SEQUENCE_LENGTH # e.g., 30
 N_FEATURES = model_utils.N_FEATURES         # e.g., 1 for univariate
 EPOCHS = 50 # Example
 BATCH_SIZE = 16 # Example
+LSTM_UNITS = 50
+LEARNING_RATE = 0.001 # Keras' Adam default
+
+# Hyperparameters used when a product has no tuned config (see tune.py)
+DEFAULT_TRAINING_CONFIG = {
+    'units': LSTM_UNITS,
+    'sequence_length': SEQUENCE_LENGTH,
+    'batch_size': BATCH_SIZE,
+    'learning_rate': LEARNING_RATE,
+    'epochs': EPOCHS,
+    'feature_set': features.FEATURE_SET, # 'sales' (univariate) or 'calendar', see features.py
+}
+
+# Training mode: 'default' (model.fit on NumPy arrays, as configured above) or 'cpu_optimized'.
+# With batches of 16 most of the CPU time goes to per-batch Python/dispatch overhead, so the
+# optimized mode uses larger batches (with a scaled learning rate), a prefetching tf.data
+# pipeline and an XLA-compiled train step.
+TRAINING_MODE = os.getenv('TRAINING_MODE', 'default')
+CPU_OPTIMIZED_BATCH_SIZE = int(os.getenv('CPU_OPTIMIZED_BATCH_SIZE', 128))
+# 'float32' or 'mixed_bfloat16' (bfloat16 compute, float32 weights; only faster on CPUs with
+# native bfloat16 support such as AVX512_BF16/AMX). Exported weights are float32 either way.
+TRAINING_PRECISION = os.getenv('TRAINING_PRECISION', 'float32')
+TF_INTRA_OP_THREADS = int(os.getenv('TF_INTRA_OP_THREADS', 0)) # 0 = let TensorFlow decide
+TF_INTER_OP_THREADS = int(os.getenv('TF_INTER_OP_THREADS', 0))
+# Every run writes a new version directory (see model_registry.py); with MODEL_AUTO_PROMOTE=0
+# it is only promoted by hand (python model_registry.py promote ...)
+MODEL_AUTO_PROMOTE = os.getenv('MODEL_AUTO_PROMOTE', '1') == '1'
 
 def create_sequences(data, sequence_length):
-    """Creates sequences for LSTM training."""
-    xs, ys = [], []
-    for i in range(len(data) - sequence_length):
-        x = data[i:(i + sequence_length)]
-        y = data[i + sequence_length]
-        xs.append(x)
-        ys.append(y)
-    return np.array(xs), np.array(ys)
+    """
+    Creates sequences for LSTM training: every window of sequence_length rows of data and
+    the row that follows it. Built from a strided view of data (one copy, no Python loop).
+    """
+    data = np.asarray(data)
+    if len(data) <= sequence_length:
+        return np.array([]), np.array([])
+    windows = sliding_window_view(data, sequence_length, axis=0)[:-1] # [n, (features,) sequence_length]
+    return np.ascontiguousarray(np.moveaxis(windows, -1, 1)), data[sequence_length:].copy()
 
-def train_model_for_product(produk_jadi_id, sales_df):
-    """Trains and saves an LSTM model for a single produk_jadi_id."""
-    print(f"\n--- Training model for Produk Jadi ID: {produk_jadi_id} ---")
+def configure_tensorflow(precision=TRAINING_PRECISION, intra_op_threads=TF_INTRA_OP_THREADS,
+                         inter_op_threads=TF_INTER_OP_THREADS):
+    """Applies thread-pool and precision settings. Must run before the first model is built."""
+    import tensorflow as tf
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    tf.keras.mixed_precision.set_global_policy(precision)
+
+def effective_hyperparameters(config, mode=TRAINING_MODE):
+    """
+    Returns the (batch_size, learning_rate) actually used for training in `mode`.
+    The optimized mode raises the batch size to CPU_OPTIMIZED_BATCH_SIZE and scales the
+    learning rate by sqrt(new / old batch size), the usual scaling rule for Adam.
+    """
+    if mode != 'cpu_optimized' or config['batch_size'] >= CPU_OPTIMIZED_BATCH_SIZE:
+        return config['batch_size'], config['learning_rate']
+    scale = CPU_OPTIMIZED_BATCH_SIZE / config['batch_size']
+    return CPU_OPTIMIZED_BATCH_SIZE, config['learning_rate'] * np.sqrt(scale)
+
+def build_model(config, mode=TRAINING_MODE):
+    """Creates the LSTM model for a training config in the given mode."""
+    _, learning_rate = effective_hyperparameters(config, mode)
+    return model_utils.create_lstm_model(
+        config['sequence_length'], features.n_features(config['feature_set']), units=config['units'], learning_rate=learning_rate,
+        jit_compile=(mode == 'cpu_optimized')
+    )
+
+def fit_model(model, config, X_train, y_train, X_test, y_test, mode=TRAINING_MODE, epochs=None,
+              callbacks=None, verbose=1):
+    """Trains a model built by build_model. Returns the Keras History."""
+    batch_size, _ = effective_hyperparameters(config, mode)
+    epochs = config['epochs'] if epochs is None else epochs
+    if mode != 'cpu_optimized':
+        return model.fit(
+            X_train, y_train,
+            epochs=epochs,
+            batch_size=batch_size,
+            validation_data=(X_test, y_test),
+            callbacks=callbacks,
+            verbose=verbose
+        )
+
+    import tensorflow as tf
+    # Float32 tensors, shuffled like model.fit does, batched and prefetched so the next batch
+    # is ready while the current train step runs
+    train_dataset = tf.data.Dataset.from_tensor_slices((X_train.astype(np.float32), y_train.astype(np.float32))) \
+        .shuffle(len(X_train), reshuffle_each_iteration=True) \
+        .batch(batch_size) \
+        .prefetch(tf.data.AUTOTUNE)
+    val_dataset = tf.data.Dataset.from_tensor_slices((X_test.astype(np.float32), y_test.astype(np.float32))) \
+        .batch(batch_size) \
+        .prefetch(tf.data.AUTOTUNE)
+    return model.fit(train_dataset, epochs=epochs, validation_data=val_dataset, callbacks=callbacks, verbose=verbose)
 
-    if sales_df.empty or len(sales_df) < SEQUENCE_LENGTH + 10: # Need enough data for sequences and test
+def config_path(produk_jadi_id, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, f"produk_jadi_{produk_jadi_id}_config.json")
+
+def load_training_config(produk_jadi_id, models_dir=MODELS_DIR):
+    """Returns the tuned hyperparameters of a product (written by tune.py), or the defaults."""
+    config = dict(DEFAULT_TRAINING_CONFIG)
+    path = config_path(produk_jadi_id, models_dir)
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                tuned = json.load(f)
+            config.update({key: tuned[key] for key in DEFAULT_TRAINING_CONFIG if key in tuned})
+        except (OSError, ValueError) as e:
+            print(f"Error reading training config {path}, using defaults: {e}")
+    return config
+
+def save_training_config(produk_jadi_id, config, models_dir=MODELS_DIR):
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+    path = config_path(produk_jadi_id, models_dir)
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+    return path
+
+def prepare_training_data(produk_jadi_id, sales_df, sequence_length=SEQUENCE_LENGTH, feature_set='sales'):
+    """
+    Scales a product's daily sales and builds the train/test sequences, with the covariates
+    of feature_set next to the sales (see features.py). The scaled series comes from the
+    training cache when this history (or the start of it) was prepared before (see training_cache.py).
+    Returns (scaler, X_train, X_test, y_train, y_test), or None if there is not enough data.
+    """
+    if sales_df.empty or len(sales_df) < sequence_length + 10: # Need enough data for sequences and test
         print(f"Not enough data to train model for produk_jadi_id {produk_jadi_id}. Skipping.")
-        return
+        return None
 
     # 1. Prepare Data
-    sales_values = sales_df['total_sold_on_day'].values.reshape(-1, 1)
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(sales_values) # Fit scaler ON TRAINING DATA
+    scaler, scaled_data, _ = training_cache.scaled_series(produk_jadi_id, sales_df) # Fit scaler ON TRAINING DATA
+    input_data = features.model_inputs(feature_set, scaled_data, sales_df['sale_date'].iloc[0])
 
-    # 2. Create sequences
-    X, y = create_sequences(scaled_data, SEQUENCE_LENGTH)
+    # 2. Create sequences (the target is the next day's scaled sales only)
+    X, y = create_sequences(input_data, sequence_length)
     if X.shape[0] == 0:
         print(f"Could not create sequences for produk_jadi_id {produk_jadi_id}. Skipping.")
-        return
+        return None
 
-    X = X.reshape((X.shape[0], X.shape[1], N_FEATURES))
+    X = X.reshape((X.shape[0], X.shape[1], input_data.shape[1]))
+    y = y[:, :1]
 
     # 3. Split data (simple split, consider time-series cross-validation for robust evaluation)
     split_ratio = 0.8
@@ -58,69 +176,141 @@ def train_model_for_product(produk_jadi_id, sales_df):
 
     if len(X_train) == 0 or len(X_test) == 0:
         print(f"Not enough data after splitting for produk_jadi_id {produk_jadi_id}. Skipping.")
+        return None
+    return scaler, X_train, X_test, y_train, y_test
+
+def train_model_for_product(produk_jadi_id, sales_df):
+    """Trains and saves an LSTM model for a single produk_jadi_id."""
+    print(f"\n--- Training model for Produk Jadi ID: {produk_jadi_id} ---")
+
+    # Tuned hyperparameters if tune.py found some for this product, defaults otherwise
+    config = load_training_config(produk_jadi_id)
+
+    prepared = prepare_training_data(produk_jadi_id, sales_df, config['sequence_length'], config['feature_set'])
+    if prepared is None:
         return
+    scaler, X_train, X_test, y_train, y_test = prepared
 
     # 4. Create and Compile Model
-    model = model_utils.create_lstm_model(SEQUENCE_LENGTH, N_FEATURES)
+    model = build_model(config)
     # model.summary() # Optional: print model summary
 
     # 5. Train Model
-    print(f"Starting training for produk_jadi_id {produk_jadi_id}...")
-    history = model.fit(
-        X_train, y_train,
-        epochs=EPOCHS,
-        batch_size=BATCH_SIZE,
-        validation_data=(X_test, y_test),
-        verbose=1 
-    )
+    print(f"Starting training for produk_jadi_id {produk_jadi_id} with {config} ({TRAINING_MODE} mode)...")
+    history = fit_model(model, config, X_train, y_train, X_test, y_test)
     print("Training complete.")
 
-    # 6. Save Model and Scaler
-    if not os.path.exists(MODELS_DIR):
-        os.makedirs(MODELS_DIR)
-    
+    # 6. Save Model and Scaler into a new version directory; the served files are never
+    # overwritten in place, the API switches over when the version is promoted
+    version, version_path = model_registry.create_version(produk_jadi_id, MODELS_DIR)
+
     # Save model using the .keras format
-    model_path = os.path.join(MODELS_DIR, f"produk_jadi_{produk_jadi_id}_model.keras") # CHANGED
+    model_path = weight_store.model_path(produk_jadi_id, version_path)
     model.save(model_path)
     print(f"Model saved to {model_path}")
 
     # Save the scaler
-    scaler_path = os.path.join(MODELS_DIR, f"produk_jadi_{produk_jadi_id}_scaler.joblib")
+    scaler_path = weight_store.scaler_path(produk_jadi_id, version_path)
     joblib.dump(scaler, scaler_path)
     print(f"Scaler saved to {scaler_path}")
 
+    # Export the weights for the NumPy serving path (lets the API run without TensorFlow),
+    # plus the reduced-precision copy the API serves if WEIGHT_PRECISION is not float32
+    weights = weight_store.extract_weights(model, config['feature_set'], scaler)
+    for precision in dict.fromkeys(('float32', weight_store.WEIGHT_PRECISION)):
+        weights_path = weight_store.weights_path(produk_jadi_id, version_path, precision)
+        exported = weights if precision == 'float32' else weight_store.quantize_weights(weights, precision)
+        weight_store.save_weights_npz(exported, weights_path)
+        print(f"Weights exported to {weights_path}")
+
+    model_registry.write_manifest(version_path, {
+        "produk_jadi_id": int(produk_jadi_id),
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "training_window": {
+            "start": pd.Timestamp(sales_df['sale_date'].iloc[0]).strftime('%Y-%m-%d'),
+            "end": pd.Timestamp(sales_df['sale_date'].iloc[-1]).strftime('%Y-%m-%d'),
+            "days": len(sales_df),
+        },
+        "config": config,
+        "training_mode": TRAINING_MODE,
+        "training_precision": TRAINING_PRECISION,
+        "metrics": {
+            "epochs": len(history.history['loss']),
+            "loss": float(history.history['loss'][-1]),
+            "val_loss": float(history.history['val_loss'][-1]),
+            "best_val_loss": float(min(history.history['val_loss'])),
+            "train_samples": len(X_train),
+            "test_samples": len(X_test),
+        },
+    })
+    if MODEL_AUTO_PROMOTE:
+        model_registry.promote(produk_jadi_id, version, MODELS_DIR)
+        model_registry.prune(produk_jadi_id, models_dir=MODELS_DIR)
+        print(f"Promoted version {version}")
+    else:
+        print(f"Saved version {version} (not promoted, MODEL_AUTO_PROMOTE=0)")
+
+
+def iter_training_series(all_produk_ids, historical_sales_all_df):
+    """
+    Yields (produk_jadi_id, product_sales_df) for every product, with product_sales_df
+    set to None for products without any sales.
+    """
+    # IMPORTANT: Resample to daily frequency and fill missing dates with 0.
+    # This ensures a continuous time series if there are days with no sales,
+    # and is crucial for the LSTM to understand "days with no sales".
+    # Done for all products in one pass; the API uses the same function at serving time.
+    dates, produk_ids, daily_sales, observed = timeseries.daily_sales_matrix(historical_sales_all_df, all_produk_ids)
+
+    for row, produk_id in enumerate(produk_ids):
+        # Each product's series spans its own first to last sale date
+        span = timeseries.observed_span(observed[row])
+        if span is not None:
+            yield produk_id, timeseries.to_sales_frame(dates, daily_sales[row], *span)
+        else:
+            yield produk_id, None
+
+
+def iter_streamed_training_series(all_produk_ids, sales_stream):
+    """
+    Same as iter_training_series, but for sales streamed one product at a time
+    (database.iter_historical_sales_by_product, ordered by produk_jadi_id), so only one
+    product's history is in memory. all_produk_ids must be sorted as well.
+    """
+    position = 0
+    for produk_id, product_rows_df in sales_stream:
+        while position < len(all_produk_ids) and all_produk_ids[position] < produk_id:
+            yield all_produk_ids[position], None # Skipped by the stream, so it has no sales
+            position += 1
+        if position == len(all_produk_ids) or all_produk_ids[position] != produk_id:
+            continue # Not one of all_produk_ids
+        position += 1
+
+        dates, _, daily_sales, observed = timeseries.daily_sales_matrix(product_rows_df, [produk_id])
+        span = timeseries.observed_span(observed[0])
+        yield produk_id, timeseries.to_sales_frame(dates, daily_sales[0], *span) if span is not None else None
+    for produk_id in all_produk_ids[position:]:
+        yield produk_id, None
+
 
 def main():
     print("Starting LSTM model training process...")
+    configure_tensorflow()
     
-    all_produk_ids = database.get_all_produk_jadi_ids()
+    all_produk_ids = sorted(database.get_all_produk_jadi_ids())
     if not all_produk_ids:
         print("No produk_jadi found to train models for.")
         return
 
-    historical_sales_all_df = database.get_historical_sales()
-
-    if historical_sales_all_df.empty:
-        print("No historical sales data found in the database.")
-        return
-
-    for produk_id in all_produk_ids:
-        product_sales_df = historical_sales_all_df[historical_sales_all_df['produk_jadi_id'] == produk_id].copy()
-        
-        if not product_sales_df.empty:
-            product_sales_df['sale_date'] = pd.to_datetime(product_sales_df['sale_date'])
-            product_sales_df = product_sales_df.sort_values('sale_date')
-            
-            # IMPORTANT: Resample to daily frequency and fill missing dates (e.g., with 0)
-            # This ensures a continuous time series if there are days with no sales.
-            # And is crucial for the LSTM to understand "days with no sales".
-            product_sales_df = product_sales_df.set_index('sale_date') \
-                .resample('D')['total_sold_on_day'] \
-                .sum().fillna(0).reset_index() 
-
+    # Streamed product by product: peak memory is one product's history, not the whole penjualan table
+    sales_stream = database.iter_historical_sales_by_product()
+    for produk_id, product_sales_df in iter_streamed_training_series(all_produk_ids, sales_stream):
+        if product_sales_df is not None:
             train_model_for_product(produk_id, product_sales_df)
         else:
             print(f"No sales data found for produk_jadi_id {produk_id} to start training.")
+    training_cache.prune() # Entries superseded by this run
 
     print("\nAll training processes finished.")
 
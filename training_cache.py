@@ -0,0 +1,175 @@
+# File: training_cache.py
+# ---------------------------
+# Content-addressed cache of prepared training series. Before any window is built,
+# train.prepare_training_data fits a MinMaxScaler on a product's daily sales and scales
+# them. This module keeps the result on disk:
+#     TRAINING_CACHE_DIR/<sha256 of the start date and the daily sales>.npz
+#         sales (raw), scaled_sales, data_min, data_max
+#     TRAINING_CACHE_DIR/produk_jadi_<id>.json   {"key": ...}, the product's latest entry
+# Entries are addressed by their content, so retrains on unchanged history, every trial
+# of a tune.py sweep and products with identical histories share one entry. When a
+# product's history only grew at the end and the new days stay within the fitted min/max,
+# the previous entry is extended by scaling just the new tail. The scaled values are then
+# the same as a refit on the whole history. Otherwise the scaler is refit from scratch.
+#
+# The cache holds the scaled series, not the windows: train.create_sequences cuts the
+# windows from it in one vectorized copy, so one entry serves every sequence length and
+# feature set (covariates only depend on the dates, see features.py).
+# Files are written atomically (os.replace), so concurrent trial processes can share the cache.
+#     python training_cache.py prune     # delete entries no product points to any more
+import argparse
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+from dotenv import load_dotenv
+from sklearn.preprocessing import MinMaxScaler
+
+load_dotenv()
+
+TRAINING_CACHE_DIR = os.getenv('TRAINING_CACHE_DIR', './training_cache/') # Empty = no cache
+CACHE_FORMAT_VERSION = 1 # Bump when the cached arrays change meaning
+
+
+def content_key(start_date, sales):
+    """Cache key of a daily sales series starting at start_date."""
+    digest = hashlib.sha256(f"v{CACHE_FORMAT_VERSION}:{start_date}:".encode())
+    digest.update(np.ascontiguousarray(sales, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def entry_path(key, cache_dir=TRAINING_CACHE_DIR):
+    return os.path.join(cache_dir, f"{key}.npz")
+
+
+def pointer_path(produk_jadi_id, cache_dir=TRAINING_CACHE_DIR):
+    return os.path.join(cache_dir, f"produk_jadi_{produk_jadi_id}.json")
+
+
+def _replace_atomically(path, write):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_entry(key, cache_dir):
+    try:
+        with np.load(entry_path(key, cache_dir)) as data:
+            return {name: data[name] for name in ('sales', 'scaled_sales', 'data_min', 'data_max')}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_entry(key, entry, cache_dir):
+    _replace_atomically(entry_path(key, cache_dir), lambda f: np.savez(f, **entry))
+
+
+def _read_pointer(produk_jadi_id, cache_dir):
+    try:
+        with open(pointer_path(produk_jadi_id, cache_dir)) as f:
+            return json.load(f)["key"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_pointer(produk_jadi_id, key, cache_dir):
+    _replace_atomically(pointer_path(produk_jadi_id, cache_dir), lambda f: f.write(json.dumps({"key": key}).encode()))
+
+
+def _scaler(data_min, data_max, n_samples):
+    """A MinMaxScaler with the state of one fitted on n_samples values ranging over [data_min, data_max]."""
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    scaler.fit(np.array([data_min, data_max], dtype=np.float64).reshape(-1, 1))
+    scaler.n_samples_seen_ = n_samples
+    return scaler
+
+
+def _fit_entry(sales):
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    scaled_sales = scaler.fit_transform(sales.reshape(-1, 1))
+    return {"sales": sales, "scaled_sales": scaled_sales, "data_min": scaler.data_min_, "data_max": scaler.data_max_}
+
+
+def _extend_entry(previous, sales):
+    """previous extended to sales, or None when sales doesn't continue it within its min/max."""
+    n_previous = len(previous["sales"])
+    if n_previous > len(sales) or not np.array_equal(previous["sales"], sales[:n_previous]):
+        return None
+    tail = sales[n_previous:]
+    if len(tail) and (tail.min() < previous["data_min"][0] or tail.max() > previous["data_max"][0]):
+        return None # The fitted range changes, so every scaled value does
+    scaler = _scaler(previous["data_min"][0], previous["data_max"][0], n_previous)
+    scaled_tail = scaler.transform(tail.reshape(-1, 1)) if len(tail) else np.zeros((0, 1))
+    return dict(previous, sales=sales, scaled_sales=np.concatenate([previous["scaled_sales"], scaled_tail]))
+
+
+def scaled_series(produk_jadi_id, sales_df, cache_dir=TRAINING_CACHE_DIR):
+    """
+    The fitted scaler and scaled daily sales [n_days, 1] of a product's training series
+    (sales_df: daily frame with sale_date and total_sold_on_day, see timeseries.to_sales_frame),
+    the same as MinMaxScaler().fit_transform on the whole series.
+    Returns (scaler, scaled_sales, source) with source 'cached', 'extended', 'computed' or 'uncached'.
+    """
+    sales = np.asarray(sales_df['total_sold_on_day'].values, dtype=np.float64)
+    if not cache_dir:
+        entry = _fit_entry(sales)
+        return _scaler(entry["data_min"][0], entry["data_max"][0], len(sales)), entry["scaled_sales"], 'uncached'
+
+    start_date = sales_df['sale_date'].iloc[0]
+    key = content_key(start_date, sales)
+    entry = _load_entry(key, cache_dir)
+    source = 'cached'
+    if entry is None:
+        previous_key = _read_pointer(produk_jadi_id, cache_dir)
+        previous = _load_entry(previous_key, cache_dir) if previous_key else None
+        # Keys include the start date: only an entry starting on the same day can be continued
+        if previous is not None and previous_key == content_key(start_date, previous["sales"]):
+            entry = _extend_entry(previous, sales)
+        source = 'extended'
+        if entry is None:
+            entry = _fit_entry(sales)
+            source = 'computed'
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_entry(key, entry, cache_dir)
+    if _read_pointer(produk_jadi_id, cache_dir) != key:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_pointer(produk_jadi_id, key, cache_dir)
+    return _scaler(entry["data_min"][0], entry["data_max"][0], len(sales)), entry["scaled_sales"], source
+
+
+def prune(cache_dir=TRAINING_CACHE_DIR):
+    """Deletes the entries no product points to (superseded by an extension or refit). Returns their keys."""
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return []
+    pointers = [name for name in names if name.startswith("produk_jadi_") and name.endswith(".json")]
+    referenced = set()
+    for name in pointers:
+        try:
+            with open(os.path.join(cache_dir, name)) as f:
+                referenced.add(json.load(f)["key"])
+        except (OSError, ValueError, KeyError):
+            pass
+    deleted = [name[:-len(".npz")] for name in names if name.endswith(".npz") and name[:-len(".npz")] not in referenced]
+    for key in deleted:
+        os.remove(entry_path(key, cache_dir))
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the prepared training series cache")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--cache-dir", default=TRAINING_CACHE_DIR)
+    args = parser.parse_args()
+    print(f"Deleted {len(prune(args.cache_dir))} unreferenced entries from {args.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
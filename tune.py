@@ -0,0 +1,162 @@
+# File: tune.py
+# ---------------------------
+# Per-product hyperparameter search for the LSTM models.
+# Random search over units, sequence length, batch size and learning rate. Every trial
+# trains with early stopping on validation loss, and trials that are worse than the
+# median of earlier trials at the same epoch checkpoint are pruned (stopped early).
+# Trials run in parallel worker processes. The best config of each product is saved
+# as produk_jadi_<id>_config.json in MODELS_DIR, which train.py picks up, including the
+# number of epochs at which validation loss was best.
+#
+# Usage:
+#     python tune.py --trials 20 --workers 4
+#     python tune.py --products 1 3 --trials 10 --max-epochs 50 --patience 5
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+import database
+import train
+import training_cache
+
+load_dotenv()
+
+SEARCH_SPACE = {
+    'units': [16, 32, 50, 64],
+    'sequence_length': [14, 30, 60],
+    'batch_size': [16, 32, 64],
+    'learning_rate': [0.0005, 0.001, 0.003, 0.01],
+}
+PRUNING_CHECKPOINTS = (5, 10, 20) # Epochs at which a trial is compared to the earlier ones
+MIN_TRIALS_FOR_PRUNING = 3 # Never prune before this many trials reached a checkpoint
+
+
+def sample_configs(n_trials, seed=0):
+    """Draws n_trials distinct configurations from SEARCH_SPACE (always including the current defaults)."""
+    keys = list(SEARCH_SPACE)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(SEARCH_SPACE[key] for key in keys))]
+    random.Random(seed).shuffle(grid)
+    defaults = {key: train.DEFAULT_TRAINING_CONFIG[key] for key in keys}
+    configs = [defaults] + [config for config in grid if config != defaults]
+    # Settings outside the search space (the feature set) stay as configured
+    fixed = {key: value for key, value in train.DEFAULT_TRAINING_CONFIG.items() if key not in keys and key != 'epochs'}
+    return [dict(config, **fixed) for config in configs[:n_trials]]
+
+
+def _init_worker(intra_op_threads):
+    train.configure_tensorflow(intra_op_threads=intra_op_threads, inter_op_threads=1)
+
+
+def run_trial(produk_jadi_id, sales_df, config, max_epochs, patience, checkpoint_losses, lock):
+    """
+    Trains one configuration. Runs in a worker process.
+    - checkpoint_losses: Manager dict {(produk_jadi_id, epoch): [best val_loss of each trial so far]}
+                         shared by all trials, used for median pruning.
+    Returns the config extended with val_loss, epochs (best epoch) and pruned.
+    """
+    from tensorflow.keras.callbacks import Callback, EarlyStopping
+
+    class MedianPruning(Callback):
+        def __init__(self):
+            super().__init__()
+            self.best = np.inf
+            self.pruned = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.best = min(self.best, logs['val_loss'])
+            if epoch + 1 not in PRUNING_CHECKPOINTS:
+                return
+            key = (produk_jadi_id, epoch + 1)
+            with lock:
+                earlier = checkpoint_losses.get(key, [])
+                checkpoint_losses[key] = earlier + [self.best]
+            if len(earlier) >= MIN_TRIALS_FOR_PRUNING and self.best > np.median(earlier):
+                self.pruned = True
+                self.model.stop_training = True
+
+    prepared = train.prepare_training_data(produk_jadi_id, sales_df, config['sequence_length'], config['feature_set'])
+    if prepared is None:
+        return dict(config, val_loss=np.inf, epochs=0, pruned=False)
+    _, X_train, X_test, y_train, y_test = prepared
+
+    model = train.build_model(config)
+    pruning = MedianPruning()
+    history = train.fit_model(
+        model, config, X_train, y_train, X_test, y_test,
+        epochs=max_epochs,
+        callbacks=[EarlyStopping(monitor='val_loss', patience=patience), pruning],
+        verbose=0
+    )
+    val_losses = history.history['val_loss']
+    best_epoch = int(np.argmin(val_losses))
+    return dict(config, val_loss=float(val_losses[best_epoch]), epochs=best_epoch + 1, pruned=pruning.pruned)
+
+
+def tune_product(produk_jadi_id, sales_df, executor, manager, n_trials, max_epochs, patience, seed=0):
+    """Runs all trials of one product on the executor. Returns (best_config, trial_results)."""
+    checkpoint_losses = manager.dict()
+    lock = manager.Lock()
+    futures = [
+        executor.submit(run_trial, produk_jadi_id, sales_df, config, max_epochs, patience, checkpoint_losses, lock)
+        for config in sample_configs(n_trials, seed)
+    ]
+    trials = [future.result() for future in futures]
+    # Pruned trials stopped before converging, so only completed ones can win
+    completed = [trial for trial in trials if not trial['pruned'] and np.isfinite(trial['val_loss'])]
+    best = min(completed, key=lambda trial: trial['val_loss']) if completed else None
+    return best, trials
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter search for the per-product LSTM models")
+    parser.add_argument('--products', type=int, nargs='*', help="produk_jadi ids to tune (default: all)")
+    parser.add_argument('--trials', type=int, default=20, help="Trials per product")
+    parser.add_argument('--max-epochs', type=int, default=train.EPOCHS)
+    parser.add_argument('--patience', type=int, default=5, help="Early stopping patience in epochs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Parallel trial processes")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    all_produk_ids = sorted(args.products or database.get_all_produk_jadi_ids())
+    if not all_produk_ids:
+        print("No products found to tune.")
+        return
+
+    intra_op_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    # TensorFlow is not fork-safe, so trials run in freshly spawned processes
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=context, initializer=_init_worker, initargs=(intra_op_threads,)
+    ) as executor:
+        # One product's history in memory at a time (see train.main)
+        sales_stream = database.iter_historical_sales_by_product(args.products)
+        for produk_id, product_sales_df in train.iter_streamed_training_series(all_produk_ids, sales_stream):
+            if product_sales_df is None:
+                print(f"No sales data found for produk_jadi_id {produk_id}. Skipping.")
+                continue
+            print(f"\n--- Tuning Produk Jadi ID: {produk_id} ({args.trials} trials) ---")
+            best, trials = tune_product(
+                produk_id, product_sales_df, executor, manager, args.trials, args.max_epochs, args.patience, args.seed
+            )
+            for trial in sorted(trials, key=lambda trial: trial['val_loss']):
+                status = "pruned" if trial['pruned'] else "done"
+                print(f"  val_loss={trial['val_loss']:.5f} epochs={trial['epochs']:>3} {status:>6} "
+                      f"units={trial['units']} sequence_length={trial['sequence_length']} "
+                      f"batch_size={trial['batch_size']} learning_rate={trial['learning_rate']}")
+            if best is None:
+                print(f"No trial completed for produk_jadi_id {produk_id}; keeping the default config.")
+                continue
+            path = train.save_training_config(produk_id, {key: best[key] for key in train.DEFAULT_TRAINING_CONFIG})
+            print(f"Best config (val_loss={best['val_loss']:.5f}) saved to {path}")
+    training_cache.prune() # Entries superseded by this run
+
+    print("\nTuning finished. Run train.py to retrain the models with the tuned configs.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,533 @@
+# File: weight_store.py
+# ---------------------------
+# Serving-side store for the per-product LSTM weights, held as plain NumPy arrays.
+# The models are tiny (one LSTM layer + one Dense layer), so running them in NumPy
+# avoids importing TensorFlow in the API workers at all. That matters for the
+# production server (see gunicorn.conf.py / wsgi.py): weights are loaded once in the
+# master process and the forked workers share them copy-on-write, which is not safe
+# to do with an initialised TensorFlow runtime.
+#
+# Run `python weight_store.py` after training to export every .keras model to a
+# produk_jadi_<id>_weights.npz file that can be loaded without TensorFlow.
+# `python weight_store.py --precision float16 int8` also writes reduced-precision copies
+# (produk_jadi_<id>_weights_float16.npz / _int8.npz); set WEIGHT_PRECISION to serve them.
+# Artifacts are read from the product's current version directory (see model_registry.py)
+# and WeightStore.start_reloader() swaps in newly promoted versions in the background.
+# The MinMaxScaler of every product is kept as two small arrays (scaler_min, scaler_scale)
+# inside the same .npz, so serving scales and unscales with NumPy (scale_values /
+# unscale_values, one broadcasted operation per stacked batch) and never imports sklearn.
+import argparse
+import numpy as np
+import os
+import glob
+import re
+import shutil
+import threading
+import uuid
+from dotenv import load_dotenv
+
+import model_registry
+
+load_dotenv()
+
+MODELS_DIR = os.getenv('MODELS_DIR', './trained_models/')
+# Precision of the weights held in memory for serving: 'float32', 'float16' (half the memory)
+# or 'int8' (a quarter, per-output-column symmetric quantization). Computation is float32
+# in every case; reduced-precision weights are widened when a batch is stacked.
+WEIGHT_PRECISION = os.getenv('WEIGHT_PRECISION', 'float32')
+# Seconds between checks for newly promoted model versions in the API workers (0 = off)
+MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', 60))
+PRECISIONS = ('float32', 'float16', 'int8')
+QUANTIZED_ARRAYS = ('kernel', 'recurrent_kernel', 'dense_kernel') # The biases are tiny and stay float32
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)), # Same as 1 / (1 + exp(-x)), without overflow
+    'linear': lambda x: x,
+}
+
+
+# The *_path functions take the directory holding the artifacts: MODELS_DIR for unversioned
+# products, a version directory otherwise (model_registry.artifact_dir resolves the served one)
+def model_path(produk_jadi_id, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, f"produk_jadi_{produk_jadi_id}_model.keras")
+
+
+def scaler_path(produk_jadi_id, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, f"produk_jadi_{produk_jadi_id}_scaler.joblib")
+
+
+def weights_path(produk_jadi_id, models_dir=MODELS_DIR, precision='float32'):
+    suffix = "" if precision == 'float32' else f"_{precision}"
+    return os.path.join(models_dir, f"produk_jadi_{produk_jadi_id}_weights{suffix}.npz")
+
+
+def scaler_params(scaler):
+    """
+    The parameters of a fitted MinMaxScaler as {'scaler_min', 'scaler_scale'} (float64 arrays [1]):
+    scaled = value * scaler_scale + scaler_min, exactly as scaler.transform computes it.
+    """
+    return {
+        'scaler_min': np.asarray(scaler.min_, dtype=np.float64).reshape(1),
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64).reshape(1),
+    }
+
+
+def load_scaler_params(path):
+    """Reads a .joblib scaler and returns its scaler_params (unpickling it imports sklearn)."""
+    import joblib
+    return scaler_params(joblib.load(path))
+
+
+def extract_weights(model, feature_set='sales', scaler=None):
+    """
+    Pulls the arrays out of a trained Sequential([Input, LSTM, Dense]) Keras model.
+    Returns a dict of NumPy arrays plus the metadata needed to run it (see lstm_forward),
+    including the feature set the model was trained with (see features.py) and, when the
+    fitted scaler is given, its scaler_params.
+    """
+    lstm_layer, dense_layer = model.layers[0], model.layers[1]
+    kernel, recurrent_kernel, bias = lstm_layer.get_weights()
+    dense_kernel, dense_bias = dense_layer.get_weights()
+    weights = {
+        'kernel': kernel.astype(np.float32),                     # [n_features, 4 * units]
+        'recurrent_kernel': recurrent_kernel.astype(np.float32), # [units, 4 * units]
+        'bias': bias.astype(np.float32),                         # [4 * units]
+        'dense_kernel': dense_kernel.astype(np.float32),         # [units, 1]
+        'dense_bias': dense_bias.astype(np.float32),             # [1]
+        'activation': lstm_layer.activation.__name__,
+        'recurrent_activation': lstm_layer.recurrent_activation.__name__,
+        'sequence_length': int(model.input_shape[1]),
+        'feature_set': feature_set,
+        'precision': 'float32',
+    }
+    if scaler is not None:
+        weights.update(scaler_params(scaler))
+    return weights
+
+
+def quantize_weights(weights, precision):
+    """
+    Returns a reduced-precision copy of float32 weights (see WEIGHT_PRECISION).
+    - float16: the matrices are stored as float16.
+    - int8: every output column of a matrix is scaled to [-127, 127] by max(|column|) / 127;
+            the scales are kept as '<name>_scale' (float32) for dequantize_weights.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown weight precision '{precision}', expected one of {PRECISIONS}")
+    quantized = dict(weights, precision=precision)
+    for name in QUANTIZED_ARRAYS:
+        matrix = np.asarray(weights[name], dtype=np.float32)
+        if precision == 'float16':
+            quantized[name] = matrix.astype(np.float16)
+        elif precision == 'int8':
+            scale = np.abs(matrix).max(axis=0) / 127.0
+            scale[scale == 0] = 1.0 # All-zero column
+            quantized[name] = np.round(matrix / scale).astype(np.int8)
+            quantized[f"{name}_scale"] = scale.astype(np.float32)
+    return quantized
+
+
+def dequantize_weights(weights):
+    """Returns weights with float32 matrices (the same dict if they already are)."""
+    precision = weights.get('precision', 'float32')
+    if precision == 'float32':
+        return weights
+    quantization_scales = {f"{name}_scale" for name in QUANTIZED_ARRAYS}
+    dequantized = {key: value for key, value in weights.items() if key not in quantization_scales}
+    dequantized['precision'] = 'float32'
+    for name in QUANTIZED_ARRAYS:
+        matrix = weights[name].astype(np.float32)
+        if precision == 'int8':
+            matrix *= weights[f"{name}_scale"]
+        dequantized[name] = matrix
+    return dequantized
+
+
+def weights_nbytes(weights):
+    """Memory held by the weight arrays of one product."""
+    return sum(value.nbytes for value in weights.values() if isinstance(value, np.ndarray))
+
+
+_METADATA = ('activation', 'recurrent_activation', 'sequence_length', 'feature_set', 'precision')
+
+
+def save_weights_npz(weights, path):
+    """Writes a weights file atomically: to a temporary file next to path, then os.replace."""
+    arrays = {key: value for key, value in weights.items() if isinstance(value, np.ndarray)}
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                activation=np.array(weights['activation']),
+                recurrent_activation=np.array(weights['recurrent_activation']),
+                sequence_length=np.array(weights['sequence_length']),
+                feature_set=np.array(weights.get('feature_set', 'sales')),
+                precision=np.array(weights.get('precision', 'float32')),
+                **arrays
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_weights_npz(path):
+    with np.load(path) as data:
+        weights = {key: data[key] for key in data.files if key not in _METADATA}
+        weights.update({
+            'activation': str(data['activation']),
+            'recurrent_activation': str(data['recurrent_activation']),
+            'sequence_length': int(data['sequence_length']),
+            # Exports written before covariates existed are univariate
+            'feature_set': str(data['feature_set']) if 'feature_set' in data.files else 'sales',
+            # Exports written before reduced precisions existed are float32
+            'precision': str(data['precision']) if 'precision' in data.files else 'float32',
+        })
+        return weights
+
+
+def export_product(produk_jadi_id, models_dir=MODELS_DIR, precisions=('float32',)):
+    """
+    Exports one product's .keras model to its .npz weights file, plus a reduced-precision
+    copy for every other entry of precisions. Returns the written paths, or None.
+    A versioned product is exported into a new version (a copy of the served one), which is
+    then promoted: the version being served is never written to.
+    """
+    current = model_registry.current_version(produk_jadi_id, models_dir)
+    source_dir = model_registry.artifact_dir(produk_jadi_id, models_dir)
+    keras_path = model_path(produk_jadi_id, source_dir)
+    if not os.path.exists(keras_path):
+        print(f"Model file not found: {keras_path}")
+        return None
+    from tensorflow.keras.models import load_model # Only needed for exporting
+    # The feature set is not part of the .keras file; keep the one of the existing export
+    npz_path = weights_path(produk_jadi_id, source_dir)
+    feature_set = load_weights_npz(npz_path)['feature_set'] if os.path.exists(npz_path) else 'sales'
+    weights = extract_weights(load_model(keras_path), feature_set)
+    scaler_file = scaler_path(produk_jadi_id, source_dir)
+    if os.path.exists(scaler_file):
+        weights.update(load_scaler_params(scaler_file))
+    directory = source_dir
+    if current:
+        version, directory = model_registry.create_version(produk_jadi_id, models_dir)
+        for name in os.listdir(source_dir):
+            if name != model_registry.MANIFEST_NAME and os.path.isfile(os.path.join(source_dir, name)):
+                shutil.copy2(os.path.join(source_dir, name), directory) # Keeps the mtimes load_product compares
+    paths = []
+    for precision in dict.fromkeys(('float32',) + tuple(precisions)): # float32 first, no duplicates
+        path = weights_path(produk_jadi_id, directory, precision)
+        save_weights_npz(quantize_weights(weights, precision) if precision != 'float32' else weights, path)
+        print(f"Weights exported to {path}")
+        paths.append(path)
+    if current:
+        manifest = dict(model_registry.read_manifest(source_dir), version=version, exported_from=current)
+        model_registry.write_manifest(directory, manifest)
+        model_registry.promote(produk_jadi_id, version, models_dir)
+        model_registry.prune(produk_jadi_id, models_dir=models_dir)
+        print(f"Promoted version {version}")
+    return paths
+
+
+def list_product_ids(models_dir=MODELS_DIR):
+    """Lists the produk_jadi ids that have a trained model (.keras, exported .npz or promoted version) in models_dir."""
+    ids = set()
+    for pattern in ("produk_jadi_*_model.keras", "produk_jadi_*_weights.npz", "produk_jadi_*_current.json"):
+        for path in glob.glob(os.path.join(models_dir, pattern)):
+            match = re.match(r"produk_jadi_(\d+)_", os.path.basename(path))
+            if match:
+                ids.add(int(match.group(1)))
+    return sorted(ids)
+
+
+def load_product(produk_jadi_id, models_dir=MODELS_DIR, precision=WEIGHT_PRECISION):
+    """
+    Loads one product's weights (in the given precision) and scaler parameters. Prefers the
+    exported .npz file and only falls back to reading the .keras model (which imports TensorFlow)
+    when the export is missing or older than the model. A missing or outdated
+    reduced-precision export is quantized from the float32 weights on the fly. The scaler
+    parameters come from the .npz, or from the .joblib scaler (which imports sklearn) for
+    exports that predate them or are older than the scaler.
+    Returns the weights dict (including scaler_min/scaler_scale), or None.
+    """
+    directory = model_registry.artifact_dir(produk_jadi_id, models_dir)
+    keras_path = model_path(produk_jadi_id, directory)
+    npz_path = weights_path(produk_jadi_id, directory)
+    scaler_file = scaler_path(produk_jadi_id, directory)
+
+    if not os.path.exists(scaler_file):
+        print(f"Scaler file not found: {scaler_file}")
+        return None
+
+    def is_current(path, source_paths):
+        return os.path.exists(path) and all(
+            not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)
+            for source in source_paths
+        )
+
+    try:
+        quantized_path = weights_path(produk_jadi_id, directory, precision)
+        if precision != 'float32' and is_current(quantized_path, [keras_path, npz_path]):
+            weights, loaded_path = load_weights_npz(quantized_path), quantized_path
+        elif is_current(npz_path, [keras_path]):
+            weights, loaded_path = load_weights_npz(npz_path), npz_path
+        elif os.path.exists(keras_path):
+            from tensorflow.keras.models import load_model
+            weights, loaded_path = extract_weights(load_model(keras_path)), None # Models without an export predate covariates
+        else:
+            print(f"Model file not found: {keras_path}")
+            return None
+        if weights['precision'] != precision:
+            weights = quantize_weights(weights, precision)
+        if 'scaler_min' not in weights or loaded_path is None or not is_current(loaded_path, [scaler_file]):
+            weights.update(load_scaler_params(scaler_file))
+    except Exception as e:
+        print(f"Error loading weights for produk_jadi_id {produk_jadi_id}: {e}")
+        return None
+    return weights
+
+
+def artifact_stamp(produk_jadi_id, models_dir=MODELS_DIR):
+    """
+    Cheap change marker of a product's served artifacts (a few stat calls): the modification
+    time of its version pointer, or of its flat files for unversioned products.
+    """
+    try:
+        return ('pointer', os.stat(model_registry.pointer_path(produk_jadi_id, models_dir)).st_mtime_ns)
+    except OSError:
+        pass
+    mtimes = []
+    for path in (model_path(produk_jadi_id, models_dir), weights_path(produk_jadi_id, models_dir),
+                 scaler_path(produk_jadi_id, models_dir)):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            pass
+    return ('files', max(mtimes, default=None))
+
+
+class WeightStore:
+    """
+    In-memory cache of per-product weights. Products are loaded lazily on first use,
+    or all at once with load_all() (done by wsgi.py in the gunicorn master before forking).
+    reload_changed() replaces the weights of products whose artifacts changed since they
+    were loaded; requests keep using the old weights until the new ones are fully loaded.
+    Failed loads (no trained model, unreadable files) are remembered with the artifact stamp
+    they saw and only retried once the product's artifacts change.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, precision=WEIGHT_PRECISION):
+        self.models_dir = models_dir
+        self.precision = precision
+        self._weights = {}
+        self._stamps = {}
+        self._misses = {} # produk_jadi_id -> artifact stamp of the failed load
+        self._lock = threading.Lock()
+
+    def get(self, produk_jadi_id):
+        """Returns the weights dict for a product (loading it if needed), or None."""
+        weights = self._weights.get(produk_jadi_id)
+        if weights is None:
+            with self._lock:
+                weights = self._weights.get(produk_jadi_id)
+                if weights is None:
+                    stamp = artifact_stamp(produk_jadi_id, self.models_dir) # Before loading: a change during the load is seen later
+                    if self._misses.get(produk_jadi_id) == stamp:
+                        return None # Same artifacts as the failed load
+                    weights = load_product(produk_jadi_id, self.models_dir, self.precision)
+                    if weights is not None:
+                        self._weights[produk_jadi_id] = weights
+                        self._stamps[produk_jadi_id] = stamp
+                        self._misses.pop(produk_jadi_id, None)
+                    else:
+                        self._misses[produk_jadi_id] = stamp
+        return weights
+
+    def reload_changed(self):
+        """Reloads every loaded product whose artifacts changed (see artifact_stamp). Returns the reloaded ids."""
+        reloaded = []
+        for produk_jadi_id in list(self._weights):
+            stamp = artifact_stamp(produk_jadi_id, self.models_dir)
+            if stamp == self._stamps.get(produk_jadi_id):
+                continue
+            weights = load_product(produk_jadi_id, self.models_dir, self.precision) # Outside the lock
+            if weights is None:
+                continue # Keep serving the old weights
+            with self._lock:
+                self._weights[produk_jadi_id] = weights
+                self._stamps[produk_jadi_id] = stamp
+            reloaded.append(produk_jadi_id)
+        return reloaded
+
+    def start_reloader(self, interval=MODEL_RELOAD_INTERVAL):
+        """Calls reload_changed every `interval` seconds in a daemon thread. Returns the stop event."""
+        stop_event = threading.Event()
+
+        def run():
+            while not stop_event.wait(interval):
+                try:
+                    reloaded = self.reload_changed()
+                    if reloaded:
+                        print(f"Reloaded model weights for produk_jadi_ids {reloaded}")
+                except Exception as e:
+                    print(f"Error reloading model weights: {e}")
+
+        threading.Thread(target=run, name="weight-reloader", daemon=True).start()
+        return stop_event
+
+    def load_all(self, produk_jadi_ids=None):
+        """Loads every product with a trained model (or the given ids). Returns the number loaded."""
+        ids = list_product_ids(self.models_dir) if produk_jadi_ids is None else produk_jadi_ids
+        return sum(1 for pid in ids if self.get(pid) is not None)
+
+    def loaded_product_ids(self):
+        return sorted(self._weights)
+
+
+DEFAULT_STORE = WeightStore()
+
+
+def architecture_key(weights):
+    """Products whose weights share this key can be stacked and run in one batched pass."""
+    return (
+        weights['activation'],
+        weights['recurrent_activation'],
+        weights['kernel'].shape[-2],           # n_features
+        weights['recurrent_kernel'].shape[-2], # units
+        weights['sequence_length'],
+        weights.get('feature_set', 'sales'),
+    )
+
+
+def stack_weights(weights_list):
+    """
+    Stacks the weights of several products with the same architecture_key along a new
+    leading product axis, shaped so lstm_forward/rollout broadcast over it:
+    sequences [n_products, batch, sequence_length, n_features] -> predictions [n_products, batch].
+    Reduced-precision weights are widened to float32 here.
+    """
+    weights_list = [dequantize_weights(w) for w in weights_list]
+    first = weights_list[0]
+    return {
+        'kernel': np.stack([w['kernel'] for w in weights_list])[:, None],                # [P, 1, F, 4U]
+        'recurrent_kernel': np.stack([w['recurrent_kernel'] for w in weights_list]),     # [P, U, 4U]
+        'bias': np.stack([w['bias'] for w in weights_list])[:, None, None],              # [P, 1, 1, 4U]
+        'dense_kernel': np.stack([w['dense_kernel'] for w in weights_list]),             # [P, U, 1]
+        'dense_bias': np.stack([w['dense_bias'] for w in weights_list])[:, None],        # [P, 1, 1]
+        'scaler_min': np.stack([w['scaler_min'] for w in weights_list]),                 # [P, 1]
+        'scaler_scale': np.stack([w['scaler_scale'] for w in weights_list]),             # [P, 1]
+        'activation': first['activation'],
+        'recurrent_activation': first['recurrent_activation'],
+        'sequence_length': first['sequence_length'],
+        'feature_set': first.get('feature_set', 'sales'),
+        'precision': 'float32',
+    }
+
+
+def _scaler_arrays(weights, ndim):
+    """scaler_min/scaler_scale shaped to broadcast against values with ndim dimensions."""
+    scaler_min, scaler_scale = weights['scaler_min'], weights['scaler_scale']
+    if scaler_min.ndim == 2: # Stacked: one row per product, along the leading axis of the values
+        shape = (len(scaler_min),) + (1,) * (ndim - 1)
+        scaler_min, scaler_scale = scaler_min.reshape(shape), scaler_scale.reshape(shape)
+    return scaler_min, scaler_scale
+
+
+def scale_values(weights, values):
+    """
+    Scales sales like the product's MinMaxScaler.transform, as float64.
+    - weights: one product's weights (any values shape), or several products' from
+               stack_weights() (values [n_products, ...]: every product is scaled by its own row).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaler_min, scaler_scale = _scaler_arrays(weights, values.ndim)
+    return values * scaler_scale + scaler_min
+
+
+def unscale_values(weights, values):
+    """Inverse of scale_values (like MinMaxScaler.inverse_transform), keeping float32 inputs float32."""
+    values = np.asarray(values)
+    dtype = values.dtype if values.dtype in (np.float32, np.float64) else np.float64
+    scaler_min, scaler_scale = _scaler_arrays(weights, values.ndim)
+    return ((values - scaler_min) / scaler_scale).astype(dtype)
+
+
+def lstm_forward(weights, sequences):
+    """
+    Runs the LSTM + Dense model on a batch of input sequences.
+    - weights: one product's weights, or several products' from stack_weights().
+    - sequences: float array [batch, sequence_length, n_features] (already scaled),
+                 or [n_products, batch, sequence_length, n_features] for stacked weights.
+    Returns the next-step predictions (scaled) as an array [batch] (or [n_products, batch]).
+    Matches Keras' LSTM cell (gate order i, f, c, o) to float32 precision.
+    """
+    weights = dequantize_weights(weights)
+    activation = ACTIVATIONS[weights['activation']]
+    recurrent_activation = ACTIVATIONS[weights['recurrent_activation']]
+    kernel, recurrent_kernel, bias = weights['kernel'], weights['recurrent_kernel'], weights['bias']
+    units = recurrent_kernel.shape[-2]
+
+    sequences = np.asarray(sequences, dtype=np.float32)
+    # Input projections for all timesteps at once; only the recurrent part is sequential
+    input_projection = sequences @ kernel + bias # [..., sequence_length, 4 * units]
+
+    h = np.zeros(input_projection.shape[:-2] + (units,), dtype=np.float32)
+    c = np.zeros_like(h)
+    for t in range(sequences.shape[-2]):
+        z = input_projection[..., t, :] + h @ recurrent_kernel
+        i = recurrent_activation(z[..., :units])
+        f = recurrent_activation(z[..., units:2 * units])
+        c = f * c + i * activation(z[..., 2 * units:3 * units])
+        o = recurrent_activation(z[..., 3 * units:])
+        h = o * activation(c)
+    return (h @ weights['dense_kernel'] + weights['dense_bias'])[..., 0]
+
+
+def rollout(weights, last_sequences, forecast_horizon_days, noise=None, covariates=None):
+    """
+    Autoregressive multi-step forecast: each prediction is appended to the input
+    window for the next step, exactly like the Keras loop it replaces.
+    - last_sequences: float array [batch, sequence_length, n_features] (scaled),
+                      or [n_products, batch, sequence_length, n_features] for stacked weights.
+    - noise: optional scaled disturbances [..., forecast_horizon_days] (same leading shape as
+             the predictions) added to every step before it is fed back, for sampled paths.
+    - covariates: the known future covariates [..., forecast_horizon_days, n_features - 1]
+                  (broadcast against the batch shape) appended to every fed-back prediction,
+                  for models with a multivariate feature set (see features.py).
+    Returns the scaled predictions as an array [batch, forecast_horizon_days]
+    (or [n_products, batch, forecast_horizon_days]).
+    """
+    weights = dequantize_weights(weights) # Once, not at every step
+    window = np.array(last_sequences, dtype=np.float32)
+    batch_shape = window.shape[:-2]
+    if forecast_horizon_days <= 0:
+        return np.zeros(batch_shape + (0,), dtype=np.float32)
+    if covariates is not None:
+        covariates = np.broadcast_to(np.asarray(covariates, dtype=np.float32),
+                                     batch_shape + (forecast_horizon_days, window.shape[-1] - 1))
+    predictions = np.zeros(batch_shape + (forecast_horizon_days,), dtype=np.float32)
+    for step in range(forecast_horizon_days):
+        next_step = lstm_forward(weights, window)
+        if noise is not None:
+            next_step = next_step + noise[..., step]
+        predictions[..., step] = next_step
+        next_row = next_step[..., None, None]
+        if covariates is not None:
+            next_row = np.concatenate([next_row, covariates[..., step:step + 1, :]], axis=-1)
+        window = np.concatenate([window[..., 1:, :], next_row], axis=-2)
+    return predictions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the trained .keras models to NumPy weight files")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--precision', nargs='+', choices=PRECISIONS, default=['float32'],
+                        help="Precisions to export (float32 is always written)")
+    args = parser.parse_args()
+    print(f"Exporting LSTM weights in {args.models_dir} to .npz ({', '.join(args.precision)})...")
+    for produk_id in list_product_ids(args.models_dir):
+        # Versioned products keep their model in the served version directory, not in models_dir
+        if os.path.exists(model_path(produk_id, model_registry.artifact_dir(produk_id, args.models_dir))):
+            export_product(produk_id, args.models_dir, args.precision)
@@ -0,0 +1,12 @@
+# File: wsgi.py
+# ---------------------------
+# Production entry point, used by gunicorn (see gunicorn.conf.py):
+#     gunicorn -c gunicorn.conf.py wsgi:application
+# With preload_app enabled this module is imported once in the gunicorn master.
+# All model weights are loaded here, before the workers are forked, so every
+# worker shares the same copy-on-write pages instead of loading its own copy.
+import weight_store
+from app import app as application
+
+loaded_count = weight_store.DEFAULT_STORE.load_all()
+print(f"Preloaded weights for {loaded_count} products from {weight_store.DEFAULT_STORE.models_dir}")